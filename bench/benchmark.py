@@ -0,0 +1,339 @@
+"""Times the sync and config generation of submit-smedge-render.py on generated
+projects so changes can be compared against a saved baseline. Runs without Maya by
+swapping maya.cmds for a StubMayaCmds.
+
+    python bench/benchmark.py --work-dir /tmp/smedge-bench --output baseline.json
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import math
+import platform
+import random
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+SCRIPT_PATH = Path(__file__).parent.parent.joinpath("submit-smedge-render.py")
+
+
+def load_script():
+    """The submit script loaded as a module. Its file name isn't importable."""
+    spec = importlib.util.spec_from_file_location("submit_smedge_render",
+                                                  SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+ssr = load_script()
+
+
+class StubMayaCmds:
+    """In-memory stand-in for the few maya.cmds functions the submit calls."""
+    scene_path: str = ""
+    render_layers: list[str] = []
+    # "node.attr" -> value
+    attrs: dict[str, object] = {}
+    nodes: set[str] = set()
+
+    def __init__(self, scene_path: Path, render_layers: list[str],
+                 render_prefix: str):
+        self.scene_path = str(scene_path)
+        self.render_layers = render_layers
+        self.attrs = {
+            "defaultRenderGlobals.imageFilePrefix": render_prefix,
+            "defaultRenderGlobals.renderVersion": None
+        }
+        self.nodes = {"defaultRenderGlobals"}
+
+    def file(self, q: bool = False, sn: bool = False):
+        return self.scene_path
+
+    def ls(self, type: Optional[str] = None):
+        return list(self.render_layers) if type == "renderLayer" else []
+
+    def listRelatives(self, node: str, parent: bool = False):
+        return []
+
+    def objExists(self, node: str) -> bool:
+        return node in self.nodes
+
+    def createNode(self, node_type: str, name: str, skipSelect: bool = False):
+        self.nodes.add(name)
+        return name
+
+    def delete(self, node: str):
+        self.nodes.discard(node)
+        self.attrs = {
+            attr: value
+            for attr, value in self.attrs.items()
+            if not attr.startswith(f"{node}.")
+        }
+
+    def attributeQuery(self, attr: str, node: str, exists: bool = False):
+        return f"{node}.{attr}" in self.attrs
+
+    def addAttr(self, node: str, shortName: str, dataType: str = ""):
+        self.attrs[f"{node}.{shortName}"] = None
+
+    def deleteAttr(self, attr: str):
+        self.attrs.pop(attr, None)
+
+    def getAttr(self, attr: str):
+        return self.attrs[attr]
+
+    def setAttr(self, attr: str, value, type: str = ""):
+        if attr.split(".")[0] not in self.nodes or attr not in self.attrs:
+            raise RuntimeError(f"No object matches name: {attr}")
+        self.attrs[attr] = value
+
+    def undoInfo(self, query: bool = False, stateWithoutFlush: bool = True):
+        return True
+
+
+class Benchmark:
+    """Runs the benchmarks and compares their results against a baseline."""
+    # Number of files, folder depth and median/maximum file size in bytes. Each shape
+    # also gets excluded directories with as many files again.
+    PROJECT_SHAPES = {
+        "small": (500, 2, 16 * 1024, 4 * 1024**2),
+        "medium": (5000, 4, 8 * 1024, 16 * 1024**2),
+        "large": (30000, 6, 4 * 1024, 16 * 1024**2),
+    }
+    LAYER_COUNTS = [1, 10, 100, 500]
+    EXCLUDE_DIRECTORIES = ["autosave", "incrementalSave", "images"]
+    TOP_DIRECTORIES = ["sourceimages", "cache/alembic", "cache/bifrost", "assets"]
+    # Slowdowns smaller than this are timer noise, whatever the tolerance says
+    MIN_REGRESSION_SECONDS = 0.005
+
+    @staticmethod
+    @contextlib.contextmanager
+    def stub_maya(stub: StubMayaCmds):
+        real_cmds = ssr.cmds
+        ssr.cmds = stub
+        try:
+            yield stub
+        finally:
+            ssr.cmds = real_cmds
+
+    @classmethod
+    def generate_project(cls, root: Path, shape: str, seed: int = 0) -> Path:
+        """Writes a synthetic Maya project with log-normally distributed file sizes,
+        nested texture and cache folders and populated excluded folders. Returns the
+        path of its scene file."""
+        file_count, depth, median_size, max_size = cls.PROJECT_SHAPES[shape]
+        rng = random.Random(seed)
+        data = rng.randbytes(max_size)
+        root.mkdir(parents=True, exist_ok=True)
+        root.joinpath("workspace.mel").write_text('workspace -fr "images" '
+                                                  '"images";\n')
+        scene_path = root.joinpath("scenes", "bench.ma")
+        scene_path.parent.mkdir(parents=True, exist_ok=True)
+        scene_path.write_text("//Maya ASCII 2023 scene\n"
+                              "select -ne :defaultRenderGlobals;\n"
+                              '\tsetAttr ".ifp" -type "string" "<Scene>";\n')
+
+        def write_files(top: str, count: int, nested_depth: int):
+            for i in range(count):
+                folder = root.joinpath(top, *(f"d{(i >> (3 * level)) % 8}"
+                                              for level in range(nested_depth)))
+                folder.mkdir(parents=True, exist_ok=True)
+                size = min(int(rng.lognormvariate(math.log(median_size), 1.5)),
+                           max_size)
+                folder.joinpath(f"f{i:06d}.bin").write_bytes(data[:size])
+
+        per_top = file_count // len(cls.TOP_DIRECTORIES)
+        for top in cls.TOP_DIRECTORIES:
+            write_files(top, per_top, depth)
+        for top in cls.EXCLUDE_DIRECTORIES:
+            write_files(top, file_count // len(cls.EXCLUDE_DIRECTORIES), 1)
+        return scene_path
+
+    @staticmethod
+    def best_time(function: Callable[[], object], repeat: int) -> float:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    @classmethod
+    def config_state(cls, network: Path, renders: Path) -> "ssr.SubmitUIState":
+        state = ssr.SubmitUIState()
+        state.network_project_location = str(network)
+        state.network_render_location = str(renders)
+        state.end_frame = 100
+        state.exclude_directories = list(cls.EXCLUDE_DIRECTORIES)
+        return state
+
+    @classmethod
+    def run(cls, work_dir: Path, shapes: list[str], layer_counts: list[int],
+            repeat: int) -> dict:
+        """Runs every benchmark and returns their best times in seconds, keyed by
+        benchmark name."""
+        results: dict[str, float] = {}
+        for shape in shapes:
+            project = work_dir.joinpath(f"{shape}_project")
+            if not project.is_dir():
+                print(f"Generating {shape} project...")
+                cls.generate_project(project, shape)
+            network = work_dir.joinpath(f"{shape}_network")
+            backend = ssr.ThreadedSyncBackend()
+
+            def full_sync():
+                shutil.rmtree(network, ignore_errors=True)
+                backend.sync(project, network, cls.EXCLUDE_DIRECTORIES)
+
+            results[f"sync_full/{shape}"] = cls.best_time(full_sync, repeat)
+            results[f"sync_noop/{shape}"] = cls.best_time(
+                lambda: backend.sync(project, network, cls.EXCLUDE_DIRECTORIES
+                                     ), repeat)
+            print(f"{shape}: full sync {results[f'sync_full/{shape}']:.3f}s, "
+                  f"no-op resync {results[f'sync_noop/{shape}']:.3f}s")
+
+        # Config generation only needs a tiny project. It is synced here so the sync
+        # inside every timed submit is a no-op, whether the work dir is fresh or not.
+        project = work_dir.joinpath("config_project")
+        scene_path = project.joinpath("scenes", "bench.ma")
+        if not scene_path.is_file():
+            cls.generate_project(project, "small")
+        network = work_dir.joinpath("config_network", "project")
+        network.mkdir(parents=True, exist_ok=True)
+        renders = work_dir.joinpath("config_network", "renders")
+        renders.mkdir(parents=True, exist_ok=True)
+        state = cls.config_state(network, renders)
+        ssr.ProjectManager.SYNC_BACKENDS[state.sync_backend].from_state(
+            state).sync(project, network, state.exclude_directories)
+
+        for layer_count in layer_counts:
+            layer_names = [f"layer{i:03d}" for i in range(layer_count)]
+            stub = StubMayaCmds(scene_path, layer_names, "<Scene>")
+            state = cls.config_state(network, renders)
+            with cls.stub_maya(stub):
+                state.load_layers()
+                for i, layer in enumerate(state.render_layers):
+                    # Mix in automatic packet sizes and grouped layers
+                    layer.packet_size = 0 if i % 4 == 0 else 5
+                    layer.group = f"group{i // 10}" if i % 3 == 0 else ""
+
+                def settings_round_trip():
+                    state.saved_json = None
+                    state.save_to_node()
+                    ssr.SubmitUIState().load_from_node()
+
+                results[f"settings/{layer_count}"] = cls.best_time(
+                    settings_round_trip, repeat)
+
+                config_times = []
+
+                def submit():
+                    profiler = ssr.SubmitProfiler()
+                    context = ssr.ProjectManager.collect_submit_context(
+                        state, profiler)
+                    worker = ssr.SubmitWorker(
+                        lambda worker: ssr.ProjectManager.run_submit(
+                            state, context, worker), lambda event: None,
+                        profiler)
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        worker.run()
+                    if worker.progress.error is not None:
+                        raise worker.progress.error
+                    config_times.append(
+                        profiler.totals()["stage:configs"][1])
+
+                results[f"submit/{layer_count}"] = cls.best_time(
+                    submit, repeat)
+                results[f"configs/{layer_count}"] = min(config_times)
+            print(f"{layer_count} layers: submit "
+                  f"{results[f'submit/{layer_count}']:.3f}s, configs "
+                  f"{results[f'configs/{layer_count}']:.3f}s")
+        return {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": repeat,
+            "results": results
+        }
+
+    @staticmethod
+    def compare(results: dict, baseline: dict,
+                tolerance: float) -> list[str]:
+        """Prints each result next to its baseline. Returns the names of benchmarks
+        that got slower by more than the tolerance, as a fraction of the baseline."""
+        regressions = []
+        for name, seconds in results["results"].items():
+            base = baseline["results"].get(name)
+            if base is None:
+                print(f"{name:<20} {seconds:>9.3f}s  (no baseline)")
+                continue
+            change = (seconds - base) / base if base > 0 else 0.0
+            flag = ""
+            if (change > tolerance and
+                    seconds - base > Benchmark.MIN_REGRESSION_SECONDS):
+                regressions.append(name)
+                flag = "  REGRESSION"
+            print(f"{name:<20} {seconds:>9.3f}s  baseline {base:>9.3f}s  "
+                  f"{change:+7.1%}{flag}")
+        return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="benchmark.py",
+        description=
+        ("Generates synthetic projects in the work directory (kept between runs), "
+         "times a full sync, a no-op resync, settings storage and config "
+         "generation, and optionally compares against a baseline."))
+    parser.add_argument("--work-dir", type=Path, required=True)
+    parser.add_argument("--shapes",
+                        nargs="*",
+                        default=["small", "medium"],
+                        choices=list(Benchmark.PROJECT_SHAPES))
+    parser.add_argument("--layers",
+                        type=int,
+                        nargs="*",
+                        default=Benchmark.LAYER_COUNTS)
+    parser.add_argument("--repeat",
+                        type=int,
+                        default=3,
+                        help="Runs per benchmark, the fastest is kept")
+    parser.add_argument("--output",
+                        type=Path,
+                        help="Write the results as JSON, e.g. as a baseline")
+    parser.add_argument("--baseline",
+                        type=Path,
+                        help="Results of an earlier run to compare against")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown against the baseline, as a fraction")
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    results = Benchmark.run(args.work_dir, args.shapes, args.layers,
+                            max(args.repeat, 1))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.baseline is None:
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    regressions = Benchmark.compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"Slower than baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
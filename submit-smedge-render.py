@@ -1,8 +1,59 @@
+import argparse
+import contextlib
+import copy
+import cProfile
+import ctypes
+import ctypes.util
+import getpass
+import hashlib
+import heapq
+import importlib
+import json
+import math
+import mmap
 import os
-import pymel.core as pm
+import platform
+import random
+import re
+import select
+import shutil
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
 from pathlib import Path
-import maya.cmds as cmds
-from typing import Callable, Optional
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
+from typing import Callable, Iterable, Optional
+from xml.sax.saxutils import escape
+
+
+class LazyModule:
+    """Imports a module the first time one of its attributes is used, so the command line
+    entry point can run outside of Maya without ever loading pymel."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+pm = LazyModule("pymel.core")
+cmds = LazyModule("maya.cmds")
+maya_utils = LazyModule("maya.utils")
+
+# Directory inside the network project that holds the script's own bookkeeping files.
+# It is never synced or mirror-deleted.
+SYNC_METADATA_DIR = ".smedge_sync"
 
 
 class RenderLayer:
@@ -10,11 +61,32 @@ class RenderLayer:
     name: str = ""
     enabled: bool = False
     packet_size: int = 1
+    # Layers with the same non-empty group are rendered by one job that loads the scene
+    # once per packet for all of them
+    group: str = ""
 
-    def __init__(self, name: str, enabled: bool, packet_size: int):
+    def __init__(self,
+                 name: str,
+                 enabled: bool,
+                 packet_size: int,
+                 group: str = ""):
         self.name = name
         self.enabled = enabled
         self.packet_size = packet_size
+        self.group = group
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "enabled": self.enabled,
+            "packet_size": self.packet_size,
+            "group": self.group
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "RenderLayer":
+        return RenderLayer(data["name"], data.get("enabled", True),
+                           data.get("packet_size", 1), data.get("group", ""))
 
 
 class SubmitUIState:
@@ -28,158 +100,309 @@ class SubmitUIState:
     exclude_directories: list[str] = ["autosave", "incrementalSave", "images"]
     start_frame: int = 0
     end_frame: int = 1
+    sync_backend: str = "threaded"
+    rescan_network_project: bool = False
+    delta_transfer: bool = False
+    sync_dependencies_only: bool = False
+    farm_node_count: int = 4
+    tx_prepass: bool = False
+    farm_backend: str = "smedge"
+    # Write a timing trace of each submit, and also run cProfile for profile_python
+    profile_submit: bool = False
+    profile_python: bool = False
+    # Leave out frames whose images are already in the network render directory
+    skip_rendered_frames: bool = False
+    # Compare the hashes of local and network files after syncing
+    verify_sync: bool = False
+    # Copy pacing: MB/s shared by all syncs to the network project (0 for no limit)
+    # and number of files copied at once
+    sync_bandwidth_limit: float = 0.0
+    sync_max_transfers: int = 16
+    # (Threaded sync) Changed files under this many KB are sent in compressed bundles
+    # and unpacked on the network side, 0 to copy every file directly
+    bundle_threshold: int = 0
+    # Sync the open scene's project in the background while the dialog's settings allow
+    watch_project: bool = False
+    # Everything except render_layers, in the order used by settings files
+    SETTINGS_FIELDS = [
+        "generate_tx", "force_tx", "network_project_location",
+        "network_render_location", "exclude_directories", "start_frame",
+        "end_frame", "sync_backend", "rescan_network_project",
+        "delta_transfer", "sync_dependencies_only", "farm_node_count",
+        "tx_prepass", "farm_backend", "profile_submit", "profile_python",
+        "skip_rendered_frames", "verify_sync", "sync_bandwidth_limit",
+        "sync_max_transfers", "bundle_threshold", "watch_project"
+    ]
     NODE_ID = "ollyisonitSmedgeSubmit_config"
-    # Render layers are stored as 3 separate arrays where all values with the same index
-    # correspond to the same object.
+    # All settings are stored as a single JSON string, so saving is one setAttr
+    SETTINGS_ATTR = "settings_json"
+    # Older versions stored render layers as 4 separate arrays where all values with the
+    # same index correspond to the same object, and every other setting in an attribute
+    # named after its field. These are only read to migrate old scenes.
     RENDER_LAYER_NAME_ATTR = "render_layers_names"
     RENDER_LAYER_ENABLED_ATTR = "render_layers_enabled"
     RENDER_LAYER_PACKET_SIZE_ATTR = "render_layers_packet_sizes"
-    GENERATE_TX_ATTR = "generate_tx"
-    FORCE_TX_ATTR = "force_tx"
-    NETWORK_PROJECT_LOCATION_ATTR = "network_project_location"
-    NETWORK_RENDER_LOCATION_ATTR = "network_render_location"
-    EXCLUDE_DIRECTORIES_LOCATION_ATTR = "exclude_directories"
-    START_FRAME_ATTR = "start_frame"
-    END_FRAME_ATTR = "end_frame"
+    RENDER_LAYER_GROUP_ATTR = "render_layers_groups"
+    LEGACY_FIELD_ATTRS = [
+        "generate_tx", "force_tx", "network_project_location",
+        "network_render_location", "exclude_directories", "start_frame",
+        "end_frame", "sync_backend", "rescan_network_project",
+        "delta_transfer", "sync_dependencies_only", "farm_node_count",
+        "tx_prepass"
+    ]
+    LEGACY_ATTRS = [
+        RENDER_LAYER_NAME_ATTR, RENDER_LAYER_ENABLED_ATTR,
+        RENDER_LAYER_PACKET_SIZE_ATTR, RENDER_LAYER_GROUP_ATTR
+    ] + LEGACY_FIELD_ATTRS
+    # JSON last written to or read from the node, to skip saves that change nothing
+    saved_json: Optional[str] = None
 
     def create_storage_node(self, deleteExisting: bool = False):
         """Creates the Maya node used to store configuration data.
         Args:
             deleteExisting (bool): True deletes existing node, False skips creation if node exists
         """
-        if pm.objExists(self.NODE_ID):
+        if cmds.objExists(self.NODE_ID):
             if deleteExisting:
-                pm.delete(self.NODE_ID)
+                cmds.delete(self.NODE_ID)
             else:
+                if not cmds.attributeQuery(
+                        self.SETTINGS_ATTR, node=self.NODE_ID, exists=True):
+                    cmds.addAttr(self.NODE_ID,
+                                 shortName=self.SETTINGS_ATTR,
+                                 dataType="string")
                 return self
-        pm.createNode("network", name=self.NODE_ID, skipSelect=True)
-        pm.addAttr(self.NODE_ID,
-                   shortName=self.RENDER_LAYER_NAME_ATTR,
-                   dataType="stringArray")
-        pm.addAttr(self.NODE_ID,
-                   shortName=self.RENDER_LAYER_ENABLED_ATTR,
-                   dataType="Int32Array")  # Int32Array otherwise
-        pm.addAttr(self.NODE_ID,
-                   shortName=self.RENDER_LAYER_PACKET_SIZE_ATTR,
-                   dataType="Int32Array")
-        pm.addAttr(self.NODE_ID,
-                   shortName=self.GENERATE_TX_ATTR,
-                   attributeType="bool")
-        pm.addAttr(self.NODE_ID,
-                   shortName=self.FORCE_TX_ATTR,
-                   attributeType="bool")
-        pm.addAttr(self.NODE_ID,
-                   shortName=self.NETWORK_PROJECT_LOCATION_ATTR,
-                   dataType="string")
-        pm.addAttr(self.NODE_ID,
-                   shortName=self.NETWORK_RENDER_LOCATION_ATTR,
-                   dataType="string")
-        pm.addAttr(self.NODE_ID,
-                   shortName=self.EXCLUDE_DIRECTORIES_LOCATION_ATTR,
-                   dataType="stringArray")
-        pm.addAttr(self.NODE_ID,
-                   shortName=self.START_FRAME_ATTR,
-                   attributeType="long")
-        pm.addAttr(self.NODE_ID,
-                   shortName=self.END_FRAME_ATTR,
-                   attributeType="long")
-        self.save_to_node()
+        cmds.createNode("network", name=self.NODE_ID, skipSelect=True)
+        cmds.addAttr(self.NODE_ID,
+                     shortName=self.SETTINGS_ATTR,
+                     dataType="string")
+        self.saved_json = None
         return self
 
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), sort_keys=True)
+
     def save_to_node(self):
-        self.create_storage_node(deleteExisting=False)
-        pm.setAttr(f"{self.NODE_ID}.{self.RENDER_LAYER_NAME_ATTR}",
-                   [l.name for l in self.render_layers])
-        pm.setAttr(f"{self.NODE_ID}.{self.RENDER_LAYER_ENABLED_ATTR}",
-                   [l.enabled for l in self.render_layers])
-        pm.setAttr(f"{self.NODE_ID}.{self.RENDER_LAYER_PACKET_SIZE_ATTR}",
-                   [l.packet_size for l in self.render_layers])
-        pm.setAttr(f"{self.NODE_ID}.{self.GENERATE_TX_ATTR}", self.generate_tx)
-        pm.setAttr(f"{self.NODE_ID}.{self.FORCE_TX_ATTR}", self.force_tx)
-        pm.setAttr(f"{self.NODE_ID}.{self.NETWORK_PROJECT_LOCATION_ATTR}",
-                   self.network_project_location)
-        pm.setAttr(f"{self.NODE_ID}.{self.NETWORK_RENDER_LOCATION_ATTR}",
-                   self.network_render_location)
-        pm.setAttr(f"{self.NODE_ID}.{self.EXCLUDE_DIRECTORIES_LOCATION_ATTR}",
-                   self.exclude_directories)
-        pm.setAttr(f"{self.NODE_ID}.{self.START_FRAME_ATTR}", self.start_frame)
-        pm.setAttr(f"{self.NODE_ID}.{self.END_FRAME_ATTR}", self.end_frame)
+        """Writes the settings to the storage node if they changed since the last save
+        or load."""
+        settings_json = self.to_json()
+        if settings_json == self.saved_json:
+            return self
+        # Saving settings shouldn't add to the undo queue
+        undo_enabled = cmds.undoInfo(query=True, stateWithoutFlush=True)
+        cmds.undoInfo(stateWithoutFlush=False)
+        try:
+            try:
+                cmds.setAttr(f"{self.NODE_ID}.{self.SETTINGS_ATTR}",
+                             settings_json,
+                             type="string")
+            except (RuntimeError, ValueError):
+                # The node or attribute doesn't exist yet, which is only checked for
+                # when saving fails
+                self.create_storage_node(deleteExisting=False)
+                cmds.setAttr(f"{self.NODE_ID}.{self.SETTINGS_ATTR}",
+                             settings_json,
+                             type="string")
+        finally:
+            cmds.undoInfo(stateWithoutFlush=undo_enabled)
+        self.saved_json = settings_json
         return self
 
     def load_from_node(self):
-        # Keep default values if loading for the first time
-        if not pm.objExists(self.NODE_ID):
-            self.create_storage_node(deleteExisting=False)
+        # Keep default values if loading for the first time. The node is only created
+        # once there is something to save.
+        if not cmds.objExists(self.NODE_ID):
+            self.saved_json = self.to_json()
             self.load_layers()
             return self
-        render_layer_names = pm.getAttr(
-            f"{self.NODE_ID}.{self.RENDER_LAYER_NAME_ATTR}")
-        if render_layer_names == None:
-            render_layer_names = []
-        render_layer_enableds = pm.getAttr(
-            f"{self.NODE_ID}.{self.RENDER_LAYER_ENABLED_ATTR}")
-        if render_layer_enableds == None:
-            render_layer_enableds = []
-        render_layer_packet_sizes = pm.getAttr(
-            f"{self.NODE_ID}.{self.RENDER_LAYER_PACKET_SIZE_ATTR}")
-        if render_layer_packet_sizes == None:
-            render_layer_packet_sizes = []
-        self.render_layers = []
-        for i in range(len(render_layer_names)):
-            self.render_layers.append(
-                RenderLayer(render_layer_names[i], render_layer_enableds[i],
-                            render_layer_packet_sizes[i]))
-        self.generate_tx = pm.getAttr(
-            f"{self.NODE_ID}.{self.GENERATE_TX_ATTR}")
-        self.force_tx = pm.getAttr(f"{self.NODE_ID}.{self.FORCE_TX_ATTR}")
-        self.network_project_location = pm.getAttr(
-            f"{self.NODE_ID}.{self.NETWORK_PROJECT_LOCATION_ATTR}")
-        self.network_render_location = pm.getAttr(
-            f"{self.NODE_ID}.{self.NETWORK_RENDER_LOCATION_ATTR}")
-        self.exclude_directories = pm.getAttr(
-            f"{self.NODE_ID}.{self.EXCLUDE_DIRECTORIES_LOCATION_ATTR}")
-        if self.exclude_directories == None:
-            self.exclude_directories = []
-        self.start_frame = pm.getAttr(
-            f"{self.NODE_ID}.{self.START_FRAME_ATTR}")
-        self.end_frame = pm.getAttr(f"{self.NODE_ID}.{self.END_FRAME_ATTR}")
-
+        settings_json = None
+        if cmds.attributeQuery(self.SETTINGS_ATTR,
+                               node=self.NODE_ID,
+                               exists=True):
+            settings_json = cmds.getAttr(
+                f"{self.NODE_ID}.{self.SETTINGS_ATTR}")
+        if settings_json:
+            self.apply_dict(json.loads(settings_json))
+            self.saved_json = self.to_json()
+        else:
+            self.migrate_legacy_node()
         self.load_layers()
         return self
 
-    def load_layers(self):
-        existing_render_layers = pm.ls(type='renderLayer')
+    def migrate_legacy_node(self):
+        """Reads a storage node saved with the old one attribute per setting layout,
+        then saves it as JSON and removes the old attributes."""
+
+        def get(attr: str, default):
+            if not cmds.attributeQuery(attr, node=self.NODE_ID, exists=True):
+                return default
+            value = cmds.getAttr(f"{self.NODE_ID}.{attr}")
+            if value == None:
+                return default
+            return value
+
+        names = get(self.RENDER_LAYER_NAME_ATTR, [])
+        enableds = get(self.RENDER_LAYER_ENABLED_ATTR, [])
+        packet_sizes = get(self.RENDER_LAYER_PACKET_SIZE_ATTR, [])
+        groups = get(self.RENDER_LAYER_GROUP_ATTR, [])
+        self.render_layers = [
+            RenderLayer(names[i], bool(enableds[i]), packet_sizes[i],
+                        groups[i] if i < len(groups) else "")
+            for i in range(min(len(names), len(enableds), len(packet_sizes)))
+        ]
+        for field in self.LEGACY_FIELD_ATTRS:
+            setattr(self, field, get(field, getattr(self, field)))
+
+        self.saved_json = None
+        self.save_to_node()
+        for attr in self.LEGACY_ATTRS:
+            if cmds.attributeQuery(attr, node=self.NODE_ID, exists=True):
+                cmds.deleteAttr(f"{self.NODE_ID}.{attr}")
+
+    def load_layers(self, existing_render_layers: Optional[list[str]] = None):
+        if existing_render_layers is None:
+            existing_render_layers = cmds.ls(type='renderLayer') or []
+        existing = set(existing_render_layers)
         self.render_layers = list(
-            filter(lambda l: l.name in existing_render_layers,
-                   self.render_layers))
+            filter(lambda l: l.name in existing, self.render_layers))
+        known = {l.name for l in self.render_layers}
         for layername in existing_render_layers:
-            if not layername in [l.name for l in self.render_layers]:
+            if not layername in known:
                 self.render_layers.append(RenderLayer(layername, True, 1))
+                known.add(layername)
+
+    def to_dict(self) -> dict:
+        """Settings as plain data, in the format used by settings files."""
+        settings = {
+            field: copy.copy(getattr(self, field))
+            for field in self.SETTINGS_FIELDS
+        }
+        settings["render_layers"] = [
+            layer.to_dict() for layer in self.render_layers
+        ]
+        return settings
+
+    def apply_dict(self, settings: dict):
+        """Overrides the settings present in a dict created by to_dict or read from a
+        settings file. Missing keys keep their current values."""
+        for field in self.SETTINGS_FIELDS:
+            if field in settings:
+                setattr(self, field, copy.copy(settings[field]))
+        if "render_layers" in settings:
+            self.render_layers = [
+                RenderLayer.from_dict(layer)
+                for layer in settings["render_layers"]
+            ]
+        return self
+
+    @staticmethod
+    def read_settings_file(path: Path) -> dict:
+        """Reads a JSON or TOML settings file laid out like SubmitUIState.to_dict."""
+        if path.suffix.lower() == ".toml":
+            try:
+                import tomllib
+            except ImportError:
+                # tomllib is new in Python 3.11, older mayapy versions need tomli
+                try:
+                    import tomli as tomllib
+                except ImportError:
+                    raise Exception(
+                        f"Can't read {path.name}: TOML settings files need "
+                        "Python 3.11+ or the tomli package, use JSON instead")
+            with open(path, "rb") as f:
+                return tomllib.load(f)
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def load_from_maya_ascii(self, scene: "MayaAsciiScene"):
+        """Reads the settings saved on the storage node of a .ma file, so a scene can be
+        submitted without Maya. Keeps the defaults for anything that was never saved."""
+        node = scene.nodes.get(self.NODE_ID)
+        if node is not None and node.get_string(self.SETTINGS_ATTR):
+            self.apply_dict(json.loads(node.get_string(self.SETTINGS_ATTR)))
+        elif node is not None:
+            names = node.get_array(self.RENDER_LAYER_NAME_ATTR)
+            enableds = node.get_array(self.RENDER_LAYER_ENABLED_ATTR)
+            packet_sizes = node.get_array(self.RENDER_LAYER_PACKET_SIZE_ATTR)
+            groups = node.get_array(self.RENDER_LAYER_GROUP_ATTR)
+            self.render_layers = [
+                RenderLayer(names[i], enableds[i] != "0", int(packet_sizes[i]),
+                            groups[i] if i < len(groups) else "")
+                for i in range(min(len(names), len(enableds),
+                                   len(packet_sizes)))
+            ]
+            for field in self.LEGACY_FIELD_ATTRS:
+                if node.get(field) is None:
+                    continue
+                default = getattr(self, field)
+                if isinstance(default, bool):
+                    setattr(self, field, node.get_bool(field))
+                elif isinstance(default, int):
+                    setattr(self, field, int(node.get_string(field)))
+                elif isinstance(default, list):
+                    setattr(self, field, node.get_array(field))
+                else:
+                    setattr(self, field, node.get_string(field))
+        self.load_layers(
+            [layer.name for layer in scene.nodes_of_type("renderLayer")])
+        return self
 
     def validate_state(self) -> Optional[str]:
         """Returns string message containing reason why state is invalid, or None if state is valid"""
         if self.start_frame > self.end_frame:
             return "Start frame must be less than end frame!"
         for layer in self.render_layers:
-            if layer.packet_size < 1:
-                return f"Packet size for layer {layer.name} must be at least 1!"
+            if layer.packet_size < 0:
+                return f"Packet size for layer {layer.name} must be at least 1, or 0 for auto!"
+        if self.farm_node_count < 1:
+            return "Render node count must be at least 1!"
+        if self.sync_bandwidth_limit < 0:
+            return "Bandwidth limit can't be negative!"
+        if self.sync_max_transfers < 1:
+            return "Parallel copies must be at least 1!"
+        if self.bundle_threshold < 0:
+            return "Bundle size threshold can't be negative!"
+        if self.watch_project and self.sync_backend != ThreadedSyncBackend.name:
+            return "Watching the project needs the threaded sync method!"
+        if self.watch_project and self.sync_dependencies_only:
+            # The watcher mirrors the whole project
+            return ("Watching the project can't be combined with only syncing "
+                    "scene dependencies!")
         if not os.path.exists(self.network_project_location):
             return f"Network project location '{self.network_project_location}' not found!"
         if not os.path.exists(self.network_render_location):
             return f"Network render location '{self.network_render_location}' not found!"
+        if self.sync_backend not in ProjectManager.SYNC_BACKENDS:
+            return f"Unknown sync method '{self.sync_backend}'!"
+        if self.farm_backend not in ProjectManager.JOB_WRITERS:
+            return f"Unknown render farm '{self.farm_backend}'!"
+        job_names: dict[str, str] = {}
+        for job_name, _ in ProjectManager.group_layers(self.render_layers):
+            suffix = ProjectManager.job_file_suffix(job_name)
+            if suffix in job_names:
+                return (f"Jobs '{job_names[suffix]}' and '{job_name}' would "
+                        "write the same job files, rename one of them!")
+            job_names[suffix] = job_name
         return None
 
 
 class RenderLayerUI:
+    """One row of the render layer list. Rows are pooled and rebound to whichever layer
+    is shown in their slot, so paging and filtering only edit controls that changed."""
     render_layers_row = None
     render_layer_checkbox = None
     render_layer_label = None
     render_layer_packet_label = None
     render_layer_packet_input = None
+    render_layer_group_label = None
+    render_layer_group_input = None
+    # Values last shown by update(), as (name, enabled, packet_size, group)
+    shown: Optional[tuple] = None
+    visible: bool = True
 
     def __init__(self, parent):
         self.render_layers_row = pm.rowLayout(
-            numberOfColumns=4,
+            numberOfColumns=6,
             columnWidth=[
                 [1, SubmitUI.TICKBOX_WIDTH],
                 [2, SubmitUI.LABEL_WIDTH - SubmitUI.TICKBOX_WIDTH],
@@ -194,7 +417,20 @@ class RenderLayerUI:
         self.render_layer_packet_label = pm.text(label="Packet Size",
                                                  parent=self.render_layers_row)
         self.render_layer_packet_input = pm.intField(
-            parent=self.render_layers_row)
+            parent=self.render_layers_row,
+            minValue=0,
+            annotation=
+            ("Frames per packet. 0 picks a packet size automatically from the "
+             "layer's past frame times and the number of render nodes."))
+        self.render_layer_group_label = pm.text(label="Group",
+                                                parent=self.render_layers_row)
+        self.render_layer_group_input = pm.textField(
+            width=80,
+            parent=self.render_layers_row,
+            annotation=
+            ("Layers with the same group name are rendered by a single job "
+             "that loads the scene once for all of them. Leave empty to give "
+             "the layer its own job."))
 
     def update_disabled(self):
         is_enabled = pm.checkBox(self.render_layer_checkbox,
@@ -205,16 +441,46 @@ class RenderLayerUI:
         pm.intField(self.render_layer_packet_input,
                     edit=True,
                     enable=is_enabled)
+        pm.text(self.render_layer_group_label, edit=True, enable=is_enabled)
+        pm.textField(self.render_layer_group_input,
+                     edit=True,
+                     enable=is_enabled)
 
     def update(self, layer: RenderLayer):
+        values = (layer.name, layer.enabled, layer.packet_size, layer.group)
+        if values == self.shown:
+            return self
         pm.checkBox(self.render_layer_checkbox, edit=True, value=layer.enabled)
         pm.text(self.render_layer_label, edit=True, label=layer.name)
         pm.intField(self.render_layer_packet_input,
                     edit=True,
                     value=layer.packet_size)
+        pm.textField(self.render_layer_group_input,
+                     edit=True,
+                     text=layer.group)
         self.update_disabled()
+        self.shown = values
         return self
 
+    def read_into(self, layer: RenderLayer):
+        """Copies the values entered in this row into layer."""
+        layer.enabled = pm.checkBox(self.render_layer_checkbox,
+                                    query=True,
+                                    value=True)
+        layer.packet_size = pm.intField(self.render_layer_packet_input,
+                                        query=True,
+                                        value=True)
+        layer.group = pm.textField(self.render_layer_group_input,
+                                   query=True,
+                                   text=True).strip()
+        self.shown = (layer.name, layer.enabled, layer.packet_size,
+                      layer.group)
+
+    def set_visible(self, visible: bool):
+        if visible != self.visible:
+            pm.rowLayout(self.render_layers_row, edit=True, visible=visible)
+            self.visible = visible
+
     def delete(self):
         pm.delete(self.render_layers_row)
 
@@ -228,23 +494,54 @@ class SubmitUI:
     main_window = None
     state: SubmitUIState = None
 
-    ui_render_layers: dict[str, RenderLayerUI] = {}
+    # Render layer rows are only built for one page of layers at a time
+    LAYER_PAGE_SIZE = 50
+    layer_rows: list[RenderLayerUI] = []
+    # Layer shown by each row of layer_rows, by index
+    shown_layers: list[RenderLayer] = []
+    layer_filter = ""
+    layer_page = 0
     render_layers_layout = None
+    layer_filter_input = None
+    layer_page_label = None
     generate_tx_check = None
     force_tx_check = None
+    tx_prepass_check = None
+    skip_rendered_check = None
     start_frame_field = None
     end_frame_field = None
+    farm_node_count_field = None
     project_dir_input = None
     render_dir_input = None
     exclude_dir_input = None
+    sync_backend_input = None
+    farm_backend_input = None
+    rescan_network_check = None
+    delta_transfer_check = None
+    sync_dependencies_check = None
+    verify_sync_check = None
+    bandwidth_limit_field = None
+    max_transfers_field = None
+    bundle_threshold_field = None
+    watch_project_check = None
+    profile_submit_check = None
+    profile_python_check = None
+    progress_bar = None
+    progress_label = None
+    cancel_button = None
     close_button = None
     generate_config = None
+    batch_submit_button = None
+    worker: Optional["SubmitWorker"] = None
+    PROGRESS_STEPS = 1000
 
     def __init__(self, state: SubmitUIState, onClose: Callable[[SubmitUIState],
                                                                None],
                  validate: Callable[[SubmitUIState], Optional[str]],
                  submit: Callable[[SubmitUIState], None]):
         self.state = state
+        self.layer_rows = []
+        self.shown_layers = []
         self.build_ui(onClose, validate, submit)
 
     def build_ui(self, onClose: Callable[[SubmitUIState], None],
@@ -297,6 +594,24 @@ class SubmitUI:
             parent=render_options_layout,
             annotation=("(Arnold) Errors if TX files are missing. Generate "
                         "TX files in Arnold>Utilities>TX Manager"))
+        self.tx_prepass_check = pm.checkBoxGrp(
+            label="Pre-generate TX Files",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=render_options_layout,
+            annotation=
+            ("Convert the scene's textures to TX on this machine before syncing, "
+             "running several maketx processes at once. Textures that haven't "
+             "changed since their last conversion are skipped. Renders always "
+             "use the TX files with this on."))
+        self.skip_rendered_check = pm.checkBoxGrp(
+            label="Skip Rendered Frames",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=render_options_layout,
+            annotation=
+            ("Only render the frames that don't have images in the network render "
+             "directory yet, e.g. when resubmitting after some frames failed. "
+             "Images that are too small or have a broken header are rendered "
+             "again."))
 
         frame_range_row = pm.rowLayout(
             numberOfColumns=4,
@@ -307,6 +622,21 @@ class SubmitUI:
                                     parent=frame_range_row)
         self.start_frame_field = pm.intField(width=30, parent=frame_range_row)
         self.end_frame_field = pm.intField(width=30, parent=frame_range_row)
+        self.farm_node_count_field = pm.intFieldGrp(
+            label="Render Nodes",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=render_options_layout,
+            annotation=("Number of render nodes the job will run on. Used to "
+                        "pick automatic packet sizes."))
+        self.farm_backend_input = pm.optionMenuGrp(
+            label="Render Farm",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=render_options_layout,
+            annotation=("Which render manager the job files are written for. "
+                        "Deadline files are submitted with deadlinecommand, "
+                        "OpenCue files with cuesubmit."))
+        for writer_name in ProjectManager.JOB_WRITERS:
+            pm.menuItem(label=writer_name)
 
         render_layers_frame = pm.frameLayout(
             "Enabled Render Layers",
@@ -314,7 +644,24 @@ class SubmitUI:
             marginHeight=5,
             parent=render_options_layout,
         )
-        self.render_layers_layout = pm.columnLayout(parent=render_layers_frame)
+        render_layers_column = pm.columnLayout(parent=render_layers_frame)
+        layer_nav_row = pm.rowLayout(numberOfColumns=4,
+                                     columnWidth=[1, self.LABEL_WIDTH],
+                                     parent=render_layers_column)
+        self.layer_filter_input = pm.textField(
+            parent=layer_nav_row,
+            placeholderText="Filter layers",
+            changeCommand=lambda text: self.set_layer_filter(text),
+            annotation="Only show layers whose name or group contains this text")
+        pm.button(label="<",
+                  parent=layer_nav_row,
+                  command=lambda _: self.change_layer_page(-1))
+        pm.button(label=">",
+                  parent=layer_nav_row,
+                  command=lambda _: self.change_layer_page(1))
+        self.layer_page_label = pm.text(label="", parent=layer_nav_row)
+        self.render_layers_layout = pm.columnLayout(
+            parent=render_layers_column)
 
         output_options_frame = pm.frameLayout("Output Options",
                                               collapsable=False,
@@ -331,11 +678,115 @@ class SubmitUI:
             parent=output_options_layout,
             annotation=("Comma separated list of directories to exclude when "
                         "syncing project to network directory."))
+        self.sync_backend_input = pm.optionMenuGrp(
+            label="Sync Method",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=output_options_layout,
+            annotation=("How the project is copied to the network directory. "
+                        "'threaded' copies many files in parallel and works on "
+                        "every platform, 'robocopy' is Windows-only."))
+        for backend_name in ProjectManager.SYNC_BACKENDS:
+            pm.menuItem(label=backend_name)
+        self.rescan_network_check = pm.checkBoxGrp(
+            label="Rescan Network Project",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=output_options_layout,
+            annotation=
+            ("(Threaded sync) Compare against the files actually on the network "
+             "instead of the record of the last sync. Slower, but picks up "
+             "changes made to the network project by hand."))
+        self.delta_transfer_check = pm.checkBoxGrp(
+            label="Delta Transfer Large Files",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=output_options_layout,
+            annotation=
+            ("(Threaded sync) Only rewrite the parts of large files (caches, "
+             "textures) that changed since the last sync."))
+        self.sync_dependencies_check = pm.checkBoxGrp(
+            label="Only Sync Scene Dependencies",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=output_options_layout,
+            annotation=
+            ("Only copy the files the scene reads in the frame range (textures, "
+             "caches, stand-ins, references) instead of mirroring the whole "
+             "project. Nothing is deleted from the network project."))
+        self.verify_sync_check = pm.checkBoxGrp(
+            label="Verify Synced Files",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=output_options_layout,
+            annotation=
+            ("After syncing, compare the contents of local and network files and "
+             "recopy any that differ. Only files that changed since they were "
+             "last verified are read."))
+        self.bandwidth_limit_field = pm.floatFieldGrp(
+            label="Bandwidth Limit (MB/s)",
+            columnWidth=[1, self.LABEL_WIDTH],
+            precision=1,
+            parent=output_options_layout,
+            annotation=
+            ("Maximum copy speed to the network project, shared by every sync to "
+             "it from this Maya session. 0 copies at full speed."))
+        self.max_transfers_field = pm.intFieldGrp(
+            label="Parallel Copies",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=output_options_layout,
+            annotation="(Threaded sync) Number of files copied at once.")
+        self.bundle_threshold_field = pm.intFieldGrp(
+            label="Bundle Files Under (KB)",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=output_options_layout,
+            annotation=
+            ("(Threaded sync) Send changed files smaller than this as a few "
+             "compressed archives, unpacked into the network project from this "
+             "machine. 0 copies every file directly."))
+        self.watch_project_check = pm.checkBoxGrp(
+            label="Watch Project",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=output_options_layout,
+            changeCommand1=lambda _: self.apply_and_save(),
+            annotation=
+            ("(Threaded sync) Keep syncing the project to the network project in "
+             "the background while you work, so submitting only has to copy the "
+             "last few changes. Keeps running after the dialog is closed."))
+        self.profile_submit_check = pm.checkBoxGrp(
+            label="Profile Submit",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=output_options_layout,
+            annotation=
+            ("Print how long each part of the submit took and save a Chrome trace "
+             f"of it to {SYNC_METADATA_DIR}/{SubmitProfiler.PROFILE_DIR} in the "
+             "network project."))
+        self.profile_python_check = pm.checkBoxGrp(
+            label="Profile Python",
+            columnWidth=[1, self.LABEL_WIDTH],
+            parent=output_options_layout,
+            annotation=("Also run cProfile during the submit and save the "
+                        "result next to the trace."))
+        progress_layout = pm.columnLayout(parent=main_layout,
+                                          adjustableColumn=True)
+        self.progress_bar = pm.progressBar(parent=progress_layout,
+                                           maxValue=self.PROGRESS_STEPS)
+        self.progress_label = pm.text(label="",
+                                      align="left",
+                                      parent=progress_layout)
+        self.cancel_button = pm.button(label="Cancel Sync",
+                                       parent=progress_layout,
+                                       enable=False,
+                                       command=lambda _: self.cancel())
+
         confirm_buttons_form = pm.formLayout(parent=main_layout)
 
         self.close_button = pm.button(label="Save and Close",
                                       parent=confirm_buttons_form,
                                       command=lambda _: self.close())
+        self.batch_submit_button = pm.button(
+            label="Batch Submit Scenes...",
+            parent=confirm_buttons_form,
+            annotation=
+            ("Submit several .ma scenes of this project at once, syncing the "
+             "project only once. Each scene keeps its own render layers and "
+             "frame range, everything else comes from this dialog."),
+            command=lambda _: self.batch_submit())
         self.generate_config = pm.button(
             label="Generate Config and Sync",
             parent=confirm_buttons_form,
@@ -345,10 +796,13 @@ class SubmitUI:
             edit=True,
             attachForm=[[self.close_button, "left", 0],
                         [self.close_button, "top", self.MARGIN],
+                        [self.batch_submit_button, "top", self.MARGIN],
                         [self.generate_config, "right", 0],
                         [self.generate_config, "top", self.MARGIN]],
-            attachPosition=[[self.close_button, "right", self.MARGIN, 50],
-                            [self.generate_config, "left", self.MARGIN, 50]])
+            attachPosition=[[self.close_button, "right", self.MARGIN, 33],
+                            [self.batch_submit_button, "left", self.MARGIN, 33],
+                            [self.batch_submit_button, "right", self.MARGIN, 67],
+                            [self.generate_config, "left", self.MARGIN, 67]])
 
         self.apply_state_to_ui(self.state)
 
@@ -357,14 +811,22 @@ class SubmitUI:
                        edit=True,
                        value1=state.generate_tx)
         pm.checkBoxGrp(self.force_tx_check, edit=True, value1=state.force_tx)
+        pm.checkBoxGrp(self.tx_prepass_check,
+                       edit=True,
+                       value1=state.tx_prepass)
+        pm.checkBoxGrp(self.skip_rendered_check,
+                       edit=True,
+                       value1=state.skip_rendered_frames)
         pm.intField(self.start_frame_field, edit=True, value=state.start_frame)
         pm.intField(self.end_frame_field, edit=True, value=state.end_frame)
-        for layer_ui in self.ui_render_layers.values():
-            layer_ui.delete()
-        for layer_state in state.render_layers:
-            layer_ui = RenderLayerUI(self.render_layers_layout)
-            layer_ui.update(layer_state)
-            self.ui_render_layers[layer_state.name] = layer_ui
+        pm.intFieldGrp(self.farm_node_count_field,
+                       edit=True,
+                       value1=state.farm_node_count)
+        if state.farm_backend in ProjectManager.JOB_WRITERS:
+            pm.optionMenuGrp(self.farm_backend_input,
+                             edit=True,
+                             value=state.farm_backend)
+        self.show_layer_page()
         pm.textField(self.project_dir_input,
                      edit=True,
                      text=state.network_project_location)
@@ -374,6 +836,40 @@ class SubmitUI:
         pm.textFieldGrp(self.exclude_dir_input,
                         edit=True,
                         text=",".join(state.exclude_directories))
+        if state.sync_backend in ProjectManager.SYNC_BACKENDS:
+            pm.optionMenuGrp(self.sync_backend_input,
+                             edit=True,
+                             value=state.sync_backend)
+        pm.checkBoxGrp(self.rescan_network_check,
+                       edit=True,
+                       value1=state.rescan_network_project)
+        pm.checkBoxGrp(self.delta_transfer_check,
+                       edit=True,
+                       value1=state.delta_transfer)
+        pm.checkBoxGrp(self.sync_dependencies_check,
+                       edit=True,
+                       value1=state.sync_dependencies_only)
+        pm.checkBoxGrp(self.verify_sync_check,
+                       edit=True,
+                       value1=state.verify_sync)
+        pm.floatFieldGrp(self.bandwidth_limit_field,
+                         edit=True,
+                         value1=state.sync_bandwidth_limit)
+        pm.intFieldGrp(self.max_transfers_field,
+                       edit=True,
+                       value1=state.sync_max_transfers)
+        pm.intFieldGrp(self.bundle_threshold_field,
+                       edit=True,
+                       value1=state.bundle_threshold)
+        pm.checkBoxGrp(self.watch_project_check,
+                       edit=True,
+                       value1=state.watch_project)
+        pm.checkBoxGrp(self.profile_submit_check,
+                       edit=True,
+                       value1=state.profile_submit)
+        pm.checkBoxGrp(self.profile_python_check,
+                       edit=True,
+                       value1=state.profile_python)
         return self
 
     def apply_ui_to_state(self) -> SubmitUIState:
@@ -383,46 +879,216 @@ class SubmitUI:
         self.state.force_tx = pm.checkBoxGrp(self.force_tx_check,
                                              query=True,
                                              value1=True)
+        self.state.tx_prepass = pm.checkBoxGrp(self.tx_prepass_check,
+                                               query=True,
+                                               value1=True)
+        self.state.skip_rendered_frames = pm.checkBoxGrp(
+            self.skip_rendered_check, query=True, value1=True)
         self.state.start_frame = pm.intField(self.start_frame_field,
                                              query=True,
                                              value=True)
         self.state.end_frame = pm.intField(self.end_frame_field,
                                            query=True,
                                            value=True)
-        render_layers = []
-        for layer_name, layer_ui in self.ui_render_layers.items():
-            render_layers.append(
-                RenderLayer(
-                    layer_name,
-                    pm.checkBox(layer_ui.render_layer_checkbox,
-                                query=True,
-                                value=True),
-                    pm.intField(layer_ui.render_layer_packet_input,
-                                query=True,
-                                value=True)))
-        self.state.render_layers = render_layers
+        self.state.farm_node_count = pm.intFieldGrp(self.farm_node_count_field,
+                                                    query=True,
+                                                    value1=True)
+        self.state.farm_backend = pm.optionMenuGrp(self.farm_backend_input,
+                                                   query=True,
+                                                   value=True)
+        self.read_layer_rows()
         self.state.network_project_location = pm.textField(
             self.project_dir_input, query=True, text=True)
         self.state.network_render_location = pm.textField(
             self.render_dir_input, query=True, text=True)
         self.state.exclude_directories = pm.textFieldGrp(
             self.exclude_dir_input, query=True, text=True).split(",")
+        self.state.sync_backend = pm.optionMenuGrp(self.sync_backend_input,
+                                                   query=True,
+                                                   value=True)
+        self.state.rescan_network_project = pm.checkBoxGrp(
+            self.rescan_network_check, query=True, value1=True)
+        self.state.delta_transfer = pm.checkBoxGrp(self.delta_transfer_check,
+                                                   query=True,
+                                                   value1=True)
+        self.state.sync_dependencies_only = pm.checkBoxGrp(
+            self.sync_dependencies_check, query=True, value1=True)
+        self.state.verify_sync = pm.checkBoxGrp(self.verify_sync_check,
+                                                query=True,
+                                                value1=True)
+        self.state.sync_bandwidth_limit = pm.floatFieldGrp(
+            self.bandwidth_limit_field, query=True, value1=True)
+        self.state.sync_max_transfers = pm.intFieldGrp(
+            self.max_transfers_field, query=True, value1=True)
+        self.state.bundle_threshold = pm.intFieldGrp(
+            self.bundle_threshold_field, query=True, value1=True)
+        self.state.watch_project = pm.checkBoxGrp(self.watch_project_check,
+                                                  query=True,
+                                                  value1=True)
+        self.state.profile_submit = pm.checkBoxGrp(self.profile_submit_check,
+                                                   query=True,
+                                                   value1=True)
+        self.state.profile_python = pm.checkBoxGrp(self.profile_python_check,
+                                                   query=True,
+                                                   value1=True)
         return self.state
 
+    def filtered_layers(self) -> list[RenderLayer]:
+        text = self.layer_filter.lower()
+        if not text:
+            return self.state.render_layers
+        return [
+            layer for layer in self.state.render_layers
+            if text in layer.name.lower() or text in layer.group.lower()
+        ]
+
+    def show_layer_page(self):
+        """Shows the current page of filtered layers, reusing the existing rows and only
+        editing the ones whose layer changed."""
+        layers = self.filtered_layers()
+        page_count = max(math.ceil(len(layers) / self.LAYER_PAGE_SIZE), 1)
+        self.layer_page = min(max(self.layer_page, 0), page_count - 1)
+        start = self.layer_page * self.LAYER_PAGE_SIZE
+        self.shown_layers = layers[start:start + self.LAYER_PAGE_SIZE]
+        while len(self.layer_rows) < len(self.shown_layers):
+            self.layer_rows.append(RenderLayerUI(self.render_layers_layout))
+        for i, layer_ui in enumerate(self.layer_rows):
+            if i < len(self.shown_layers):
+                layer_ui.update(self.shown_layers[i])
+                layer_ui.set_visible(True)
+            else:
+                layer_ui.set_visible(False)
+        pm.text(self.layer_page_label,
+                edit=True,
+                label=f"Page {self.layer_page + 1}/{page_count} "
+                f"({len(layers)} layers)")
+
+    def read_layer_rows(self):
+        """Copies the values of the visible rows into the layers they show. Layers on
+        other pages already hold their values."""
+        for layer_ui, layer in zip(self.layer_rows, self.shown_layers):
+            layer_ui.read_into(layer)
+
+    def set_layer_filter(self, text: str):
+        self.read_layer_rows()
+        self.layer_filter = text.strip()
+        self.layer_page = 0
+        self.show_layer_page()
+
+    def change_layer_page(self, offset: int):
+        self.read_layer_rows()
+        self.layer_page += offset
+        self.show_layer_page()
+
     def apply_and_save(self):
         self.apply_ui_to_state().save_to_node()
+        self.update_watcher()
+
+    def update_watcher(self):
+        """Starts, updates or stops the background sync of the open scene's project to
+        match the dialog's settings."""
+        scene_name = cmds.file(q=True, sn=True)
+        if not scene_name:
+            return
+        try:
+            project_path = ProjectManager.find_project(
+                Path(scene_name).absolute().parent)
+        except Exception:
+            return
+        if self.state.watch_project and self.state.validate_state() is None:
+            ProjectWatcher.watch(project_path, copy.deepcopy(self.state))
+        else:
+            ProjectWatcher.unwatch(project_path)
 
     def close(self):
         self.apply_and_save()
         cmds.deleteUI(self.WINDOW_ID, window=True)
 
     def generate_config_and_sync(self):
+        if self.worker is not None and self.worker.is_running():
+            return
+        self.apply_and_save()
+        err = self.state.validate_state()
+        if err:
+            cmds.confirmDialog(message=err, dismissString="OK")
+            return
+        # The worker gets its own copy so the dialog can keep being edited
+        state = copy.deepcopy(self.state)
+        profiler = SubmitProfiler()
+        context = ProjectManager.collect_submit_context(state, profiler)
+        self.worker = SubmitWorker(
+            lambda worker: ProjectManager.run_submit(state, context, worker),
+            lambda event: maya_utils.executeDeferred(self.show_progress, event),
+            profiler)
+        self.set_running(True)
+        self.worker.start()
+
+    def batch_submit(self):
+        if self.worker is not None and self.worker.is_running():
+            return
+        scene_paths = pm.fileDialog2(caption="Batch Submit Scenes",
+                                     fileFilter="Maya ASCII (*.ma)",
+                                     dialogStyle=1,
+                                     fileMode=4)
+        if not scene_paths:
+            return
         self.apply_and_save()
         err = self.state.validate_state()
         if err:
             cmds.confirmDialog(message=err, dismissString="OK")
             return
-        ProjectManager.package_project(self.state)
+        settings = self.state.to_dict()
+        # Scene specific, so read from each scene's own settings
+        for field in ["render_layers", "start_frame", "end_frame"]:
+            del settings[field]
+        scene_paths = [Path(path).absolute() for path in scene_paths]
+
+        def run(worker: SubmitWorker) -> SyncResult:
+            # Maya's sys.executable isn't a Python interpreter, so no processes here
+            entries, errors = ProjectManager.read_scene_files(
+                scene_paths,
+                settings,
+                self.state.sync_max_transfers,
+                worker,
+                use_processes=False)
+            if errors:
+                raise Exception("Couldn't read " + ", ".join(
+                    f"{scene_path.name} ({e})" for scene_path, e in errors))
+            return ProjectManager.run_batch_submit(entries, worker)
+
+        self.worker = SubmitWorker(
+            run,
+            lambda event: maya_utils.executeDeferred(self.show_progress, event),
+            SubmitProfiler())
+        self.set_running(True)
+        self.worker.start()
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+
+    def set_running(self, running: bool):
+        pm.button(self.generate_config, edit=True, enable=not running)
+        pm.button(self.batch_submit_button, edit=True, enable=not running)
+        pm.button(self.cancel_button, edit=True, enable=running)
+
+    def show_progress(self, event: "ProgressEvent"):
+        """Called on the main thread for every event posted by the worker."""
+        if not pm.window(self.WINDOW_ID, exists=True):
+            # The dialog was closed while the submit kept running
+            if event.finished:
+                print(f"Smedge submit: {event.describe()}")
+            return
+        pm.progressBar(self.progress_bar,
+                       edit=True,
+                       progress=int(event.fraction() * self.PROGRESS_STEPS))
+        pm.text(self.progress_label, edit=True, label=event.describe())
+        if event.finished:
+            self.set_running(False)
+            if event.error is not None and not isinstance(
+                    event.error, SubmitCancelled):
+                cmds.confirmDialog(message=event.describe(),
+                                   dismissString="OK")
 
     def createFilepathUI(self, label, parent):
         filepath_row_layout = pm.rowLayout(
@@ -449,79 +1115,3788 @@ class SubmitUI:
 
     def show(self):
         pm.showWindow(self.main_window)
+        self.update_watcher()
 
 
-class ProjectManager:
-    """This class contains the functions that handle all of the file syncing and config generation"""
+class MayaAsciiNode:
+    """A node read from a .ma file. Attribute values are kept as the raw string tokens
+    that followed the attribute name in its setAttr statement."""
+    node_type: Optional[str] = None
+    name: str = ""
+    parent: Optional[str] = None
+    attrs: dict[str, list[str]] = {}
+
+    def __init__(self,
+                 node_type: Optional[str],
+                 name: str,
+                 parent: Optional[str] = None):
+        self.node_type = node_type
+        self.name = name
+        self.parent = parent
+        self.attrs = {}
+
+    def get(self, *attr_names: str) -> Optional[list[str]]:
+        """Returns the values of the first of attr_names that was set. Pass both the long
+        and short attribute name, since files saved by Maya use the short one."""
+        for attr_name in attr_names:
+            if attr_name in self.attrs:
+                return self.attrs[attr_name]
+        return None
+
+    def get_array(self, *attr_names: str) -> list[str]:
+        """Returns the elements of an array attribute such as stringArray, which .ma files
+        store as the type and element count followed by the elements."""
+        values = self.get(*attr_names)
+        if not values or not values[0].endswith("Array"):
+            return []
+        return values[2:]
+
+    def get_string(self, *attr_names: str) -> Optional[str]:
+        values = self.get(*attr_names)
+        if not values:
+            return None
+        return values[-1]
+
+    def get_bool(self, *attr_names: str) -> bool:
+        value = self.get_string(*attr_names)
+        return value in ("yes", "on", "true", "1")
+
+
+class MayaAsciiScene:
+    """Minimal reader for the parts of a .ma file the submit script needs, so that scenes
+    can be inspected without running Maya."""
+    TOKEN_RE = re.compile(r'//[^\n]*|"((?:[^"\\]|\\.)*)"|(;)|([^\s;"]+)')
+    ESCAPE_RE = re.compile(r"\\(.)")
+    ESCAPES = {"n": "\n", "t": "\t"}
+    # setAttr flags that are followed by a value
+    SETATTR_VALUE_FLAGS = {
+        "-k", "-keyable", "-l", "-lock", "-cb", "-channelBox", "-s", "-size",
+        "-type", "-ch", "-capacityHint"
+    }
+    path: Path = None
+    nodes: dict[str, MayaAsciiNode] = {}
+    references: list[str] = []
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.nodes = {}
+        self.references = []
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            self.parse(f.read())
+
+    def nodes_of_type(self, node_type: str) -> list[MayaAsciiNode]:
+        return [
+            node for node in self.nodes.values() if node.node_type == node_type
+        ]
+
+    @classmethod
+    def tokenize(cls, text: str) -> Iterable[list[tuple[bool, str]]]:
+        """Splits the file into statements. Each token is (is_quoted_string, value)."""
+        statement = []
+        for match in cls.TOKEN_RE.finditer(text):
+            quoted, end, word = match.groups()
+            if quoted is None and end is None and word is None:
+                # Comment
+                continue
+            if end is not None:
+                if statement:
+                    yield statement
+                statement = []
+            elif quoted is not None:
+                value = cls.ESCAPE_RE.sub(
+                    lambda m: cls.ESCAPES.get(m.group(1), m.group(1)), quoted)
+                # Long strings are split into "part" + "part"
+                if len(statement) >= 2 and statement[-1] == (
+                        False, "+") and statement[-2][0]:
+                    statement.pop()
+                    value = statement.pop()[1] + value
+                statement.append((True, value))
+            elif word not in ("(", ")"):
+                # Long strings are also wrapped in parentheses
+                statement.append((False, word))
+        if statement:
+            yield statement
+
+    def parse(self, text: str):
+        current: Optional[MayaAsciiNode] = None
+        for statement in self.tokenize(text):
+            command = statement[0][1]
+            if command == "createNode":
+                current = MayaAsciiNode(
+                    statement[1][1],
+                    self.flag_value(statement, "-n") or "",
+                    self.flag_value(statement, "-p"))
+                self.nodes[current.name] = current
+            elif command == "select" and len(statement) > 1:
+                name = statement[-1][1].lstrip(":")
+                if name not in self.nodes:
+                    self.nodes[name] = MayaAsciiNode(None, name)
+                current = self.nodes[name]
+            elif command == "setAttr":
+                self.parse_set_attr(statement, current)
+            elif command == "file" and any(
+                    word in ("-r", "-rdi", "-reference")
+                    for _, word in statement) and statement[-1][0]:
+                self.references.append(statement[-1][1])
 
     @staticmethod
-    def find_project(start_dir: Path) -> Path:
-        cur_dir = start_dir
+    def flag_value(statement: list[tuple[bool, str]],
+                   flag: str) -> Optional[str]:
+        for i in range(len(statement) - 1):
+            if statement[i] == (False, flag):
+                return statement[i + 1][1]
+        return None
+
+    def parse_set_attr(self, statement: list[tuple[bool, str]],
+                       current: Optional[MayaAsciiNode]):
+        i = 1
+        while i < len(statement):
+            quoted, word = statement[i]
+            if not quoted and word in self.SETATTR_VALUE_FLAGS:
+                i += 2
+            elif not quoted and word.startswith("-") and not word[1:2].isdigit():
+                i += 1
+            else:
+                break
+        if i >= len(statement):
+            return
+        attr = statement[i][1]
+        values = [
+            word for quoted, word in statement[i + 1:]
+            if quoted or not word.startswith("-") or word[1:2].isdigit()
+        ]
+        if attr.startswith("."):
+            node = current
+        else:
+            node_name, _, attr = attr.partition(".")
+            node_name = node_name.lstrip(":")
+            node = self.nodes.setdefault(node_name,
+                                         MayaAsciiNode(None, node_name))
+        if node is not None:
+            node.attrs[attr.lstrip(".")] = values
+
+
+class SceneDependencies:
+    """Gathers the files a scene reads while rendering a frame range, so that only those
+    files need to be synced."""
+    # Node type -> (path attribute, frame extension attribute) as (long, short) name pairs
+    PATH_ATTRS = {
+        "file": (("fileTextureName", "ftn"), ("useFrameExtension", "ufe")),
+        "aiImage": (("filename", "fn"), ("useFrameExtension", "ufe")),
+        "aiStandIn": (("dso", "dso"), ("useFrameExtension", "ufe")),
+        "aiVolume": (("filename", "fn"), ("useFrameExtension", "ufe")),
+        "AlembicNode": (("abc_File", "fn"), None),
+        "gpuCache": (("cacheFileName", "cfn"), None),
+    }
+    TOKEN_RE = re.compile(r"(<[^>]+>|#+)")
+    UDIM_TOKENS = {"<udim>": r"\d{4}", "<uvtile>": r"_u\d+_v\d+",
+                   "<tile>": r"_u\d+_v\d+", "<u>": r"\d+", "<v>": r"\d+"}
+    FRAME_TOKENS = {"<f>", "<frame>", "<f2>", "<f3>", "<f4>"}
+    start_frame: int = 0
+    end_frame: int = 1
+    files: set[Path] = set()
+    _listings: dict[Path, list[str]] = {}
+
+    def __init__(self, start_frame: int, end_frame: int):
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.files = set()
+        self._listings = {}
+
+    def add_path(self,
+                 path: str,
+                 root: Path,
+                 use_frame_extension: bool = False):
+        """Adds every file matched by a path from the scene.
+        Args:
+            path (str): Path as stored in the scene. May contain UDIM/frame tokens or
+                environment variables, and is resolved against root if relative.
+            root (Path): Project root used to resolve relative paths
+            use_frame_extension (bool): Whether the path is one frame of an image sequence
+        """
+        if not path:
+            return
+        resolved = Path(os.path.expandvars(path))
+        if not resolved.is_absolute():
+            resolved = root.joinpath(resolved)
+        name = resolved.name
+        if use_frame_extension and not self.TOKEN_RE.search(name):
+            # Image sequences store the path of a single frame, e.g. tex.0001.exr
+            name = re.sub(r"\d+(?=\.[^.]*$)", "<f>", name, count=1)
+        if not self.TOKEN_RE.search(name):
+            if resolved.is_file():
+                self.files.add(resolved)
+            return
+        pattern = self.token_pattern(name)
+        for candidate in self.list_dir(resolved.parent):
+            match = pattern.fullmatch(candidate)
+            if match is None:
+                continue
+            frame = match.groupdict().get("frame")
+            if frame is not None and not (self.start_frame <= int(frame) <=
+                                          self.end_frame):
+                continue
+            self.files.add(resolved.parent.joinpath(candidate))
+
+    @classmethod
+    def token_pattern(cls, name: str) -> re.Pattern:
+        pattern = ""
+        has_frame = False
+        for part in cls.TOKEN_RE.split(name):
+            token = part.lower()
+            if token in cls.UDIM_TOKENS:
+                pattern += cls.UDIM_TOKENS[token]
+            elif token in cls.FRAME_TOKENS or part.startswith("#"):
+                pattern += r"(?P=frame)" if has_frame else r"(?P<frame>-?\d+)"
+                has_frame = True
+            elif cls.TOKEN_RE.fullmatch(part):
+                pattern += ".*?"
+            else:
+                pattern += re.escape(part)
+        return re.compile(pattern, re.IGNORECASE)
+
+    def list_dir(self, directory: Path) -> list[str]:
+        """Lists a directory once, no matter how many tokenized paths point into it."""
+        if directory not in self._listings:
+            try:
+                self._listings[directory] = os.listdir(directory)
+            except OSError:
+                self._listings[directory] = []
+        return self._listings[directory]
+
+    def split_by_project(self,
+                         project_path: Path) -> tuple[set[str], list[Path]]:
+        """Returns the project relative paths (with forward slashes) of all dependencies
+        inside the project, and the dependencies outside of it, which can't be synced."""
+        return self.split_by_paths(self.files, project_path)
+
+    @staticmethod
+    def split_by_paths(paths: Iterable[Path],
+                       project_path: Path) -> tuple[set[str], list[Path]]:
+        inside = set()
+        outside = []
+        for path in paths:
+            try:
+                inside.add(path.resolve().relative_to(
+                    project_path.resolve()).as_posix())
+            except ValueError:
+                outside.append(path)
+        return inside, sorted(outside)
+
+    @classmethod
+    def from_maya(cls, scene_path: Path, project_path: Path, start_frame: int,
+                  end_frame: int) -> "SceneDependencies":
+        """Collects dependencies from the scene currently open in Maya."""
+        deps = cls(start_frame, end_frame)
+        deps.add_path(str(scene_path), project_path)
+        deps.add_path("workspace.mel", project_path)
+        for node_type, (path_attr, frame_attr) in cls.PATH_ATTRS.items():
+            for node in cmds.ls(type=node_type) or []:
+                use_frame_extension = False
+                if frame_attr is not None:
+                    use_frame_extension = bool(
+                        cmds.getAttr(f"{node}.{frame_attr[0]}"))
+                deps.add_path(cmds.getAttr(f"{node}.{path_attr[0]}"),
+                              project_path, use_frame_extension)
+        for ref_node in cmds.ls(type="reference") or []:
+            if ref_node == "sharedReferenceNode":
+                continue
+            try:
+                deps.add_path(
+                    cmds.referenceQuery(ref_node,
+                                        filename=True,
+                                        withoutCopyNumber=True),
+                    project_path)
+            except RuntimeError:
+                # Reference nodes without a file
+                pass
+        return deps
+
+    @classmethod
+    def from_maya_ascii(cls, scene_path: Path, project_path: Path,
+                        start_frame: int,
+                        end_frame: int) -> "SceneDependencies":
+        """Collects dependencies by parsing a .ma file, following .ma references."""
+        deps = cls(start_frame, end_frame)
+        deps.add_path("workspace.mel", project_path)
+        pending = [scene_path]
+        parsed = set()
+        while pending:
+            path = pending.pop()
+            if path in parsed:
+                continue
+            parsed.add(path)
+            deps.add_path(str(path), project_path)
+            if path.suffix.lower() != ".ma" or not path.is_file():
+                continue
+            scene = MayaAsciiScene(path)
+            for node_type, (path_attr, frame_attr) in cls.PATH_ATTRS.items():
+                for node in scene.nodes_of_type(node_type):
+                    use_frame_extension = frame_attr is not None and node.get_bool(
+                        *frame_attr)
+                    deps.add_path(node.get_string(*path_attr), project_path,
+                                  use_frame_extension)
+            for reference in scene.references:
+                reference = Path(
+                    os.path.expandvars(re.sub(r"\{\d+\}$", "", reference)))
+                if not reference.is_absolute():
+                    reference = project_path.joinpath(reference)
+                pending.append(reference)
+        return deps
+
+
+class PathResolver:
+    """Finds Maya project roots and expands the tokens of Maya's image file prefix.
+    Project roots are cached per directory and checked against the mtime of their
+    workspace.mel, so submitting from a known project costs one stat instead of one per
+    folder level, which adds up on network drives."""
+    WORKSPACE_FILE_NAME = "workspace.mel"
+    # <Token> or the older %s, %l and %c forms
+    TOKEN_RE = re.compile(r"<(\w+)>|%([slc])")
+    LEGACY_TOKENS = {"s": "scene", "l": "renderlayer", "c": "camera"}
+    # Tokens that differ between the layers and cameras of one submit
+    OUTPUT_TOKENS = {"renderlayer", "layer", "camera", "renderpass", "renderpasstype"}
+    INVALID_NAME_RE = re.compile(r'[<>:"/\\|?*\s]+')
+    # Directory -> (project root, workspace.mel mtime)
+    project_roots: dict[str, tuple[Path, float]] = {}
+    project_roots_lock = threading.Lock()
+
+    @classmethod
+    def find_project(cls, start_dir: Path) -> Path:
+        visited = []
+        cur_dir = Path(start_dir)
         while len(cur_dir.parents) > 0:
-            if cur_dir.joinpath('workspace.mel').exists():
+            with cls.project_roots_lock:
+                cached = cls.project_roots.get(str(cur_dir))
+            if cached is not None:
+                root, mtime = cached
+                if cls.workspace_mtime(root) == mtime:
+                    cls.remember(visited, root, mtime)
+                    return root
+            visited.append(str(cur_dir))
+            mtime = cls.workspace_mtime(cur_dir)
+            if mtime is not None:
+                cls.remember(visited, cur_dir, mtime)
                 return cur_dir
             cur_dir = cur_dir.parent
         raise Exception("Maya project not found!")
 
+    @classmethod
+    def workspace_mtime(cls, directory: Path) -> Optional[float]:
+        try:
+            return os.stat(directory.joinpath(
+                cls.WORKSPACE_FILE_NAME)).st_mtime
+        except OSError:
+            return None
+
+    @classmethod
+    def remember(cls, directories: list[str], root: Path, mtime: float):
+        with cls.project_roots_lock:
+            for directory in directories:
+                cls.project_roots[directory] = (root, mtime)
+
     @staticmethod
-    def package_project(state: SubmitUIState):
-        scene_path = Path(cmds.file(q=True, sn=True)).absolute()
-        project_path = Path(ProjectManager.find_project(scene_path))
+    def layer_token(layer: str) -> str:
+        """What Maya writes for <RenderLayer>: Render Setup drops the rs_ prefix of its
+        layers and calls the default layer masterLayer."""
+        if layer == "defaultRenderLayer":
+            return "masterLayer"
+        if layer.startswith("rs_"):
+            return layer[len("rs_"):]
+        return layer
 
-        scene_path_from_project = Path(
-            os.path.relpath(scene_path, project_path))
+    @classmethod
+    def expand(cls,
+               prefix: str,
+               scene: str,
+               version: str = "",
+               layer: Optional[str] = None,
+               camera: Optional[str] = None) -> str:
+        """Expands the tokens of an image file prefix. Layer and camera tokens are
+        removed when no layer or camera is given, and unknown tokens are kept."""
+        values = {
+            "scene": scene,
+            "version": version,
+            "renderlayer": cls.layer_token(layer) if layer else "",
+            "layer": cls.layer_token(layer) if layer else "",
+            "camera": (camera or "").rpartition(":")[2],
+            # Only the beauty pass is tracked
+            "renderpass": "beauty",
+            "renderpasstype": "beauty",
+            "renderpassfilegroup": "",
+        }
 
-        exclusions = ""
-        for excl in state.exclude_directories:
-            exclusions += f"/xd {excl} "
+        def replace(match: re.Match) -> str:
+            if match.group(2) is not None:
+                token = cls.LEGACY_TOKENS[match.group(2)]
+            else:
+                token = match.group(1).lower()
+            if layer is None and token in cls.OUTPUT_TOKENS:
+                return ""
+            return values.get(token, match.group(0))
 
-        os.system(
-            fr'robocopy "{project_path}" "{state.network_project_location}" /XO /MIR {exclusions}'
-        )
+        return cls.TOKEN_RE.sub(replace, prefix)
 
-        print(
-            fr'robocopy "{project_path}" "{state.network_project_location}" /XO /MIR {exclusions}'
-        )
+    @classmethod
+    def file_name(cls, name: str) -> str:
+        """Turns a name that may contain path separators or tokens into something that
+        is a valid file name on every platform."""
+        return cls.INVALID_NAME_RE.sub("_", name).strip("_.")
 
-        render_prefix = cmds.getAttr('defaultRenderGlobals.imageFilePrefix')
-        rendername = render_prefix
-        if rendername == None:
-            rendername = ""
-        rendername = rendername.replace('<Scene>', scene_path.name)
-        if rendername == "":
-            rendername = scene_path.name
-
-        for render_layer in state.render_layers:
-            if render_layer.enabled:
-                smedge_path = Path(
-                    state.network_project_location
-                ).parent.joinpath(
-                    f'{rendername}_{render_layer.name.upper()}_SmedgeSettings.sj'
-                )
-                with open(smedge_path, 'w') as smedge_config:
-                    config_name = f"{scene_path.name}_{render_layer.name.upper()}"
-                    config_contents = f'''[4c8e3273-5d60-4d68-af28-23799ab7134c]
-                    ID = 4c8e3273-5d60-4d68-af28-23799ab7134c
-                    Type = 833c1fa9-fc0b-46da-920a-c4b74b92d5c1
-                    Name = {config_name}
-                    Project = {state.network_project_location}
-                    Scene = {Path(state.network_project_location).joinpath(scene_path_from_project)}
-                    RenderDir = {Path(state.network_render_location).joinpath(f'{rendername}_render').absolute()}
-                    Range = {state.start_frame}-{state.end_frame}
-                    Status = 0
-                    PacketSize = {render_layer.packet_size}
-                    FailureLimit = 0
-                    OvertimeKill = 0
-                    DistributeMode = 1
-                    Extra = -ai:txamm no -ai:txaum no -ai:txaun no -ai:txett yes -rl {render_layer.name}'''
-                    smedge_config.write(config_contents)
-                    print(
-                        f"Output smedge config: {smedge_path} \n {config_contents}"
-                    )
+    @classmethod
+    def render_name(cls, prefix: Optional[str], scene: str,
+                    version: str = "") -> str:
+        """Name shared by all jobs of a submit, used for the job files and the render
+        directory: the prefix without its per layer tokens, flattened to one folder
+        name."""
+        expanded = cls.expand(prefix or "", scene, version)
+        parts = [part for part in re.split(r"[/\\]+", expanded) if part]
+        # Removed tokens leave doubled separators behind, e.g. <Scene>_<Camera>_v1
+        name = re.sub(r"_{2,}", "_", cls.file_name("_".join(parts)))
+        return name or cls.file_name(scene)
+
+    @classmethod
+    def output_table(cls, prefix: Optional[str], scene: str, version: str,
+                     layers: Iterable[str],
+                     cameras: list[str]) -> dict[str, list[str]]:
+        """Output path of the beauty pass of each layer, relative to the render directory
+        and without frame number or extension. There is one path per renderable camera.
+        """
+        # Maya names images after the scene when no prefix is set
+        prefix = prefix or "<Scene>"
+        return {
+            layer: [
+                cls.expand(prefix, scene, version, layer, camera)
+                for camera in (cameras or [None])
+            ]
+            for layer in layers
+        }
+
+
+class SubmitProfiler:
+    """Records how long each part of a submit takes, as spans that can be exported as a
+    Chrome trace (open in chrome://tracing or https://ui.perfetto.dev) and summarized as
+    a table. Spans can be recorded from any thread."""
+    PROFILE_DIR = "profiles"
+    HISTORY_FILE_NAME = "history.jsonl"
+    # (name, start, end, thread id, args), times from time.perf_counter
+    spans: list[tuple[str, float, float, int, dict]] = []
+    # Thread id -> thread name, for labelling the trace
+    thread_names: dict[int, str] = {}
+    python_profile: Optional[cProfile.Profile] = None
+
+    def __init__(self):
+        self.spans = []
+        self.thread_names = {}
+        self.python_profile = None
+        self._lock = threading.Lock()
+        self._stage: Optional[tuple[str, float]] = None
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter(), **args)
+
+    def add_span(self, name: str, start: float, end: float, **args):
+        thread = threading.current_thread()
+        with self._lock:
+            self.spans.append((name, start, end, thread.ident, args))
+            self.thread_names[thread.ident] = thread.name
+
+    def begin_stage(self, stage: str):
+        """Ends the current progress stage's span and starts one for the given stage."""
+        self.end_stage()
+        self._stage = (stage, time.perf_counter())
+
+    def end_stage(self):
+        if self._stage is not None:
+            stage, start = self._stage
+            self._stage = None
+            self.add_span(f"stage:{stage}", start, time.perf_counter())
+
+    @contextlib.contextmanager
+    def capture_python(self, enabled: bool):
+        """Runs cProfile on the calling thread while the block runs. Work done on other
+        threads, like the sync's copy pool, only shows up as time spent waiting."""
+        profile = cProfile.Profile() if enabled else None
+        if profile is not None:
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Another profiler is already running, e.g. a parallel CLI submit on
+                # Python versions where profiling is process wide
+                print(f"Warning: Python profiling skipped: {e}")
+                profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                self.python_profile = profile
+
+    def chrome_trace(self) -> dict:
+        origin = min((span[1] for span in self.spans), default=0.0)
+        pid = os.getpid()
+        events = [{
+            "name": "thread_name",
+            "ph": "M",
+            "pid": pid,
+            "tid": tid,
+            "args": {
+                "name": name
+            }
+        } for tid, name in self.thread_names.items()]
+        for name, start, end, tid, args in self.spans:
+            events.append({
+                "name": name,
+                "cat": name.split(":")[0],
+                "ph": "X",
+                "ts": round((start - origin) * 1e6),
+                "dur": round((end - start) * 1e6),
+                "pid": pid,
+                "tid": tid,
+                "args": args
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def total_seconds(self) -> float:
+        if not self.spans:
+            return 0.0
+        return max(span[2] for span in self.spans) - min(span[1]
+                                                         for span in self.spans)
+
+    def totals(self) -> dict[str, tuple[int, float, float]]:
+        """Span name -> number of spans, total seconds and longest span in seconds."""
+        totals: dict[str, tuple[int, float, float]] = {}
+        for name, start, end, _, _ in self.spans:
+            count, total, longest = totals.get(name, (0, 0.0, 0.0))
+            totals[name] = (count + 1, total + end - start,
+                            max(longest, end - start))
+        return totals
+
+    def summary(self) -> str:
+        rows = sorted(self.totals().items(), key=lambda item: -item[1][1])
+        width = max([len("Span")] + [len(name) for name, _ in rows])
+        lines = [
+            f"{'Span':<{width}}  {'Count':>5}  {'Total':>9}  {'Longest':>9}"
+        ]
+        for name, (count, total, longest) in rows:
+            lines.append(f"{name:<{width}}  {count:>5}  {total:>8.3f}s  "
+                         f"{longest:>8.3f}s")
+        lines.append(f"{'Submit':<{width}}  {'':>5}  "
+                     f"{self.total_seconds():>8.3f}s")
+        return "\n".join(lines)
+
+    def save(self, network_project: Path, label: str) -> Path:
+        """Writes the trace and any Python profile to the network project's metadata
+        directory, and appends the stage totals to a history file so submit times can
+        be compared over time.
+        Returns:
+            The path of the trace file
+        """
+        directory = network_project.joinpath(SYNC_METADATA_DIR,
+                                             self.PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{label}_{stamp}")
+        trace_path = directory.joinpath(f"{name}.trace.json")
+        with open(trace_path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        if self.python_profile is not None:
+            self.python_profile.dump_stats(directory.joinpath(f"{name}.prof"))
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "label": label,
+            "host": platform.node(),
+            "total_seconds": round(self.total_seconds(), 3),
+            "spans": {
+                name: round(total, 3)
+                for name, (_, total, _) in self.totals().items()
+            }
+        }
+        with open(directory.joinpath(self.HISTORY_FILE_NAME), "a") as f:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+        return trace_path
+
+
+class SubmitCancelled(Exception):
+    """Raised inside a submit when the user presses cancel."""
+    pass
+
+
+class ProgressEvent:
+    """Snapshot of a running submit, posted by SubmitWorker."""
+    stage: str = ""
+    message: str = ""
+    files_scanned: int = 0
+    files_done: int = 0
+    files_total: int = 0
+    bytes_done: int = 0
+    bytes_total: int = 0
+    bytes_per_second: float = 0.0
+    eta_seconds: Optional[float] = None
+    configs_written: int = 0
+    finished: bool = False
+    error: Optional[BaseException] = None
+
+    def fraction(self) -> float:
+        """How far along the current stage is, from 0 to 1."""
+        if self.finished:
+            return 1.0
+        if self.bytes_total > 0:
+            return min(self.bytes_done / self.bytes_total, 1.0)
+        if self.files_total > 0:
+            return min(self.files_done / self.files_total, 1.0)
+        return 0.0
+
+    def describe(self) -> str:
+        if self.finished:
+            if isinstance(self.error, SubmitCancelled):
+                return "Cancelled"
+            if self.error is not None:
+                return f"Failed: {self.error}"
+            return f"Done. {self.message}"
+        if self.stage == "scan":
+            return f"Scanning project... {self.files_scanned} files"
+        if self.stage == "copy":
+            description = (f"Copying {self.files_done}/{self.files_total} files, "
+                           f"{format_bytes(self.bytes_done)}/"
+                           f"{format_bytes(self.bytes_total)}")
+            if self.bytes_per_second > 0:
+                description += f" at {format_bytes(self.bytes_per_second)}/s"
+            if self.eta_seconds is not None:
+                description += f", {int(self.eta_seconds)}s left"
+            return description
+        if self.stage == "verify":
+            return (f"Verifying {self.files_done}/{self.files_total} files, "
+                    f"{format_bytes(self.bytes_done)}/"
+                    f"{format_bytes(self.bytes_total)}")
+        if self.stage == "tx":
+            return f"Generating TX files... {self.files_done}/{self.files_total}"
+        if self.stage == "read":
+            return f"Reading scenes... {self.files_done}/{self.files_total}"
+        if self.stage == "configs":
+            return f"Writing configs... {self.configs_written} written"
+        return self.message
+
+
+class SubmitWorker:
+    """Runs a submit task on a background thread. The task receives the worker so it can
+    report progress and check for cancellation. Nothing here touches Maya: on_event is
+    called from the worker thread and is responsible for getting back to the UI thread."""
+    # Minimum time between two progress events within the same stage
+    MIN_REPORT_INTERVAL = 0.1
+    task: Callable[["SubmitWorker"], object] = None
+    on_event: Callable[[ProgressEvent], None] = None
+    progress: ProgressEvent = None
+    result: object = None
+    # Records a span for every progress stage, plus any spans added by the task
+    profiler: SubmitProfiler = None
+
+    def __init__(self,
+                 task: Callable[["SubmitWorker"], object],
+                 on_event: Callable[[ProgressEvent], None],
+                 profiler: Optional[SubmitProfiler] = None):
+        self.task = task
+        self.on_event = on_event
+        self.progress = ProgressEvent()
+        self.profiler = profiler or SubmitProfiler()
+        self.result = None
+        self._cancel_event = threading.Event()
+        self._thread = None
+        self._last_report = 0.0
+        self._stage_start = time.monotonic()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run,
+                                        name="SmedgeSubmitWorker",
+                                        daemon=True)
+        self._thread.start()
+
+    def run(self):
+        """Runs the task on the calling thread. start() runs this on a new thread."""
+        try:
+            self.result = self.task(self)
+        except BaseException as e:
+            self.progress.error = e
+        finally:
+            self.profiler.end_stage()
+            self.progress.finished = True
+            self.emit()
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.is_cancelled():
+            raise SubmitCancelled()
+
+    def report(self, stage: Optional[str] = None, **fields):
+        """Updates the progress snapshot and posts it, throttled to MIN_REPORT_INTERVAL
+        unless the stage changed."""
+        now = time.monotonic()
+        stage_changed = stage is not None and stage != self.progress.stage
+        if stage_changed:
+            self.progress.stage = stage
+            self._stage_start = now
+            self.profiler.begin_stage(stage)
+        for field, value in fields.items():
+            setattr(self.progress, field, value)
+        if self.progress.stage == "copy":
+            elapsed = now - self._stage_start
+            if elapsed > 0 and self.progress.bytes_done > 0:
+                self.progress.bytes_per_second = self.progress.bytes_done / elapsed
+                self.progress.eta_seconds = (
+                    self.progress.bytes_total -
+                    self.progress.bytes_done) / self.progress.bytes_per_second
+        if stage_changed or now - self._last_report >= self.MIN_REPORT_INTERVAL:
+            self._last_report = now
+            self.emit()
+
+    def emit(self):
+        self.on_event(copy.copy(self.progress))
+
+
+def format_bytes(size: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class SubmitContext:
+    """Everything a submit needs from the open Maya scene. It is collected on the main
+    thread so the rest of the submit can run on a SubmitWorker without touching Maya."""
+    scene_path: Path = None
+    project_path: Path = None
+    render_prefix: Optional[str] = None
+    include_files: Optional[set[str]] = None
+    # Textures to convert in the TX pre-pass
+    textures: list[Path] = []
+    # Renderable cameras and the render version, for expanding the render prefix
+    cameras: list[str] = []
+    render_version: str = ""
+    # Project relative paths of the files to sync first
+    priority_files: set[str] = set()
+
+    def __init__(self,
+                 scene_path: Path,
+                 project_path: Path,
+                 render_prefix: Optional[str],
+                 include_files: Optional[set[str]],
+                 textures: Optional[list[Path]] = None,
+                 cameras: Optional[list[str]] = None,
+                 render_version: Optional[str] = None,
+                 priority_files: Optional[set[str]] = None):
+        self.scene_path = scene_path
+        self.project_path = project_path
+        self.render_prefix = render_prefix
+        self.include_files = include_files
+        self.textures = textures or []
+        self.cameras = cameras or []
+        self.render_version = render_version or ""
+        self.priority_files = priority_files or set()
+
+
+class SyncResult:
+    """Summary of the work done by a sync backend."""
+    files_scanned: int = 0
+    files_copied: int = 0
+    files_deleted: int = 0
+    bytes_copied: int = 0
+    # Bytes of delta transferred files that were already up to date on the network
+    bytes_skipped: int = 0
+
+    def __init__(self):
+        self.files_scanned = 0
+        self.files_copied = 0
+        self.files_deleted = 0
+        self.bytes_copied = 0
+        self.bytes_skipped = 0
+
+    def __str__(self):
+        summary = (f"{self.files_scanned} files scanned, "
+                   f"{self.files_copied} copied ({self.bytes_copied} bytes), "
+                   f"{self.files_deleted} deleted")
+        if self.bytes_skipped > 0:
+            summary += f", {self.bytes_skipped} unchanged bytes skipped by delta transfer"
+        return summary
+
+    def add(self, other: "SyncResult"):
+        self.files_scanned += other.files_scanned
+        self.files_copied += other.files_copied
+        self.files_deleted += other.files_deleted
+        self.bytes_copied += other.bytes_copied
+        self.bytes_skipped += other.bytes_skipped
+        return self
+
+
+class BandwidthLimiter:
+    """Token bucket shared by all copies to one destination. Callers go into debt for
+    what they send and sleep until the bucket has refilled enough to cover it."""
+    bytes_per_second: float = 0.0
+    # Largest burst allowed after the limiter was idle
+    capacity: float = 0.0
+    tokens: float = 0.0
+
+    def __init__(self, bytes_per_second: float):
+        self.bytes_per_second = bytes_per_second
+        self.capacity = bytes_per_second
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self._updated) * self.bytes_per_second)
+            self._updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.bytes_per_second if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class TransferScheduler:
+    """Decides the order and pace of the copies made by a sync. The priority files go
+    first and the rest follow from smallest to largest, so bulk caches come last.
+    Copies to the same destination share one bandwidth cap within a process, and a lock
+    file in the network project makes syncs from other processes and machines to the
+    same destination take turns."""
+    CHUNK_SIZE = 1024 * 1024
+    LOCK_FILE_NAME = "sync.lock"
+    # The lock file is touched this often while held, and taken over by others once it
+    # hasn't been touched for LOCK_STALE_SECONDS, e.g. after a crash
+    LOCK_HEARTBEAT_SECONDS = 10
+    LOCK_STALE_SECONDS = 120
+    # Destination -> limiter shared by every sync to it in this process
+    limiters: dict[str, BandwidthLimiter] = {}
+    limiters_lock = threading.Lock()
+    limiter: Optional[BandwidthLimiter] = None
+    # Project relative paths to copy before everything else
+    priority_files: set[str] = set()
+
+    def __init__(self,
+                 destination: Path,
+                 bandwidth_limit: float = 0,
+                 priority_files: Optional[set[str]] = None):
+        """
+        Args:
+            destination (Path): Network project the files are copied to
+            bandwidth_limit (float): Bytes per second, or 0 for no limit
+            priority_files (set[str]): Project relative paths to copy first
+        """
+        self.priority_files = priority_files or set()
+        self.limiter = None
+        if bandwidth_limit > 0:
+            key = os.path.normcase(os.path.abspath(destination))
+            with self.limiters_lock:
+                limiter = self.limiters.get(key)
+                if limiter is None or limiter.bytes_per_second != bandwidth_limit:
+                    limiter = BandwidthLimiter(bandwidth_limit)
+                    self.limiters[key] = limiter
+            self.limiter = limiter
+
+    @classmethod
+    def from_state(cls, state: "SubmitUIState",
+                   priority_files: Optional[set[str]]) -> "TransferScheduler":
+        return cls(Path(state.network_project_location),
+                   state.sync_bandwidth_limit * 1024 * 1024, priority_files)
+
+    def order(self, rel_paths: Iterable[str],
+              files: dict[str, tuple[int, float]]) -> list[str]:
+        return sorted(rel_paths,
+                      key=lambda rel_path:
+                      (rel_path not in self.priority_files, files[rel_path][0],
+                       rel_path))
+
+    def copy_file(self, source: Path, destination: Path) -> int:
+        """Same as ThreadedSyncBackend.copy_file, but paced by the bandwidth limit."""
+        if self.limiter is None:
+            return ThreadedSyncBackend.copy_file(source, destination)
+        temp_path = destination.with_name(destination.name +
+                                          ThreadedSyncBackend.TEMP_SUFFIX)
+        with open(source, "rb") as src, open(temp_path, "wb") as dst:
+            while True:
+                chunk = src.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.limiter.consume(len(chunk))
+                dst.write(chunk)
+        shutil.copystat(source, temp_path)
+        os.replace(temp_path, destination)
+        return os.path.getsize(destination)
+
+    def robocopy_args(self) -> list[str]:
+        """robocopy can only pace itself with a gap between its 64 KiB blocks."""
+        if self.limiter is None:
+            return []
+        gap_ms = math.ceil(64 * 1024 / self.limiter.bytes_per_second * 1000)
+        return [f"/IPG:{gap_ms}"]
+
+    @classmethod
+    @contextlib.contextmanager
+    def lock(cls, destination: Path, worker: Optional[SubmitWorker] = None):
+        """Holds the sync lock of a network project, waiting for other syncs to it to
+        finish first."""
+        lock_path = destination.joinpath(SYNC_METADATA_DIR, cls.LOCK_FILE_NAME)
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        token = uuid.uuid4().hex
+        owner = {
+            "host": platform.node(),
+            "pid": os.getpid(),
+            "thread": threading.get_ident(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "token": token
+        }
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                current = cls.read_lock(lock_path)
+                if current is None:
+                    # Released in the meantime
+                    continue
+                age, holder = current
+                holder = holder.get("host", "another machine")
+                if age > cls.LOCK_STALE_SECONDS:
+                    if cls.take_over(lock_path):
+                        print(f"Took over the stale sync lock of {holder}")
+                    continue
+                if worker is not None:
+                    worker.report(stage="waiting",
+                                  message=f"Waiting for a sync from {holder}...")
+                    worker.check_cancelled()
+                time.sleep(1)
+                continue
+            with os.fdopen(fd, "w") as f:
+                json.dump(owner, f)
+            break
+
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(cls.LOCK_HEARTBEAT_SECONDS):
+                try:
+                    os.utime(lock_path)
+                except OSError:
+                    pass
+
+        heartbeat_thread = threading.Thread(target=heartbeat,
+                                            name="SmedgeSyncLock",
+                                            daemon=True)
+        heartbeat_thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            heartbeat_thread.join()
+            current = cls.read_lock(lock_path)
+            # Unless it was taken over because this process stalled for too long
+            if current is not None and current[1].get("token") == token:
+                lock_path.unlink(missing_ok=True)
+
+    @staticmethod
+    def read_lock(lock_path: Path) -> Optional[tuple[float, dict]]:
+        """Returns the age in seconds and owner of a lock file, or None if it doesn't
+        exist. The owner is empty while the lock is still being written."""
+        try:
+            age = time.time() - os.path.getmtime(lock_path)
+        except OSError:
+            return None
+        try:
+            with open(lock_path, "r") as f:
+                return age, json.load(f)
+        except OSError:
+            return None
+        except ValueError:
+            return age, {}
+
+    @classmethod
+    def take_over(cls, lock_path: Path) -> bool:
+        """Removes a stale lock file. It is renamed out of the way rather than deleted so
+        only one waiter can move it, then checked again in case another waiter already
+        replaced it with a fresh lock, which is put back.
+        Returns:
+            Whether the stale lock was removed
+        """
+        stale_path = lock_path.with_name(
+            f"{lock_path.name}.{uuid.uuid4().hex}.stale")
+        try:
+            os.rename(lock_path, stale_path)
+        except OSError:
+            # Another waiter moved it first
+            return False
+        moved = cls.read_lock(stale_path)
+        if moved is not None and moved[0] <= cls.LOCK_STALE_SECONDS:
+            try:
+                # Fails instead of replacing a lock taken since
+                os.link(stale_path, lock_path)
+            except FileExistsError:
+                pass
+            except OSError:
+                # No hard links on this share
+                if not lock_path.exists():
+                    os.rename(stale_path, lock_path)
+            stale_path.unlink(missing_ok=True)
+            return False
+        stale_path.unlink(missing_ok=True)
+        return True
+
+
+class SyncError(Exception):
+    """Raised when the project could not be synced correctly."""
+    pass
+
+
+class SyncBackend:
+    """Interface for the strategies that mirror the local project to the network project."""
+    name: str = ""
+    # Set while a sync runs as part of a submit, to report progress and allow cancelling
+    worker: Optional[SubmitWorker] = None
+    # Orders and paces the copies. Syncs without one copy in any order at full speed.
+    scheduler: Optional[TransferScheduler] = None
+
+    def report(self, **fields):
+        if self.worker is not None:
+            self.worker.report(**fields)
+
+    def check_cancelled(self):
+        if self.worker is not None:
+            self.worker.check_cancelled()
+
+    @classmethod
+    def from_state(cls, state: "SubmitUIState") -> "SyncBackend":
+        """Creates the backend configured with the options chosen in the UI."""
+        return cls()
+
+    def sync(self,
+             source: Path,
+             destination: Path,
+             exclude_directories: list[str],
+             include_files: Optional[set[str]] = None) -> SyncResult:
+        """Mirrors source into destination.
+        Args:
+            source (Path): Local project directory
+            destination (Path): Network project directory
+            exclude_directories (list[str]): Directory names or project-relative paths to skip
+            include_files (set[str]): If given, only these project relative paths (with
+                forward slashes) are copied and nothing is mirror-deleted
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def clean_exclusions(exclude_directories: list[str]) -> list[str]:
+        """Strips whitespace and empty entries left over from the comma separated UI field."""
+        return [
+            excl.strip().replace("\\", "/").strip("/")
+            for excl in exclude_directories if excl.strip() != ""
+        ]
+
+
+class RobocopySyncBackend(SyncBackend):
+    """Shells out to robocopy. Windows only."""
+    name = "robocopy"
+    # robocopy exit codes below this only describe what was copied
+    FAILURE_EXIT_CODE = 8
+
+    def sync(self,
+             source: Path,
+             destination: Path,
+             exclude_directories: list[str],
+             include_files: Optional[set[str]] = None) -> SyncResult:
+        # robocopy changes the network project behind the threaded sync's manifest
+        SyncManifest.invalidate(destination)
+        priority_files = set()
+        if self.scheduler is not None:
+            priority_files = self.scheduler.priority_files
+        if include_files is None:
+            # The priority files go first, then the rest of the mirror
+            self.copy_files(source, destination, priority_files)
+            command = [
+                "robocopy",
+                str(source),
+                str(destination), "/XO", "/MIR"
+            ]
+            for excl in self.clean_exclusions(exclude_directories) + [
+                    SYNC_METADATA_DIR
+            ]:
+                command += ["/xd", excl]
+            self.run(command)
+            return SyncResult()
+
+        self.copy_files(source, destination, include_files & priority_files)
+        self.copy_files(source, destination, include_files - priority_files)
+        return SyncResult()
+
+    def copy_files(self, source: Path, destination: Path,
+                   rel_paths: Iterable[str]):
+        # robocopy takes a list of file names per directory
+        by_directory: dict[str, list[str]] = {}
+        for rel_path in rel_paths:
+            rel_dir, _, name = rel_path.rpartition("/")
+            by_directory.setdefault(rel_dir, []).append(name)
+        for rel_dir, names in sorted(by_directory.items()):
+            self.check_cancelled()
+            self.run([
+                "robocopy",
+                str(source.joinpath(rel_dir)),
+                str(destination.joinpath(rel_dir))
+            ] + sorted(names) + ["/XO"])
+
+    def run(self, command: list[str]):
+        if self.scheduler is not None:
+            command = command + self.scheduler.robocopy_args()
+        print(subprocess.list2cmdline(command))
+        self.report(stage="copy", message="Running robocopy...")
+        process = subprocess.Popen(command)
+        while process.poll() is None:
+            if self.worker is not None and self.worker.is_cancelled():
+                process.terminate()
+                process.wait()
+                self.check_cancelled()
+            time.sleep(0.1)
+        if process.returncode >= self.FAILURE_EXIT_CODE:
+            raise SyncError(
+                f"robocopy failed with exit code {process.returncode}, some "
+                "files could not be copied")
+
+
+class ThreadedSyncBackend(SyncBackend):
+    """Pure Python mirror that detects changes by size and modification time and copies
+    files on a thread pool."""
+    name = "threaded"
+    # Network shares and FAT drives only store modification times to within 2 seconds
+    MTIME_TOLERANCE = 2.0
+    TEMP_SUFFIX = ".smedgesync-tmp"
+    # Files at least this big are delta transferred when delta transfer is enabled
+    DELTA_THRESHOLD = 64 * 1024 * 1024
+    max_workers: int = 16
+    rescan_destination: bool = False
+    delta_transfer: bool = False
+    # Changed files smaller than this many bytes are sent as a FileBundle, 0 for never
+    bundle_threshold: int = 0
+
+    def __init__(self,
+                 max_workers: int = 16,
+                 rescan_destination: bool = False,
+                 delta_transfer: bool = False,
+                 bundle_threshold: int = 0):
+        self.max_workers = max_workers
+        self.rescan_destination = rescan_destination
+        self.delta_transfer = delta_transfer
+        self.bundle_threshold = bundle_threshold
+
+    @classmethod
+    def from_state(cls, state: "SubmitUIState") -> "ThreadedSyncBackend":
+        return cls(max_workers=state.sync_max_transfers,
+                   rescan_destination=state.rescan_network_project,
+                   delta_transfer=state.delta_transfer,
+                   bundle_threshold=state.bundle_threshold * 1024)
+
+    @staticmethod
+    def is_excluded(rel_path: str, name: str, exclusions: list[str]) -> bool:
+        """Matches robocopy /xd semantics: an exclusion is either a directory name that can
+        appear anywhere in the tree or a path relative to the project root."""
+        return name in exclusions or rel_path in exclusions
+
+    @staticmethod
+    def scan_tree(
+        root: Path,
+        exclusions: list[str],
+        rel_root: str = ""
+    ) -> tuple[dict[str, tuple[int, float]], set[str]]:
+        """Lists every file under root.
+        Args:
+            rel_root (str): Path of root relative to the project, for scanning part of
+                a project with exclusions that are relative to the project root
+        Returns:
+            A dict mapping each relative file path to its (size, mtime), and the set of
+            relative directory paths. Paths use forward slashes.
+        """
+        files = {}
+        dirs = set()
+        if not root.is_dir():
+            return files, dirs
+        pending = [(rel_root, str(root))]
+        while pending:
+            rel_dir, abs_dir = pending.pop()
+            with os.scandir(abs_dir) as entries:
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if not ThreadedSyncBackend.is_excluded(
+                                rel_path, entry.name, exclusions):
+                            dirs.add(rel_path)
+                            pending.append((rel_path, entry.path))
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        files[rel_path] = (stat.st_size, stat.st_mtime)
+        return files, dirs
+
+    @classmethod
+    def is_newer(cls, src: tuple[int, float],
+                 dst: Optional[tuple[int, float]]) -> bool:
+        """Whether the destination copy is newer than the source file."""
+        return dst is not None and src[1] < dst[1] - cls.MTIME_TOLERANCE
+
+    @classmethod
+    def needs_copy(cls, src: tuple[int, float],
+                   dst: Optional[tuple[int, float]]) -> bool:
+        """Whether a file has to be copied, mirroring robocopy /XO: changed files are
+        copied unless the destination copy is newer."""
+        if dst is None:
+            return True
+        if cls.is_newer(src, dst):
+            return False
+        src_size, src_mtime = src
+        dst_size, dst_mtime = dst
+        return src_size != dst_size or src_mtime > dst_mtime + cls.MTIME_TOLERANCE
+
+    @classmethod
+    def copy_file(cls, source: Path, destination: Path) -> int:
+        """Copies a single file through a temporary name so an interrupted copy never
+        looks like an up to date file. Returns the number of bytes copied."""
+        temp_path = destination.with_name(destination.name + cls.TEMP_SUFFIX)
+        shutil.copy2(source, temp_path)
+        os.replace(temp_path, destination)
+        return os.path.getsize(destination)
+
+    @staticmethod
+    def stat_files(
+        root: Path, rel_paths: Iterable[str]
+    ) -> tuple[dict[str, tuple[int, float]], set[str]]:
+        """Same as scan_tree, but only for the given files instead of the whole tree."""
+        files = {}
+        dirs = set()
+        for rel_path in rel_paths:
+            try:
+                stat = root.joinpath(rel_path).stat()
+            except FileNotFoundError:
+                continue
+            files[rel_path] = (stat.st_size, stat.st_mtime)
+            parent = rel_path.rpartition("/")[0]
+            while parent and parent not in dirs:
+                dirs.add(parent)
+                parent = parent.rpartition("/")[0]
+        return files, dirs
+
+    def sync(self,
+             source: Path,
+             destination: Path,
+             exclude_directories: list[str],
+             include_files: Optional[set[str]] = None,
+             removed_paths: Optional[set[str]] = None) -> SyncResult:
+        """Same as SyncBackend.sync. With include_files, removed_paths lists files and
+        directories that were deleted locally, which are deleted from the network
+        project too."""
+        result = SyncResult()
+        exclusions = self.clean_exclusions(exclude_directories) + [
+            SYNC_METADATA_DIR
+        ]
+        self.report(stage="scan")
+        if include_files is None:
+            src_files, src_dirs = self.scan_tree(source, exclusions)
+        else:
+            src_files, src_dirs = self.stat_files(source, include_files)
+        result.files_scanned = len(src_files)
+        self.report(files_scanned=result.files_scanned)
+        self.check_cancelled()
+        # Left by an interrupted sync. Their files weren't recorded as synced, so they
+        # are sent again below.
+        FileBundle.discard_pending(destination)
+        with SyncManifest(destination) as manifest:
+            if self.rescan_destination or not manifest.is_complete():
+                dst_files, dst_dirs = self.scan_tree(destination, exclusions)
+                manifest.replace(dst_files, dst_dirs)
+            else:
+                dst_files, dst_dirs = manifest.load()
+
+            # Mirror deletes first so a file replaced by a directory (or vice versa) can
+            # be recreated.
+            if include_files is None:
+                removed_files = dst_files.keys() - src_files.keys()
+                removed_dirs = dst_dirs - src_dirs
+            else:
+                removed_files = set()
+                removed_dirs = set()
+                for rel_path in removed_paths or ():
+                    if rel_path in dst_files and rel_path not in src_files:
+                        removed_files.add(rel_path)
+                    elif rel_path in dst_dirs:
+                        prefix = f"{rel_path}/"
+                        removed_dirs.add(rel_path)
+                        removed_dirs.update(rel_dir for rel_dir in dst_dirs
+                                            if rel_dir.startswith(prefix))
+                        removed_files.update(
+                            rel_file for rel_file in dst_files
+                            if rel_file.startswith(prefix))
+            for rel_path in removed_files:
+                destination.joinpath(rel_path).unlink(missing_ok=True)
+                result.files_deleted += 1
+            for rel_path in sorted(removed_dirs, reverse=True):
+                shutil.rmtree(destination.joinpath(rel_path),
+                              ignore_errors=True)
+
+            destination.mkdir(parents=True, exist_ok=True)
+            added_dirs = src_dirs - dst_dirs
+            for rel_path in sorted(added_dirs):
+                destination.joinpath(rel_path).mkdir(parents=True,
+                                                     exist_ok=True)
+
+            to_copy = []
+            to_delta = []
+            copied = {}
+            for rel_path, src in src_files.items():
+                dst = dst_files.get(rel_path)
+                if not self.needs_copy(src, dst):
+                    # The manifest keeps the state of a newer network copy, so later
+                    # local edits that are still older don't overwrite it
+                    continue
+                if self.delta_transfer and src[0] >= self.DELTA_THRESHOLD:
+                    to_delta.append(rel_path)
+                else:
+                    to_copy.append(rel_path)
+
+            # Delta transferred files are rewritten in place, so their chunk index is
+            # dropped until the write finishes. An interrupted write then falls back to
+            # hashing the network copy next time.
+            known_hashes = manifest.load_chunks(to_delta)
+            manifest.clear_chunks(to_copy + to_delta)
+            copy_file = self.copy_file
+            limiter = None
+            priority_files = set()
+            if self.scheduler is not None:
+                limiter = self.scheduler.limiter
+                to_copy = self.scheduler.order(to_copy, src_files)
+                to_delta = self.scheduler.order(to_delta, src_files)
+                copy_file = self.scheduler.copy_file
+                priority_files = self.scheduler.priority_files
+            to_bundle = [
+                rel_path for rel_path in to_copy
+                if src_files[rel_path][0] < self.bundle_threshold
+                and rel_path not in priority_files
+            ]
+            if len(to_bundle) < FileBundle.MIN_FILES:
+                to_bundle = []
+            bundled = set(to_bundle)
+            to_copy = [
+                rel_path for rel_path in to_copy if rel_path not in bundled
+            ]
+            self.report(
+                stage="copy",
+                files_total=len(to_copy) + len(to_delta) + len(to_bundle),
+                bytes_total=sum(src_files[rel_path][0]
+                                for rel_path in to_copy + to_delta + to_bundle))
+            bytes_done = 0
+            try:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                    futures = {
+                        pool.submit(copy_file, source.joinpath(rel_path),
+                                    destination.joinpath(rel_path)): rel_path
+                        for rel_path in to_copy
+                    }
+                    bundle_future = None
+                    if to_bundle:
+                        bundle_future = pool.submit(self.transfer_bundle,
+                                                    source, destination,
+                                                    to_bundle, src_files,
+                                                    copy_file)
+                    delta_futures = {
+                        pool.submit(DeltaTransfer.transfer,
+                                    source.joinpath(rel_path),
+                                    destination.joinpath(rel_path),
+                                    known_hashes.get(rel_path),
+                                    limiter): rel_path
+                        for rel_path in to_delta
+                    }
+                    all_futures = list(futures) + list(delta_futures)
+                    if bundle_future is not None:
+                        all_futures.append(bundle_future)
+                    for future in as_completed(all_futures):
+                        if self.worker is not None and self.worker.is_cancelled(
+                        ):
+                            for pending in all_futures:
+                                pending.cancel()
+                            self.check_cancelled()
+                        if future is bundle_future:
+                            result.bytes_copied += future.result()
+                            result.files_copied += len(to_bundle)
+                            for rel_path in to_bundle:
+                                copied[rel_path] = src_files[rel_path]
+                                bytes_done += src_files[rel_path][0]
+                            self.report(files_done=result.files_copied,
+                                        bytes_done=bytes_done)
+                            continue
+                        if future in futures:
+                            rel_path = futures[future]
+                            result.bytes_copied += future.result()
+                        else:
+                            rel_path = delta_futures[future]
+                            sent, skipped, hashes = future.result()
+                            result.bytes_copied += sent
+                            result.bytes_skipped += skipped
+                            manifest.set_chunks(rel_path, hashes)
+                        result.files_copied += 1
+                        copied[rel_path] = src_files[rel_path]
+                        bytes_done += src_files[rel_path][0]
+                        self.report(files_done=result.files_copied,
+                                    bytes_done=bytes_done)
+            finally:
+                # Record whatever made it across, even if a copy failed part way through
+                manifest.update(copied, removed_files, added_dirs,
+                                removed_dirs)
+        return result
+
+    def transfer_bundle(self, source: Path, destination: Path,
+                        rel_paths: list[str],
+                        files: dict[str, tuple[int, float]],
+                        copy_file: Callable[[Path, Path], int]) -> int:
+        """Packs the files into bundles, copies them to the network project and unpacks
+        them there. Returns the number of bytes sent."""
+        bundle_dir = FileBundle.bundle_dir(destination)
+        bundle_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(prefix="smedge-bundle-") as temp_dir:
+            bundles = FileBundle.pack(source, rel_paths, files, Path(temp_dir),
+                                      self.max_workers)
+            sent = 0
+            remote_bundles = []
+            for bundle in bundles:
+                remote_bundle = bundle_dir.joinpath(bundle.name)
+                sent += copy_file(bundle, remote_bundle)
+                remote_bundles.append(remote_bundle)
+        print(f"Sent {len(rel_paths)} small files as {len(bundles)} bundles "
+              f"({format_bytes(sent)})")
+        # Unpacking writes every file over the share, so it gets as many threads
+        # as a direct copy
+        for remote_bundle in remote_bundles:
+            FileBundle.unpack(remote_bundle, destination, self.max_workers)
+        return sent
+
+
+class FileBundle:
+    """Zip archives of many small files, so they cross the network as a few large files
+    instead of costing an SMB round trip each. Each archive carries an index with the
+    exact size and mtime of its files, which zip can't store."""
+    BUNDLE_DIR = "bundles"
+    INDEX_NAME = ".smedge_bundle_index.json"
+    # Fewer changed small files than this are copied directly
+    MIN_FILES = 64
+    FILES_PER_SHARD = 2000
+    BUFFER_SIZE = 1024 * 1024
+
+    @classmethod
+    def bundle_dir(cls, network_project: Path) -> Path:
+        return network_project.joinpath(SYNC_METADATA_DIR, cls.BUNDLE_DIR)
+
+    @classmethod
+    def pack(cls, source: Path, rel_paths: list[str],
+             files: dict[str, tuple[int, float]], out_dir: Path,
+             max_workers: int) -> list[Path]:
+        """Compresses the files into one archive per shard, with the shards compressed
+        in parallel.
+        Returns:
+            The paths of the archives
+        """
+        shard_count = max(
+            1, min(max_workers, math.ceil(len(rel_paths) / cls.FILES_PER_SHARD)))
+        name = uuid.uuid4().hex[:12]
+
+        def pack_shard(index: int) -> Path:
+            shard_paths = rel_paths[index::shard_count]
+            path = out_dir.joinpath(f"{name}-{index:02d}.zip")
+            # Zip can't store mtimes before 1980, the real ones are in the index
+            with zipfile.ZipFile(path,
+                                 "w",
+                                 compression=zipfile.ZIP_DEFLATED,
+                                 compresslevel=1,
+                                 strict_timestamps=False) as archive:
+                for rel_path in shard_paths:
+                    archive.write(source.joinpath(rel_path), rel_path)
+                archive.writestr(
+                    cls.INDEX_NAME,
+                    json.dumps(
+                        {rel_path: files[rel_path]
+                         for rel_path in shard_paths}))
+            return path
+
+        with ThreadPoolExecutor(max_workers=shard_count) as pool:
+            return list(pool.map(pack_shard, range(shard_count)))
+
+    @classmethod
+    def unpack(cls,
+               bundle: Path,
+               destination: Path,
+               max_workers: int = 1) -> int:
+        """Extracts an archive into the network project and deletes it. Every file goes
+        through a temporary name like a normal copy, with max_workers files written at
+        once. Returns the number of files."""
+        with zipfile.ZipFile(bundle) as archive:
+            index = json.loads(archive.read(cls.INDEX_NAME))
+
+            def extract(rel_path: str):
+                mtime = index[rel_path][1]
+                target = destination.joinpath(rel_path)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = target.with_name(target.name +
+                                             ThreadedSyncBackend.TEMP_SUFFIX)
+                with archive.open(rel_path) as src, open(temp_path,
+                                                         "wb") as dst:
+                    shutil.copyfileobj(src, dst, cls.BUFFER_SIZE)
+                os.utime(temp_path, (mtime, mtime))
+                os.replace(temp_path, target)
+
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                list(pool.map(extract, index))
+        bundle.unlink()
+        return len(index)
+
+    @classmethod
+    def discard_pending(cls, network_project: Path):
+        """Deletes archives that were never unpacked."""
+        bundle_dir = cls.bundle_dir(network_project)
+        if bundle_dir.is_dir():
+            for bundle in bundle_dir.glob("*.zip"):
+                bundle.unlink(missing_ok=True)
+
+
+class SyncVerifier:
+    """Checks after a sync that the network copy of each synced file has the same content
+    as the local file, and recopies the ones that don't. The hash of each verified file
+    is stored in the sync manifest, so later runs only read files that changed since."""
+    BUFFER_SIZE = 1024 * 1024
+    max_workers: int = 8
+    worker: Optional[SubmitWorker] = None
+    # Paces the reads and recopies of network files like the sync's copies
+    scheduler: Optional[TransferScheduler] = None
+
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max_workers
+
+    @classmethod
+    def hash_file(cls,
+                  path: Path,
+                  limiter: Optional[BandwidthLimiter] = None) -> str:
+        file_hash = hashlib.blake2b(digest_size=16)
+        buffer = bytearray(cls.BUFFER_SIZE)
+        view = memoryview(buffer)
+        with open(path, "rb", buffering=0) as f:
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                if limiter is not None:
+                    limiter.consume(read)
+                file_hash.update(view[:read])
+        return file_hash.hexdigest()
+
+    def verify_file(self, source: Path, destination: Path) -> tuple[str, str]:
+        """Returns the status of the network copy, one of ok, recopied, newer or failed,
+        and the hash of the local file."""
+        limiter = None
+        copy_file = ThreadedSyncBackend.copy_file
+        if self.scheduler is not None:
+            limiter = self.scheduler.limiter
+            copy_file = self.scheduler.copy_file
+        source_hash = self.hash_file(source)
+        try:
+            dst_stat = os.stat(destination)
+        except OSError:
+            dst_stat = None
+        if dst_stat is not None and dst_stat.st_size == os.path.getsize(
+                source) and self.hash_file(destination,
+                                           limiter) == source_hash:
+            return "ok", source_hash
+        if dst_stat is not None and dst_stat.st_mtime > os.path.getmtime(
+                source) + ThreadedSyncBackend.MTIME_TOLERANCE:
+            # Syncs never overwrite newer network files, so neither does verifying
+            return "newer", source_hash
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        copy_file(source, destination)
+        if self.hash_file(destination, limiter) == source_hash:
+            return "recopied", source_hash
+        return "failed", source_hash
+
+    def verify(self,
+               source: Path,
+               destination: Path,
+               exclude_directories: list[str],
+               include_files: Optional[set[str]] = None) -> int:
+        """Verifies every synced file that changed since it was last verified.
+        Returns:
+            The number of files that had to be recopied
+        Raises:
+            SyncError: Files still differ after being recopied
+        """
+        if self.worker is not None:
+            self.worker.report(stage="verify")
+        exclusions = SyncBackend.clean_exclusions(exclude_directories) + [
+            SYNC_METADATA_DIR
+        ]
+        if include_files is None:
+            src_files, _ = ThreadedSyncBackend.scan_tree(source, exclusions)
+        else:
+            src_files, _ = ThreadedSyncBackend.stat_files(
+                source, include_files)
+        recopied = []
+        newer = []
+        failed = []
+        with SyncManifest(destination) as manifest:
+            hashes = manifest.load_hashes()
+            # Syncs leave newer network copies alone, so there is nothing to verify
+            dst_files = manifest.load()[0] if manifest.is_complete() else {}
+            to_verify = [
+                rel_path for rel_path, stat in src_files.items()
+                if (rel_path not in hashes or hashes[rel_path][0] != stat)
+                and not ThreadedSyncBackend.is_newer(stat,
+                                                     dst_files.get(rel_path))
+            ]
+            if self.worker is not None:
+                self.worker.report(files_total=len(to_verify),
+                                   bytes_total=sum(src_files[rel_path][0]
+                                                   for rel_path in to_verify))
+            verified = {}
+            bytes_done = 0
+            try:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                    futures = {
+                        pool.submit(self.verify_file, source.joinpath(rel_path),
+                                    destination.joinpath(rel_path)): rel_path
+                        for rel_path in to_verify
+                    }
+                    for files_done, future in enumerate(as_completed(futures),
+                                                        1):
+                        if self.worker is not None and self.worker.is_cancelled(
+                        ):
+                            for pending in futures:
+                                pending.cancel()
+                            self.worker.check_cancelled()
+                        rel_path = futures[future]
+                        status, source_hash = future.result()
+                        if status == "newer":
+                            newer.append(rel_path)
+                        elif status == "failed":
+                            failed.append(rel_path)
+                        else:
+                            if status == "recopied":
+                                recopied.append(rel_path)
+                            verified[rel_path] = (src_files[rel_path],
+                                                  source_hash)
+                        bytes_done += src_files[rel_path][0]
+                        if self.worker is not None:
+                            self.worker.report(files_done=files_done,
+                                               bytes_done=bytes_done)
+            finally:
+                manifest.set_hashes(verified)
+
+        for rel_path in recopied:
+            print(f"Recopied {rel_path}, the network copy was different")
+        for rel_path in newer:
+            print(f"Warning: {rel_path} differs from the network copy, which "
+                  "is newer and was left alone")
+        if failed:
+            raise SyncError(
+                f"{len(failed)} files are still different on the network after "
+                f"recopying them: {', '.join(sorted(failed)[:5])}" +
+                (", ..." if len(failed) > 5 else ""))
+        return len(recopied)
+
+
+class ProjectWatcher:
+    """Keeps the network project in sync in the background while the artist works.
+    Changes under the local project are picked up with inotify (on Linux) or by polling,
+    and synced in small debounced batches, so a submit only has to flush the last few
+    seconds of changes instead of scanning the whole project."""
+    THREAD_NAME = "SmedgeProjectWatcher"
+    # A batch is synced once nothing changed for DEBOUNCE_SECONDS, or MAX_BATCH_DELAY
+    # after its first change for projects that never go quiet
+    DEBOUNCE_SECONDS = 2.0
+    MAX_BATCH_DELAY = 30.0
+    POLL_SECONDS = 5.0
+    RETRY_SECONDS = 30.0
+    # inotify constants from <sys/inotify.h>
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ISDIR = 0x40000000
+    WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                  IN_CREATE | IN_DELETE)
+    EVENT_HEADER = struct.Struct("iIII")
+    project_path: Path = None
+    network_project: Path = None
+    state: "SubmitUIState" = None
+    # Project relative paths changed since the last batch, files or directories
+    pending: set[str] = set()
+    # Set until the first full sync is done, and whenever changes may have been missed
+    needs_full_sync: bool = True
+
+    def __init__(self,
+                 project_path: Path,
+                 state: "SubmitUIState",
+                 use_inotify: Optional[bool] = None):
+        """
+        Args:
+            project_path (Path): Local project to watch
+            state (SubmitUIState): Settings used for syncing
+            use_inotify (Optional[bool]): None uses inotify where it is available
+        """
+        self.project_path = project_path
+        self.network_project = Path(state.network_project_location)
+        self.state = state
+        self.pending = set()
+        self.needs_full_sync = True
+        self.exclusions = SyncBackend.clean_exclusions(
+            state.exclude_directories) + [SYNC_METADATA_DIR]
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._first_change: Optional[float] = None
+        self._last_change: Optional[float] = None
+        self._inotify = None
+        self._fd = -1
+        self._watches: dict[int, str] = {}
+        self._snapshot: dict[str, tuple[int, float]] = {}
+        self._snapshot_dirs: set[str] = set()
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith("linux")
+        self._use_inotify = use_inotify
+        # Set once the project is being watched, which walks the whole project and so
+        # happens on the watcher's thread
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self.run,
+                                        name=self.THREAD_NAME,
+                                        daemon=True)
+        # Found through the thread so watchers survive re-running the script in Maya
+        self._thread.smedge_watcher = self
+
+    @classmethod
+    def running(cls) -> list["ProjectWatcher"]:
+        return [
+            thread.smedge_watcher
+            for thread in threading.enumerate()
+            if getattr(thread, "smedge_watcher", None) is not None
+        ]
+
+    @classmethod
+    def find(cls, project_path: Path,
+             network_project: Path) -> Optional["ProjectWatcher"]:
+        """Returns the running watcher syncing a project to a network project."""
+        key = cls.key(project_path, network_project)
+        for watcher in cls.running():
+            if watcher.is_alive() and cls.key(
+                    watcher.project_path, watcher.network_project) == key:
+                return watcher
+        return None
+
+    @classmethod
+    def watch(cls, project_path: Path,
+              state: "SubmitUIState") -> "ProjectWatcher":
+        """Makes sure a project is watched with the given settings, stopping any other
+        watchers of the project."""
+        watcher = cls.find(project_path,
+                           Path(state.network_project_location))
+        exclusions = SyncBackend.clean_exclusions(
+            state.exclude_directories) + [SYNC_METADATA_DIR]
+        if watcher is not None and watcher.exclusions == exclusions:
+            watcher.state = state
+            return watcher
+        cls.unwatch(project_path)
+        watcher = cls(project_path, state)
+        watcher.start()
+        print(f"Watching {project_path} for changes to sync to "
+              f"{state.network_project_location}")
+        return watcher
+
+    @classmethod
+    def unwatch(cls, project_path: Path):
+        for watcher in cls.running():
+            if os.path.normcase(str(watcher.project_path)) == os.path.normcase(
+                    str(project_path)):
+                watcher.stop()
+
+    @staticmethod
+    def key(project_path: Path, network_project: Path) -> tuple[str, str]:
+        return (os.path.normcase(os.path.abspath(project_path)),
+                os.path.normcase(os.path.abspath(network_project)))
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, wait: bool = False):
+        """Stops watching. Without wait, a batch that is being synced still finishes in
+        the background."""
+        self._stop.set()
+        if wait and self._thread.is_alive(
+        ) and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def is_alive(self) -> bool:
+        return self._thread.is_alive() and not self._stop.is_set()
+
+    def start_watching(self):
+        with self._lock:
+            if self._use_inotify:
+                try:
+                    self.start_inotify()
+                except OSError as e:
+                    print(f"Watching {self.project_path} by polling, inotify "
+                          f"failed: {e}")
+                    self.stop_inotify()
+            if self._fd < 0:
+                self._snapshot, self._snapshot_dirs = (
+                    ThreadedSyncBackend.scan_tree(self.project_path,
+                                                  self.exclusions))
+        self._ready.set()
+
+    def start_inotify(self):
+        self._inotify = ctypes.CDLL(ctypes.util.find_library("c"),
+                                    use_errno=True)
+        self._fd = self._inotify.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.add_watches("")
+
+    def stop_inotify(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+        self._fd = -1
+        self._watches = {}
+
+    def add_watches(self, rel_dir: str):
+        """Watches a directory and every directory under it that isn't excluded."""
+        pending = [rel_dir]
+        while pending:
+            rel_dir = pending.pop()
+            abs_dir = self.project_path.joinpath(rel_dir)
+            wd = self._inotify.inotify_add_watch(self._fd,
+                                                 os.fsencode(abs_dir),
+                                                 self.WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno,
+                              f"Can't watch {abs_dir}: {os.strerror(errno)}")
+            self._watches[wd] = rel_dir
+            try:
+                with os.scandir(abs_dir) as entries:
+                    for entry in entries:
+                        rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                        if entry.is_dir(
+                                follow_symlinks=False
+                        ) and not ThreadedSyncBackend.is_excluded(
+                                rel_path, entry.name, self.exclusions):
+                            pending.append(rel_path)
+            except FileNotFoundError:
+                # Deleted again before it could be listed
+                pass
+
+    def read_inotify(self) -> set[str]:
+        """Reads the queued inotify events.
+        Returns:
+            The project relative paths they happened to
+        """
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_length = self.EVENT_HEADER.unpack_from(
+                    data, offset)
+                offset += self.EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + name_length].rstrip(
+                    b"\0"))
+                offset += name_length
+                if mask & self.IN_Q_OVERFLOW:
+                    self.needs_full_sync = True
+                    continue
+                if mask & self.IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                rel_dir = self._watches.get(wd)
+                if rel_dir is None or not name:
+                    continue
+                rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                if mask & self.IN_ISDIR:
+                    if ThreadedSyncBackend.is_excluded(rel_path, name,
+                                                       self.exclusions):
+                        continue
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                        self.add_watches(rel_path)
+                changed.add(rel_path)
+
+    def poll(self) -> set[str]:
+        """Rescans the local project and compares it with the previous scan.
+        Returns:
+            The project relative paths of files and directories that changed
+        """
+        files, dirs = ThreadedSyncBackend.scan_tree(self.project_path,
+                                                    self.exclusions)
+        changed = {
+            rel_path
+            for rel_path, stat in files.items()
+            if self._snapshot.get(rel_path) != stat
+        }
+        changed |= self._snapshot.keys() - files.keys()
+        changed |= self._snapshot_dirs - dirs
+        self._snapshot, self._snapshot_dirs = files, dirs
+        return changed
+
+    def collect_changes(self):
+        with self._lock:
+            if self._fd >= 0:
+                try:
+                    changed = self.read_inotify()
+                except OSError as e:
+                    # Usually out of inotify watches on a huge project
+                    print(f"Watching {self.project_path} by polling: {e}")
+                    self.stop_inotify()
+                    self.needs_full_sync = True
+                    changed = self.poll()
+            else:
+                changed = self.poll()
+            if changed:
+                now = time.monotonic()
+                if not self.pending:
+                    self._first_change = now
+                self._last_change = now
+                self.pending |= changed
+
+    def batch_ready(self) -> bool:
+        with self._lock:
+            if self.needs_full_sync:
+                return True
+            if not self.pending:
+                return False
+            now = time.monotonic()
+            return (now - self._last_change >= self.DEBOUNCE_SECONDS
+                    or now - self._first_change >= self.MAX_BATCH_DELAY)
+
+    def wait(self, timeout: float):
+        if self._fd >= 0:
+            select.select([self._fd], [], [], timeout)
+        else:
+            self._stop.wait(timeout)
+
+    def run(self):
+        try:
+            self.start_watching()
+            while not self._stop.is_set():
+                self.wait(self.POLL_SECONDS if self._fd < 0 else
+                          self.DEBOUNCE_SECONDS / 2)
+                if self._stop.is_set():
+                    break
+                self.collect_changes()
+                if not self.batch_ready():
+                    continue
+                try:
+                    with TransferScheduler.lock(self.network_project):
+                        result = self.sync_pending()
+                    if result.files_copied or result.files_deleted:
+                        print(f"Watch synced {self.project_path.name}: {result}")
+                except Exception as e:
+                    print(f"Watch sync of {self.project_path} failed, retrying "
+                          f"in {self.RETRY_SECONDS:.0f}s: {e}")
+                    self._stop.wait(self.RETRY_SECONDS)
+        finally:
+            self._ready.set()
+            self.stop_inotify()
+
+    def flush(self, worker: Optional[SubmitWorker] = None) -> SyncResult:
+        """Syncs the changes that weren't synced yet on the calling thread, or the whole
+        project if the watcher may have missed changes. Must be called with the sync lock
+        of the network project held."""
+        self._ready.wait()
+        self.collect_changes()
+        return self.sync_pending(worker)
+
+    def sync_pending(self, worker: Optional[SubmitWorker] = None) -> SyncResult:
+        with self._sync_lock:
+            with self._lock:
+                full_sync = self.needs_full_sync
+                changed = self.pending
+                self.needs_full_sync = False
+                self.pending = set()
+            backend = ThreadedSyncBackend.from_state(self.state)
+            backend.worker = worker
+            backend.scheduler = TransferScheduler.from_state(self.state, set())
+            try:
+                if full_sync:
+                    return backend.sync(self.project_path, self.network_project,
+                                        self.state.exclude_directories)
+                backend.rescan_destination = False
+                include_files, removed_paths = self.split_changes(changed)
+                return backend.sync(self.project_path, self.network_project,
+                                    self.state.exclude_directories,
+                                    include_files, removed_paths)
+            except BaseException:
+                # Synced again with the next batch
+                with self._lock:
+                    self.needs_full_sync |= full_sync
+                    self.pending |= changed
+                raise
+
+    def split_changes(self, changed: set[str]) -> tuple[set[str], set[str]]:
+        """Sorts changed paths into the files to copy, including every file of new
+        directories, and the paths that were deleted."""
+        include_files = set()
+        removed_paths = set()
+        for rel_path in changed:
+            path = self.project_path.joinpath(rel_path)
+            if path.is_file():
+                include_files.add(rel_path)
+            elif path.is_dir():
+                files, _ = ThreadedSyncBackend.scan_tree(
+                    path, self.exclusions, rel_path)
+                include_files.update(files)
+            else:
+                removed_paths.add(rel_path)
+        return include_files, removed_paths
+
+
+class DeltaTransfer:
+    """Copies large files by rewriting only the fixed size blocks whose hashes changed
+    since the last sync. The local file is read through mmap so memory use doesn't grow
+    with the file size."""
+    BLOCK_SIZE = 4 * 1024 * 1024
+
+    @staticmethod
+    def hash_block(block) -> str:
+        return hashlib.blake2b(block, digest_size=16).hexdigest()
+
+    @classmethod
+    def hash_file(cls,
+                  path: Path,
+                  limiter: Optional[BandwidthLimiter] = None) -> list[str]:
+        """Hashes every block of an existing file. Used the first time a file is delta
+        transferred, before the network side has a chunk index."""
+        hashes = []
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(cls.BLOCK_SIZE)
+                if not block:
+                    break
+                if limiter is not None:
+                    limiter.consume(len(block))
+                hashes.append(cls.hash_block(block))
+        return hashes
+
+    @classmethod
+    def transfer(
+        cls,
+        source: Path,
+        destination: Path,
+        known_hashes: Optional[list[str]],
+        limiter: Optional[BandwidthLimiter] = None
+    ) -> tuple[int, int, list[str]]:
+        """Updates destination to match source.
+        Args:
+            known_hashes (list[str]): Block hashes of the current destination file, or None
+                to hash the destination before writing.
+            limiter (Optional[BandwidthLimiter]): Paces the reads and writes of the
+                network file
+        Returns:
+            Bytes sent, bytes skipped and the block hashes of the new file.
+        """
+        if not destination.exists():
+            known_hashes = []
+            temp_path = destination.with_name(destination.name +
+                                              ThreadedSyncBackend.TEMP_SUFFIX)
+            write_path = temp_path
+            mode = "wb"
+        else:
+            if known_hashes is None:
+                known_hashes = cls.hash_file(destination, limiter)
+            temp_path = None
+            write_path = destination
+            mode = "r+b"
+
+        size = source.stat().st_size
+        sent = 0
+        skipped = 0
+        hashes = []
+        with open(source, "rb") as src, open(write_path, mode) as dst:
+            if size > 0:
+                with mmap.mmap(src.fileno(), 0,
+                               access=mmap.ACCESS_READ) as view:
+                    for offset in range(0, size, cls.BLOCK_SIZE):
+                        block = view[offset:offset + cls.BLOCK_SIZE]
+                        block_hash = cls.hash_block(block)
+                        index = len(hashes)
+                        hashes.append(block_hash)
+                        if index < len(known_hashes) and known_hashes[
+                                index] == block_hash:
+                            skipped += len(block)
+                            continue
+                        if limiter is not None:
+                            limiter.consume(len(block))
+                        dst.seek(offset)
+                        dst.write(block)
+                        sent += len(block)
+            dst.truncate(size)
+        shutil.copystat(source, write_path)
+        if temp_path is not None:
+            os.replace(temp_path, destination)
+        return sent, skipped, hashes
+
+
+class SyncManifest:
+    """Record of the files last synced to a network project. It is stored next to the
+    synced files so that resubmits can diff the local project against it instead of
+    stat-ing every file on the network share. The record is only trusted as the full
+    network state once it was built from a scan of the network project, since other
+    tools (robocopy, verifying before the first threaded sync) only add to it."""
+    FILE_NAME = "manifest.sqlite"
+    path: Path = None
+    connection: sqlite3.Connection = None
+
+    def __init__(self, destination: Path):
+        self.path = destination.joinpath(SYNC_METADATA_DIR, self.FILE_NAME)
+        self.connection = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(str(self.path), timeout=30)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, "
+                "size INTEGER NOT NULL, mtime REAL NOT NULL, hash TEXT)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, "
+                "value TEXT NOT NULL)")
+            # Block hashes of delta transferred files, see DeltaTransfer
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (path TEXT NOT NULL, "
+                "block INTEGER NOT NULL, hash TEXT NOT NULL, "
+                "PRIMARY KEY (path, block))")
+        return self
+
+    def __exit__(self, *args):
+        self.connection.close()
+        self.connection = None
+
+    def is_complete(self) -> bool:
+        """Whether the manifest lists everything in the network project."""
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'complete'").fetchone()
+        return row is not None and row[0] == "1"
+
+    def mark_incomplete(self):
+        """Makes the next threaded sync rescan the network project, e.g. after it was
+        changed by something that doesn't keep the manifest up to date."""
+        with self.connection:
+            self.connection.execute("DELETE FROM meta WHERE key = 'complete'")
+
+    @classmethod
+    def invalidate(cls, destination: Path):
+        """Marks the manifest of a network project incomplete, if it has one."""
+        if destination.joinpath(SYNC_METADATA_DIR, cls.FILE_NAME).is_file():
+            with cls(destination) as manifest:
+                manifest.mark_incomplete()
+
+    def load(self) -> tuple[dict[str, tuple[int, float]], set[str]]:
+        """Returns the synced files and directories in the same format as
+        ThreadedSyncBackend.scan_tree."""
+        files = {
+            path: (size, mtime)
+            for path, size, mtime in self.connection.execute(
+                "SELECT path, size, mtime FROM files")
+        }
+        dirs = {
+            path
+            for (path, ) in self.connection.execute("SELECT path FROM dirs")
+        }
+        return files, dirs
+
+    def replace(self, files: dict[str, tuple[int, float]], dirs: set[str]):
+        """Overwrites the manifest with a freshly scanned tree."""
+        old_files, _ = self.load()
+        # Files changed outside of a sync no longer match their chunk index
+        self.clear_chunks(path for path, stat in old_files.items()
+                          if files.get(path) != stat)
+        # Verification hashes stay valid for files that didn't change
+        hashes = {
+            path: (stat, file_hash)
+            for path, (stat, file_hash) in self.load_hashes().items()
+            if files.get(path) == stat
+        }
+        with self.connection:
+            self.connection.execute("DELETE FROM files")
+            self.connection.execute("DELETE FROM dirs")
+        self.update(files, [], dirs, [])
+        self.set_hashes(hashes)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('complete', '1')"
+            )
+
+    def update(self, changed_files: dict[str, tuple[int, float]],
+               removed_files: Iterable[str], added_dirs: Iterable[str],
+               removed_dirs: Iterable[str]):
+        """Applies the changes made by one sync in a single transaction."""
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM files WHERE path = ?",
+                [(path, ) for path in removed_files])
+            self.connection.executemany(
+                "DELETE FROM chunks WHERE path = ?",
+                [(path, ) for path in removed_files])
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime) VALUES (?, ?, ?)",
+                [(path, size, mtime)
+                 for path, (size, mtime) in changed_files.items()])
+            self.connection.executemany("DELETE FROM dirs WHERE path = ?",
+                                        [(path, ) for path in removed_dirs])
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO dirs (path) VALUES (?)",
+                [(path, ) for path in added_dirs])
+
+    def load_hashes(self) -> dict[str, tuple[tuple[int, float], str]]:
+        """Returns the (size, mtime) and content hash of every file whose network copy
+        was verified since it last changed."""
+        return {
+            path: ((size, mtime), file_hash)
+            for path, size, mtime, file_hash in self.connection.execute(
+                "SELECT path, size, mtime, hash FROM files WHERE hash IS NOT NULL")
+        }
+
+    def set_hashes(self, hashes: dict[str, tuple[tuple[int, float], str]]):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime, hash) "
+                "VALUES (?, ?, ?, ?)",
+                [(path, size, mtime, file_hash)
+                 for path, ((size, mtime), file_hash) in hashes.items()])
+
+    def load_chunks(self, paths: Iterable[str]) -> dict[str, list[str]]:
+        """Returns the block hashes recorded for each of paths that has a chunk index."""
+        chunks = {}
+        for path in paths:
+            hashes = [
+                block_hash for (block_hash, ) in self.connection.execute(
+                    "SELECT hash FROM chunks WHERE path = ? ORDER BY block",
+                    (path, ))
+            ]
+            if hashes:
+                chunks[path] = hashes
+        return chunks
+
+    def clear_chunks(self, paths: Iterable[str]):
+        with self.connection:
+            self.connection.executemany("DELETE FROM chunks WHERE path = ?",
+                                        [(path, ) for path in paths])
+
+    def set_chunks(self, path: str, hashes: list[str]):
+        with self.connection:
+            self.connection.execute("DELETE FROM chunks WHERE path = ?",
+                                    (path, ))
+            self.connection.executemany(
+                "INSERT INTO chunks (path, block, hash) VALUES (?, ?, ?)",
+                [(path, index, block_hash)
+                 for index, block_hash in enumerate(hashes)])
+
+
+class RenderedFrames:
+    """Index of the frames that were already rendered to the network, so a resubmit only
+    renders what is missing. Every output folder is listed once, and a frame counts as
+    rendered when its file is big enough and starts with a valid image header."""
+    MIN_OUTPUT_BYTES = 1024
+    HEADER_MAGIC = {
+        ".exr": (b"\x76\x2f\x31\x01", ),
+        ".png": (b"\x89PNG", ),
+        ".tif": (b"II*\x00", b"MM\x00*"),
+        ".tiff": (b"II*\x00", b"MM\x00*"),
+        ".jpg": (b"\xff\xd8\xff", ),
+        ".jpeg": (b"\xff\xd8\xff", ),
+    }
+    # Folder -> file name -> directory entry
+    listings: dict[Path, dict[str, os.DirEntry]] = {}
+    max_workers: int = 16
+
+    def __init__(self, max_workers: int = 16):
+        self.listings = {}
+        self.max_workers = max_workers
+
+    def list_dir(self, folder: Path) -> dict[str, os.DirEntry]:
+        if folder not in self.listings:
+            try:
+                with os.scandir(folder) as entries:
+                    self.listings[folder] = {
+                        entry.name: entry
+                        for entry in entries if entry.is_file()
+                    }
+            except OSError:
+                self.listings[folder] = {}
+        return self.listings[folder]
+
+    @classmethod
+    def valid_header(cls, path: Path) -> bool:
+        magics = cls.HEADER_MAGIC.get(path.suffix.lower())
+        if magics is None:
+            return True
+        try:
+            with open(path, "rb") as f:
+                header = f.read(4)
+        except OSError:
+            return False
+        return any(header.startswith(magic) for magic in magics)
+
+    def frame_files(self, output: Path) -> dict[int, Path]:
+        """Files of an output path without frame number or extension, such as
+        renders/shot/masterLayer/shot, that are big enough to be finished frames."""
+        pattern = re.compile(re.escape(output.name) + r"[._]?(\d+)\.[A-Za-z]\w*")
+        frames = {}
+        for name, entry in self.list_dir(output.parent).items():
+            match = pattern.fullmatch(name)
+            if match is None:
+                continue
+            try:
+                size = entry.stat().st_size
+            except OSError:
+                continue
+            if size >= self.MIN_OUTPUT_BYTES:
+                frames[int(match.group(1))] = output.parent.joinpath(name)
+        return frames
+
+    def rendered_frames(self, outputs: Iterable[Path], start_frame: int,
+                        end_frame: int) -> set[int]:
+        """Frames in the range for which every one of the outputs was rendered."""
+        wanted = set(range(start_frame, end_frame + 1))
+        candidates: dict[Path, int] = {}
+        rendered = set(wanted)
+        for output in outputs:
+            files = {
+                frame: path
+                for frame, path in self.frame_files(output).items()
+                if frame in wanted
+            }
+            rendered &= files.keys()
+            candidates.update((path, frame) for frame, path in files.items())
+        # Headers are only read for frames that could still count as rendered
+        to_check = [
+            path for path, frame in candidates.items() if frame in rendered
+        ]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for path, valid in zip(to_check,
+                                   pool.map(self.valid_header, to_check)):
+                if not valid:
+                    rendered.discard(candidates[path])
+        return rendered
+
+    @staticmethod
+    def format_frames(frames: Iterable[int]) -> str:
+        """Compact frame list such as 1-10,15,20-30."""
+        ranges = []
+        for frame in sorted(set(frames)):
+            if ranges and frame == ranges[-1][1] + 1:
+                ranges[-1][1] = frame
+            else:
+                ranges.append([frame, frame])
+        return ",".join(
+            str(first) if first == last else f"{first}-{last}"
+            for first, last in ranges)
+
+
+class FrameStats:
+    """Per render layer history of frame render times and scene load times, kept in the
+    network project's metadata directory."""
+    FILE_NAME = "frame_stats.json"
+    # Only the most recent samples are kept so the stats follow changes to the scene
+    MAX_SAMPLES = 200
+    # Used for layers that have never been rendered
+    DEFAULT_FRAME_SECONDS = 60.0
+    DEFAULT_LOAD_SECONDS = 30.0
+    # Arnold logs "render done in 1:05.123" at the end of every frame
+    ARNOLD_RENDER_TIME_RE = re.compile(
+        r"render done in ((?:\d+:)*\d+(?:\.\d+)?)")
+    path: Path = None
+    layers: dict[str, dict[str, list[float]]] = {}
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.layers = {}
+
+    @classmethod
+    def for_project(cls, network_project: Path) -> "FrameStats":
+        stats = cls(network_project.joinpath(SYNC_METADATA_DIR, cls.FILE_NAME))
+        if stats.path.is_file():
+            with open(stats.path, "r") as f:
+                stats.layers = json.load(f)
+        return stats
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(self.layers, f, indent=1)
+        os.replace(temp_path, self.path)
+
+    def record(self,
+               layer: str,
+               frame_seconds: Iterable[float] = (),
+               load_seconds: Iterable[float] = ()):
+        samples = self.layers.setdefault(layer, {
+            "frame_seconds": [],
+            "load_seconds": []
+        })
+        for key, values in (("frame_seconds", frame_seconds),
+                            ("load_seconds", load_seconds)):
+            samples[key] = (samples[key] + list(values))[-self.MAX_SAMPLES:]
+
+    def record_log(self, layer: str, log_text: str) -> int:
+        """Records the frame times found in a render log. Returns how many were found."""
+        frame_seconds = []
+        for match in self.ARNOLD_RENDER_TIME_RE.finditer(log_text):
+            seconds = 0.0
+            for part in match.group(1).split(":"):
+                seconds = seconds * 60 + float(part)
+            frame_seconds.append(seconds)
+        self.record(layer, frame_seconds=frame_seconds)
+        return len(frame_seconds)
+
+    def samples(self, layer: str, key: str, default: float) -> list[float]:
+        return self.layers.get(layer, {}).get(key, []) or [default]
+
+    def mean(self, layer: str, key: str, default: float) -> float:
+        samples = self.samples(layer, key, default)
+        return sum(samples) / len(samples)
+
+    def frame_samples(self, layer: str) -> list[float]:
+        return self.samples(layer, "frame_seconds", self.DEFAULT_FRAME_SECONDS)
+
+    def frame_seconds(self, layer: str) -> float:
+        return self.mean(layer, "frame_seconds", self.DEFAULT_FRAME_SECONDS)
+
+    def load_seconds(self, layer: str) -> float:
+        return self.mean(layer, "load_seconds", self.DEFAULT_LOAD_SECONDS)
+
+
+class PacketPlanner:
+    """Picks packet sizes from historical frame times. Every packet pays for one scene
+    load, so small packets waste farm time on loading while big packets leave nodes idle
+    at the end of the job."""
+    ORDERINGS = ["sequential", "heaviest-first"]
+    # A failed packet renders again from its first frame, so this also bounds how late
+    # one failure can make the end of the job
+    MAX_PACKET_SECONDS = 1800.0
+    # Frame time draws from the history simulated for every packet size
+    SAMPLE_RUNS = 32
+    # Simulated times this close to the best are noise from the draws
+    TIE_TOLERANCE = 0.02
+
+    @staticmethod
+    def simulate(frame_seconds: list[float],
+                 packet_size: int,
+                 load_seconds: float,
+                 node_count: int,
+                 ordering: str = "sequential") -> float:
+        """Returns the wall clock time of a job where each free node picks up the next
+        packet in order."""
+        durations = [
+            load_seconds + sum(frame_seconds[i:i + packet_size])
+            for i in range(0, len(frame_seconds), packet_size)
+        ]
+        if ordering == "heaviest-first":
+            durations.sort(reverse=True)
+        node_free_times = [0.0] * max(node_count, 1)
+        for duration in durations:
+            heapq.heappush(node_free_times,
+                           heapq.heappop(node_free_times) + duration)
+        return max(node_free_times)
+
+    @staticmethod
+    def max_packet_size(frame_seconds_runs: list[list[float]],
+                        load_seconds: float, node_count: int) -> int:
+        """Biggest packet worth simulating. Bigger packets than frames / nodes leave
+        some nodes without work, and a packet longer than MAX_PACKET_SECONDS makes one
+        failed or slow packet hold up the end of the job."""
+        frame_count = len(frame_seconds_runs[0])
+        max_size = math.ceil(frame_count / max(node_count, 1))
+        mean_seconds = sum(map(sum, frame_seconds_runs)) / (
+            len(frame_seconds_runs) * frame_count)
+        if mean_seconds > 0:
+            max_size = min(
+                max_size,
+                int((PacketPlanner.MAX_PACKET_SECONDS - load_seconds) //
+                    mean_seconds))
+        return max(max_size, 1)
+
+    @staticmethod
+    def best_plan(frame_seconds_runs: list[list[float]],
+                  load_seconds: float,
+                  node_count: int,
+                  orderings: Iterable[str] = ("sequential", )) -> tuple[int, str]:
+        """Packet size and ordering with the shortest mean simulated job over the runs,
+        preferring bigger packets within TIE_TOLERANCE of it since they put less load on
+        the scheduler.
+        Returns:
+            (packet size, ordering)
+        """
+        frame_count = len(frame_seconds_runs[0]) if frame_seconds_runs else 0
+        if not frame_count:
+            return 1, "sequential"
+        max_size = PacketPlanner.max_packet_size(frame_seconds_runs,
+                                                 load_seconds, node_count)
+        # Only the sizes that split the frames most evenly for each packet count
+        sizes = {
+            math.ceil(frame_count / packets)
+            for packets in range(1, frame_count + 1)
+        }
+        sizes = sorted(size for size in sizes | {max_size} if size <= max_size)
+        plans = [(size, ordering) for size in sizes for ordering in orderings]
+
+        mean_seconds = {
+            plan: sum(
+                PacketPlanner.simulate(frame_seconds, plan[0], load_seconds,
+                                       node_count, plan[1])
+                for frame_seconds in frame_seconds_runs) / len(frame_seconds_runs)
+            for plan in plans
+        }
+        limit = min(mean_seconds.values()) * (1 + PacketPlanner.TIE_TOLERANCE)
+        return min((plan for plan in plans if mean_seconds[plan] <= limit),
+                   key=lambda plan: (-plan[0], mean_seconds[plan]))
+
+    @staticmethod
+    def auto_packet_size(layers: list[str],
+                         frame_count: int,
+                         node_count: int,
+                         stats: FrameStats,
+                         seed: int = 0) -> int:
+        """Packet size for a job rendering all of layers with one scene load. Frame times
+        are drawn from each layer's history, so the spread of the history decides how
+        much smaller packets are worth for balancing the nodes. The farm renders packets
+        in frame order and which frames are heavy isn't known, so only sequential
+        ordering is simulated."""
+        rng = random.Random(seed)
+        samples = [stats.frame_samples(layer) for layer in layers]
+        runs = [[
+            sum(rng.choice(layer_samples) for layer_samples in samples)
+            for _ in range(frame_count)
+        ] for _ in range(PacketPlanner.SAMPLE_RUNS)]
+        return PacketPlanner.best_plan(
+            runs, max(stats.load_seconds(layer) for layer in layers),
+            node_count)[0]
+
+    @staticmethod
+    def scene_load_seconds(frame_count: int, packet_size: int,
+                           load_seconds: list[float], shared: bool) -> float:
+        """Total farm time spent loading the scene for a set of layers, either with one
+        job per layer or one shared job."""
+        packets = math.ceil(frame_count / max(packet_size, 1))
+        if shared:
+            return packets * max(load_seconds)
+        return packets * sum(load_seconds)
+
+    @staticmethod
+    def compare_strategies(
+            frame_seconds: list[float], load_seconds: float,
+            node_count: int) -> list[tuple[str, int, str, float]]:
+        """Simulates common fixed packet sizes in every ordering against the automatic
+        plan, which searches sizes and orderings with the frame times known.
+        Returns:
+            (strategy, packet size, ordering, wall clock seconds) for every combination
+        """
+        frame_count = len(frame_seconds)
+        strategies = [
+            ("single frames", 1, PacketPlanner.ORDERINGS),
+            ("fixed 5", 5, PacketPlanner.ORDERINGS),
+            ("fixed 10", 10, PacketPlanner.ORDERINGS),
+            ("frames / nodes",
+             max(math.ceil(frame_count / max(node_count, 1)),
+                 1), PacketPlanner.ORDERINGS),
+        ]
+        auto_size, auto_ordering = PacketPlanner.best_plan(
+            [frame_seconds], load_seconds, node_count, PacketPlanner.ORDERINGS)
+        strategies.append(("auto", auto_size, [auto_ordering]))
+        return [(name, size, ordering,
+                 PacketPlanner.simulate(frame_seconds, size, load_seconds,
+                                        node_count, ordering))
+                for name, size, orderings in strategies
+                for ordering in orderings]
+
+
+class TxPrepass:
+    """Converts the scene's textures to Arnold .tx files on the submitting machine before
+    the project is synced, so render nodes never have to generate them. Conversions are
+    cached by source hash, so unchanged textures are never converted twice."""
+    CACHE_FILE_NAME = "tx_cache.json"
+    TEXTURE_EXTENSIONS = {
+        ".png", ".jpg", ".jpeg", ".tif", ".tiff", ".exr", ".tga", ".hdr",
+        ".bmp", ".psd"
+    }
+    MAKETX_ARGS = [
+        "-u", "--oiio", "--monochrome-detect", "--opaque-detect",
+        "--constant-color-detect", "--fixnan", "box3"
+    ]
+    project_path: Path = None
+    cache_path: Path = None
+    # Project relative source path -> size, mtime and hash of the source and mtime of the
+    # .tx at the time of the last conversion
+    cache: dict[str, dict] = {}
+
+    def __init__(self, project_path: Path):
+        self.project_path = project_path
+        self.cache_path = project_path.joinpath(SYNC_METADATA_DIR,
+                                                self.CACHE_FILE_NAME)
+        self.cache = {}
+        if self.cache_path.is_file():
+            with open(self.cache_path, "r") as f:
+                self.cache = json.load(f)
+
+    def save(self):
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        with open(temp_path, "w") as f:
+            json.dump(self.cache, f, indent=1)
+        os.replace(temp_path, self.cache_path)
+
+    @classmethod
+    def find_textures(cls, dependencies: SceneDependencies) -> list[Path]:
+        return sorted(path for path in dependencies.files
+                      if path.suffix.lower() in cls.TEXTURE_EXTENSIONS)
+
+    @staticmethod
+    def find_maketx() -> str:
+        if os.environ.get("SMEDGE_MAKETX"):
+            return os.environ["SMEDGE_MAKETX"]
+        maketx = shutil.which("maketx")
+        if maketx is not None:
+            return maketx
+        if os.environ.get("MTOA_PATH"):
+            return str(Path(os.environ["MTOA_PATH"]).joinpath("bin", "maketx"))
+        raise Exception("maketx not found! Set SMEDGE_MAKETX to its location.")
+
+    @staticmethod
+    def hash_file(path: Path) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def cache_key(self, texture: Path) -> str:
+        try:
+            return texture.relative_to(self.project_path).as_posix()
+        except ValueError:
+            return texture.as_posix()
+
+    def is_stale(self, texture: Path) -> bool:
+        """Whether texture has to be converted. Touched but unchanged textures are
+        recognized by hash and only have their cache entry refreshed."""
+        tx_path = texture.with_suffix(".tx")
+        if not tx_path.is_file():
+            return True
+        stat = texture.stat()
+        tx_mtime = tx_path.stat().st_mtime
+        entry = self.cache.get(self.cache_key(texture))
+        if entry is not None and entry["size"] == stat.st_size and entry[
+                "mtime"] == stat.st_mtime and entry["tx_mtime"] == tx_mtime:
+            return False
+        source_hash = self.hash_file(texture)
+        if entry is not None and (entry["hash"] != source_hash
+                                  or entry["tx_mtime"] != tx_mtime):
+            return True
+        if entry is None and tx_mtime < stat.st_mtime:
+            # Converted by something else before the source last changed
+            return True
+        self.record(texture, source_hash)
+        return False
+
+    def record(self, texture: Path, source_hash: str):
+        stat = texture.stat()
+        self.cache[self.cache_key(texture)] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "hash": source_hash,
+            "tx_mtime": texture.with_suffix(".tx").stat().st_mtime
+        }
+
+    def convert(self, maketx: str, texture: Path):
+        result = subprocess.run(
+            [maketx] + self.MAKETX_ARGS +
+            ["-o", str(texture.with_suffix(".tx")),
+             str(texture)],
+            capture_output=True,
+            text=True)
+        if result.returncode != 0:
+            raise Exception(f"maketx failed for {texture}: {result.stderr}")
+
+    def run(self,
+            textures: list[Path],
+            worker: Optional[SubmitWorker] = None,
+            max_workers: Optional[int] = None) -> list[Path]:
+        """Converts every stale texture, running one maketx process per CPU.
+        Returns:
+            The .tx file of every texture, converted or not
+        """
+        if worker is not None:
+            worker.report(stage="tx", files_done=0, files_total=0)
+        stale = [texture for texture in textures if self.is_stale(texture)]
+        if stale:
+            maketx = self.find_maketx()
+            if worker is not None:
+                worker.report(files_total=len(stale))
+            try:
+                with ThreadPoolExecutor(max_workers=max_workers or
+                                        os.cpu_count()) as pool:
+                    futures = {
+                        pool.submit(self.convert, maketx, texture): texture
+                        for texture in stale
+                    }
+                    for done, future in enumerate(as_completed(futures), 1):
+                        if worker is not None and worker.is_cancelled():
+                            for pending in futures:
+                                pending.cancel()
+                            worker.check_cancelled()
+                        future.result()
+                        texture = futures[future]
+                        self.record(texture, self.hash_file(texture))
+                        if worker is not None:
+                            worker.report(files_done=done)
+            finally:
+                self.save()
+        else:
+            self.save()
+        print(f"TX pre-pass: {len(stale)} of {len(textures)} textures "
+              "converted")
+        return [texture.with_suffix(".tx") for texture in textures]
+
+
+class RenderJob:
+    """Everything a farm needs to know to render one job. One job renders one or more
+    render layers of one scene."""
+    name: str = ""
+    # Prefix of the job file names, the writer appends its own suffix
+    file_stem: str = ""
+    project: Path = None
+    scene: Path = None
+    render_dir: Path = None
+    start_frame: int = 0
+    end_frame: int = 1
+    packet_size: int = 1
+    layers: list[str] = []
+    # Extra Render command line arguments, without the render layers
+    extra_args: list[str] = []
+    # Layer -> output paths of its beauty pass without frame number and extension,
+    # one per renderable camera
+    outputs: dict[str, list[Path]] = {}
+    # Frames to render when only part of the range is needed
+    frames: Optional[list[int]] = None
+
+    def __init__(self,
+                 name: str,
+                 file_stem: str,
+                 project: Path,
+                 scene: Path,
+                 render_dir: Path,
+                 start_frame: int,
+                 end_frame: int,
+                 packet_size: int,
+                 layers: list[str],
+                 extra_args: list[str],
+                 outputs: Optional[dict[str, list[Path]]] = None,
+                 frames: Optional[list[int]] = None):
+        self.name = name
+        self.file_stem = file_stem
+        self.project = project
+        self.scene = scene
+        self.render_dir = render_dir
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.packet_size = packet_size
+        self.layers = layers
+        self.extra_args = extra_args
+        self.outputs = outputs or {}
+        self.frames = frames
+
+    @property
+    def frame_range(self) -> str:
+        if self.frames is not None:
+            return RenderedFrames.format_frames(self.frames)
+        return f"{self.start_frame}-{self.end_frame}"
+
+    @property
+    def render_args(self) -> list[str]:
+        return self.extra_args + ["-rl", ",".join(self.layers)]
+
+    @staticmethod
+    def arnold_tx_args(generate_tx: bool, force_tx: bool) -> list[str]:
+        """Arnold's Render flags for the TX file options.
+        -ai:txaum turns on automatic TX generation and -ai:txett makes renders use
+        existing TX files in place of the source textures."""
+        return [
+            "-ai:txamm", "no", "-ai:txaum", "yes" if generate_tx else "no",
+            "-ai:txaun", "no", "-ai:txett", "yes" if force_tx else "no"
+        ]
+
+
+class JobWriter:
+    """Turns render jobs into the job files of one render farm manager."""
+    name: str = ""
+
+    def render(self, job: RenderJob) -> dict[str, str]:
+        """Returns the contents of the job's files keyed by file name suffix."""
+        raise NotImplementedError
+
+    def write(self,
+              jobs: list[RenderJob],
+              directory: Path,
+              profiler: Optional[SubmitProfiler] = None) -> list[Path]:
+        """Writes the files of all jobs in one pass. Everything is rendered before
+        anything is written, and each file is written and flushed to disk under a
+        temporary name before all of them are renamed into place, so the farm never
+        sees a half-written job file.
+        Returns:
+            The paths of the written files
+        """
+        profiler = profiler or SubmitProfiler()
+        contents: dict[Path, str] = {}
+        for job in jobs:
+            with profiler.span("render_config", job=job.name):
+                for suffix, text in self.render(job).items():
+                    path = directory.joinpath(job.file_stem + suffix)
+                    if path in contents:
+                        raise Exception(
+                            f"More than one job would write {path.name}")
+                    contents[path] = text
+
+        temp_paths: dict[Path, Path] = {}
+        try:
+            for path, text in contents.items():
+                temp_path = path.with_name(path.name +
+                                           ThreadedSyncBackend.TEMP_SUFFIX)
+                temp_paths[path] = temp_path
+                with profiler.span("write_config", file=path.name):
+                    with open(temp_path, "w", newline="\n") as f:
+                        f.write(text)
+                        f.flush()
+                        os.fsync(f.fileno())
+            with profiler.span("rename_configs", files=len(temp_paths)):
+                for path, temp_path in temp_paths.items():
+                    os.replace(temp_path, path)
+        finally:
+            for temp_path in temp_paths.values():
+                if temp_path.exists():
+                    temp_path.unlink()
+        return list(contents)
+
+
+class SmedgeJobWriter(JobWriter):
+    name = "smedge"
+    # Smedge's product ID for Maya render jobs
+    MAYA_JOB_TYPE = "833c1fa9-fc0b-46da-920a-c4b74b92d5c1"
+
+    def render(self, job: RenderJob) -> dict[str, str]:
+        # Every job needs its own ID, Smedge treats files with the same ID as one job
+        job_id = str(uuid.uuid4())
+        lines = [
+            f"[{job_id}]",
+            f"ID = {job_id}",
+            f"Type = {self.MAYA_JOB_TYPE}",
+            f"Name = {job.name}",
+            f"Project = {job.project}",
+            f"Scene = {job.scene}",
+            f"RenderDir = {job.render_dir}",
+            f"Range = {job.frame_range}",
+            "Status = 0",
+            f"PacketSize = {job.packet_size}",
+            "FailureLimit = 0",
+            "OvertimeKill = 0",
+            "DistributeMode = 1",
+            f"Extra = {' '.join(job.render_args)}",
+        ]
+        return {"_SmedgeSettings.sj": "\n".join(lines) + "\n"}
+
+
+class DeadlineJobWriter(JobWriter):
+    """Writes the job info and plugin info files taken by
+    `deadlinecommand <job info> <plugin info>`."""
+    name = "deadline"
+
+    def render(self, job: RenderJob) -> dict[str, str]:
+        job_info = [
+            "Plugin=MayaCmd",
+            f"Name={job.name}",
+            f"Frames={job.frame_range}",
+            f"ChunkSize={job.packet_size}",
+            f"OutputDirectory0={job.render_dir}",
+        ]
+        plugin_info = [
+            f"SceneFile={job.scene}",
+            f"ProjectPath={job.project}",
+            f"OutputFilePath={job.render_dir}",
+            "Renderer=arnold",
+            f"CommandLineOptions={' '.join(job.render_args)}",
+        ]
+        return {
+            "_DeadlineJobInfo.job": "\n".join(job_info) + "\n",
+            "_DeadlinePluginInfo.job": "\n".join(plugin_info) + "\n",
+        }
+
+
+class OpenCueJobWriter(JobWriter):
+    """Writes an OpenCue job spec that can be launched with pycuerun or cuesubmit."""
+    name = "opencue"
+
+    def render(self, job: RenderJob) -> dict[str, str]:
+        command = subprocess.list2cmdline([
+            "Render", "-r", "arnold", "-s", "#FRAME_START#", "-e",
+            "#FRAME_END#", "-proj",
+            str(job.project), "-rd",
+            str(job.render_dir)
+        ] + job.render_args + [str(job.scene)])
+        name = re.sub(r"[^A-Za-z0-9_]", "_", job.name)
+        lines = [
+            '<?xml version="1.0"?>',
+            '<!DOCTYPE spec PUBLIC "SPI Cue Specification Language" '
+            '"http://localhost:8080/spcue/dtd/cjsl-1.12.dtd">',
+            "<spec>",
+            f"  <show>{escape(job.project.name)}</show>",
+            f"  <shot>{escape(job.scene.stem)}</shot>",
+            f"  <user>{escape(getpass.getuser())}</user>",
+            f'  <job name="{escape(name)}">',
+            "    <paused>False</paused>",
+            "    <layers>",
+            f'      <layer name="{escape(name)}" type="Render">',
+            f"        <cmd>{escape(command)}</cmd>",
+            f"        <range>{job.frame_range}</range>",
+            f"        <chunk>{job.packet_size}</chunk>",
+            "        <services>",
+            "          <service>maya</service>",
+            "        </services>",
+            "      </layer>",
+            "    </layers>",
+            "  </job>",
+            "</spec>",
+        ]
+        return {"_OpenCue.xml": "\n".join(lines) + "\n"}
+
+
+class ProjectManager:
+    """This class contains the functions that handle all of the file syncing and config generation"""
+    SYNC_BACKENDS: dict[str, type[SyncBackend]] = {
+        ThreadedSyncBackend.name: ThreadedSyncBackend,
+        RobocopySyncBackend.name: RobocopySyncBackend,
+    }
+    JOB_WRITERS: dict[str, type[JobWriter]] = {
+        SmedgeJobWriter.name: SmedgeJobWriter,
+        DeadlineJobWriter.name: DeadlineJobWriter,
+        OpenCueJobWriter.name: OpenCueJobWriter,
+    }
+
+    @staticmethod
+    def find_project(start_dir: Path) -> Path:
+        return PathResolver.find_project(start_dir)
+
+    @staticmethod
+    def group_layers(
+            render_layers: list[RenderLayer]
+    ) -> list[tuple[str, list[RenderLayer]]]:
+        """Splits the enabled layers into jobs: one per ungrouped layer and one per group.
+        A group never picks up an ungrouped layer that shares its name.
+        Returns:
+            (job name, layers) pairs in the order the layers appear
+        """
+        jobs: dict[tuple[bool, str], list[RenderLayer]] = {}
+        for layer in render_layers:
+            if layer.enabled:
+                key = (True, layer.group) if layer.group else (False,
+                                                               layer.name)
+                jobs.setdefault(key, []).append(layer)
+        return [(name, layers) for (_, name), layers in jobs.items()]
+
+    @staticmethod
+    def job_file_suffix(job_name: str) -> str:
+        """Part of a job's file names that comes from the job name."""
+        return PathResolver.file_name(job_name.upper())
+
+    @staticmethod
+    def collect_submit_context(
+            state: SubmitUIState,
+            profiler: Optional[SubmitProfiler] = None) -> SubmitContext:
+        """Queries the open scene for everything the submit needs. Must run on Maya's
+        main thread."""
+        profiler = profiler or SubmitProfiler()
+        scene_path = Path(cmds.file(q=True, sn=True)).absolute()
+        with profiler.span("find_project"):
+            project_path = ProjectManager.find_project(scene_path.parent)
+
+        dependencies = None
+        if state.sync_dependencies_only or state.tx_prepass:
+            with profiler.span("scene_dependencies"):
+                dependencies = SceneDependencies.from_maya(
+                    scene_path, project_path, state.start_frame,
+                    state.end_frame)
+
+        with profiler.span("render_prefix"):
+            render_prefix = cmds.getAttr(
+                'defaultRenderGlobals.imageFilePrefix')
+            render_version = cmds.getAttr('defaultRenderGlobals.renderVersion')
+            cameras = [
+                cmds.listRelatives(shape, parent=True)[0]
+                for shape in cmds.ls(type="camera") or []
+                if cmds.getAttr(f"{shape}.renderable")
+            ]
+        return ProjectManager.create_context(state, scene_path, project_path,
+                                             render_prefix, dependencies,
+                                             cameras, render_version)
+
+    @staticmethod
+    def collect_scene_file_context(
+            state: SubmitUIState,
+            scene_path: Path,
+            scene: Optional[MayaAsciiScene],
+            profiler: Optional[SubmitProfiler] = None) -> SubmitContext:
+        """Same as collect_submit_context, but for a scene file on disk instead of the
+        open scene. Dependencies and the render prefix can only be read from .ma files."""
+        profiler = profiler or SubmitProfiler()
+        with profiler.span("find_project"):
+            project_path = ProjectManager.find_project(scene_path.parent)
+
+        dependencies = None
+        if state.sync_dependencies_only or state.tx_prepass:
+            if scene is None:
+                raise Exception(
+                    f"Can't find the dependencies of {scene_path.name}, only .ma "
+                    "scenes can be read without Maya")
+            with profiler.span("scene_dependencies"):
+                dependencies = SceneDependencies.from_maya_ascii(
+                    scene_path, project_path, state.start_frame,
+                    state.end_frame)
+
+        render_prefix = None
+        render_version = None
+        cameras = []
+        if scene is not None:
+            if "defaultRenderGlobals" in scene.nodes:
+                render_globals = scene.nodes["defaultRenderGlobals"]
+                render_prefix = render_globals.get_string(
+                    "imageFilePrefix", "ifp")
+                render_version = render_globals.get_string(
+                    "renderVersion", "rv")
+            # Cameras are renderable unless the file says otherwise
+            cameras = [
+                node.parent or node.name
+                for node in scene.nodes_of_type("camera")
+                if node.get("renderable", "rnd") is None
+                or node.get_bool("renderable", "rnd")
+            ]
+        return ProjectManager.create_context(state, scene_path, project_path,
+                                             render_prefix, dependencies,
+                                             cameras, render_version)
+
+    @staticmethod
+    def create_context(
+            state: SubmitUIState,
+            scene_path: Path,
+            project_path: Path,
+            render_prefix: Optional[str],
+            dependencies: Optional[SceneDependencies],
+            cameras: Optional[list[str]] = None,
+            render_version: Optional[str] = None) -> SubmitContext:
+        include_files = None
+        if state.sync_dependencies_only:
+            include_files, outside_project = dependencies.split_by_project(
+                project_path)
+            for path in outside_project:
+                print(f"Warning: {path} is outside of the project and will "
+                      "not be synced")
+        textures = None
+        if state.tx_prepass:
+            textures = TxPrepass.find_textures(dependencies)
+        # The scene and workspace are copied before the rest of the project
+        priority_files = SceneDependencies.split_by_paths(
+            [scene_path, project_path.joinpath("workspace.mel")],
+            project_path)[0]
+        return SubmitContext(scene_path, project_path, render_prefix,
+                             include_files, textures, cameras, render_version,
+                             priority_files)
+
+    @staticmethod
+    def run_submit(state: SubmitUIState, context: SubmitContext,
+                   worker: SubmitWorker) -> SyncResult:
+        """Syncs the project and writes the render configs. Doesn't touch Maya, so it
+        can run on a background thread."""
+        profiler = worker.profiler
+        with profiler.capture_python(state.profile_python):
+            sync_result = ProjectManager.sync_and_write_configs(
+                state, context, worker)
+        if state.profile_submit or state.profile_python:
+            profiler.end_stage()
+            trace_path = profiler.save(Path(state.network_project_location),
+                                       context.scene_path.stem)
+            print(f"Submit timings for {context.scene_path.name}:\n"
+                  f"{profiler.summary()}\nTrace written to {trace_path}")
+        return sync_result
+
+    @staticmethod
+    def sync_and_write_configs(state: SubmitUIState, context: SubmitContext,
+                               worker: SubmitWorker) -> SyncResult:
+        sync_result = ProjectManager.sync_project(state, context.project_path,
+                                                  context.include_files,
+                                                  context.textures,
+                                                  context.priority_files,
+                                                  worker)
+        worker.report(stage="configs")
+        jobs = ProjectManager.plan_jobs(state, context, worker.profiler)
+        configs_written = ProjectManager.write_jobs(
+            state.farm_backend, jobs,
+            Path(state.network_project_location).parent, worker)
+        worker.report(
+            message=f"{sync_result}, {configs_written} configs written")
+        return sync_result
+
+    @staticmethod
+    def sync_project(state: SubmitUIState, project_path: Path,
+                     include_files: Optional[set[str]], textures: list[Path],
+                     priority_files: set[str],
+                     worker: SubmitWorker) -> SyncResult:
+        """Runs the TX pre-pass if enabled, then syncs the project to the network
+        project and verifies it if enabled."""
+        profiler = worker.profiler
+        if state.tx_prepass:
+            tx_files = TxPrepass(project_path).run(textures, worker)
+            if include_files is not None:
+                include_files = include_files | SceneDependencies.split_by_paths(
+                    tx_files, project_path)[0]
+            worker.check_cancelled()
+
+        network_project = Path(state.network_project_location)
+        backend = ProjectManager.SYNC_BACKENDS[state.sync_backend].from_state(
+            state)
+        backend.worker = worker
+        backend.scheduler = TransferScheduler.from_state(state, priority_files)
+        watcher = ProjectWatcher.find(project_path, network_project)
+        # Time spent waiting for the lock shows up as the profiler's waiting stage
+        with TransferScheduler.lock(network_project, worker):
+            if watcher is not None:
+                # The watcher mirrors the whole project, so only its last few
+                # seconds of changes are left to sync
+                with profiler.span("sync", backend="watch"):
+                    sync_result = watcher.flush(worker)
+                print(f"Flushed watched changes: {sync_result}")
+            else:
+                with profiler.span("sync", backend=backend.name):
+                    sync_result = backend.sync(project_path, network_project,
+                                               state.exclude_directories,
+                                               include_files)
+                print(f"Synced project with {backend.name}: {sync_result}")
+            worker.check_cancelled()
+            if state.verify_sync:
+                verifier = SyncVerifier()
+                verifier.worker = worker
+                verifier.scheduler = backend.scheduler
+                with profiler.span("verify"):
+                    verifier.verify(project_path, network_project,
+                                    state.exclude_directories, include_files)
+                worker.check_cancelled()
+        return sync_result
+
+    @staticmethod
+    def plan_jobs(state: SubmitUIState, context: SubmitContext,
+                  profiler: SubmitProfiler) -> list[RenderJob]:
+        """Works out the render jobs of a synced scene: one per ungrouped layer and one
+        per group, with their outputs, frames and packet sizes."""
+        scene_path = context.scene_path
+        scene_path_from_project = Path(
+            os.path.relpath(scene_path, context.project_path))
+        network_project = Path(state.network_project_location)
+        job_layers = ProjectManager.group_layers(state.render_layers)
+        with profiler.span("resolve_paths"):
+            rendername = PathResolver.render_name(context.render_prefix,
+                                                  scene_path.stem,
+                                                  context.render_version)
+            render_dir = Path(state.network_render_location).joinpath(
+                f'{rendername}_render').absolute()
+            outputs = PathResolver.output_table(
+                context.render_prefix, scene_path.stem, context.render_version,
+                [layer.name for _, layers in job_layers for layer in layers],
+                context.cameras)
+
+        stats = FrameStats.for_project(network_project)
+        # The pre-pass is wasted unless the renders use the TX files it made
+        extra_args = RenderJob.arnold_tx_args(state.generate_tx,
+                                              state.force_tx
+                                              or state.tx_prepass)
+        rendered_frames = RenderedFrames()
+        jobs = []
+        for job_name, layers in job_layers:
+            with profiler.span("plan_job", job=job_name):
+                layer_names = [layer.name for layer in layers]
+                job_outputs = {
+                    layer: [
+                        render_dir.joinpath(output)
+                        for output in outputs[layer]
+                    ]
+                    for layer in layer_names
+                }
+                frames = None
+                frame_count = state.end_frame - state.start_frame + 1
+                if state.skip_rendered_frames:
+                    with profiler.span("preflight", job=job_name):
+                        rendered = rendered_frames.rendered_frames(
+                            [
+                                output for layer_outputs in
+                                job_outputs.values() for output in layer_outputs
+                            ], state.start_frame, state.end_frame)
+                    if len(rendered) == frame_count:
+                        print(f"Skipping {job_name}, all frames are rendered")
+                        continue
+                    if rendered:
+                        frames = [
+                            frame for frame in range(state.start_frame,
+                                                     state.end_frame + 1)
+                            if frame not in rendered
+                        ]
+                        frame_count = len(frames)
+                        print(f"{job_name}: {len(rendered)} frames already "
+                              f"rendered, rendering "
+                              f"{RenderedFrames.format_frames(frames)}")
+                packet_sizes = [layer.packet_size for layer in layers]
+                packet_size = 0 if 0 in packet_sizes else min(packet_sizes)
+                if packet_size == 0:
+                    packet_size = PacketPlanner.auto_packet_size(
+                        layer_names, frame_count, state.farm_node_count,
+                        stats)
+                    print(
+                        f"Automatic packet size for {job_name}: {packet_size}")
+                if len(layers) > 1:
+                    load_seconds = [
+                        stats.load_seconds(layer) for layer in layer_names
+                    ]
+                    separate = PacketPlanner.scene_load_seconds(
+                        frame_count, packet_size, load_seconds, False)
+                    shared = PacketPlanner.scene_load_seconds(
+                        frame_count, packet_size, load_seconds, True)
+                    print(
+                        f"Scene loads for {job_name}: ~{separate / 3600:.2f}h "
+                        f"as separate jobs, ~{shared / 3600:.2f}h as one job")
+                jobs.append(
+                    RenderJob(
+                        f"{scene_path.name}_{job_name.upper()}",
+                        PathResolver.file_name(
+                            f"{rendername}_"
+                            f"{ProjectManager.job_file_suffix(job_name)}"),
+                        network_project,
+                        network_project.joinpath(scene_path_from_project),
+                        render_dir, state.start_frame, state.end_frame,
+                        packet_size, layer_names, extra_args, job_outputs,
+                        frames))
+
+        return jobs
+
+    @staticmethod
+    def write_jobs(farm_backend: str, jobs: list[RenderJob], directory: Path,
+                   worker: SubmitWorker) -> int:
+        """Writes the job files of every job in one batch. Returns the number of jobs."""
+        writer = ProjectManager.JOB_WRITERS[farm_backend]()
+        written = writer.write(jobs, directory, worker.profiler)
+        for path in written:
+            print(f"Output {writer.name} config: {path}")
+        worker.report(configs_written=worker.progress.configs_written +
+                      len(jobs))
+        return len(jobs)
+
+    @staticmethod
+    def package_project(state: SubmitUIState):
+        """Runs a whole submit on the calling thread."""
+        profiler = SubmitProfiler()
+        context = ProjectManager.collect_submit_context(state, profiler)
+        worker = SubmitWorker(
+            lambda worker: ProjectManager.run_submit(state, context, worker),
+            lambda event: None, profiler)
+        worker.run()
+        if worker.progress.error is not None:
+            raise worker.progress.error
+
+    @staticmethod
+    def read_scene_file(
+            scene_path: Path,
+            settings: Optional[dict] = None,
+            profiler: Optional[SubmitProfiler] = None
+    ) -> tuple[SubmitUIState, SubmitContext]:
+        """Reads the settings saved in a scene file, overridden by settings, and collects
+        its submit context."""
+        scene = None
+        state = SubmitUIState()
+        if scene_path.suffix.lower() == ".ma":
+            scene = MayaAsciiScene(scene_path)
+            state.load_from_maya_ascii(scene)
+        if settings is not None:
+            state.apply_dict(settings)
+        err = state.validate_state()
+        if err:
+            raise Exception(err)
+        context = ProjectManager.collect_scene_file_context(
+            state, scene_path, scene, profiler)
+        return state, context
+
+    @staticmethod
+    def read_scene_files(
+        scene_paths: list[Path],
+        settings: Optional[dict],
+        max_workers: int,
+        worker: SubmitWorker,
+        use_processes: bool = True
+    ) -> tuple[list[tuple[SubmitUIState, SubmitContext]], list[tuple[
+            Path, Exception]]]:
+        """Reads many scene files at once. Parsing .ma files is CPU bound, so it runs in
+        worker processes unless use_processes is False (e.g. inside Maya, where
+        sys.executable isn't a Python interpreter).
+        Returns:
+            (state, context) of every scene that could be read, in order, and
+            (scene path, error) of every scene that couldn't
+        """
+        worker.report(stage="read", files_done=0, files_total=len(scene_paths))
+        executor = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        results = {}
+        errors = []
+        with worker.profiler.span("read_scenes", scenes=len(scene_paths)):
+            with executor(max_workers=max(max_workers, 1)) as pool:
+                futures = {
+                    pool.submit(ProjectManager.read_scene_file, scene_path,
+                                settings): scene_path
+                    for scene_path in scene_paths
+                }
+                for future in as_completed(futures):
+                    if worker.is_cancelled():
+                        for pending in futures:
+                            pending.cancel()
+                        worker.check_cancelled()
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as e:
+                        errors.append((futures[future], e))
+                    worker.report(files_done=len(results) + len(errors))
+        return [
+            results[scene_path]
+            for scene_path in scene_paths
+            if scene_path in results
+        ], errors
+
+    @staticmethod
+    def run_batch_submit(entries: list[tuple[SubmitUIState, SubmitContext]],
+                         worker: SubmitWorker) -> SyncResult:
+        """Submits many scenes as one. Scenes syncing the same project to the same
+        network project share one sync of the union of their files, using the sync
+        settings of the first of them, and the jobs of every scene are written in one
+        batch per farm and directory."""
+        profiler = worker.profiler
+        profile_python = any(state.profile_python for state, _ in entries)
+        sync_result = SyncResult()
+        jobs: dict[tuple[str, Path], list[RenderJob]] = {}
+        with profiler.capture_python(profile_python):
+            syncs: dict[tuple[str, Path],
+                        list[tuple[SubmitUIState, SubmitContext]]] = {}
+            for state, context in entries:
+                destination = os.path.normcase(
+                    os.path.abspath(state.network_project_location))
+                syncs.setdefault((destination, context.project_path),
+                                 []).append((state, context))
+            for (_, project_path), group in syncs.items():
+                state = group[0][0]
+                include_files = set()
+                textures = []
+                priority_files = set()
+                for _, context in group:
+                    if include_files is not None:
+                        if context.include_files is None:
+                            # A scene syncing the whole project covers everyone else
+                            include_files = None
+                        else:
+                            include_files |= context.include_files
+                    textures += context.textures
+                    priority_files |= context.priority_files
+                print(f"Syncing {project_path} once for {len(group)} scenes")
+                sync_result.add(
+                    ProjectManager.sync_project(
+                        state, project_path, include_files,
+                        list(dict.fromkeys(textures)), priority_files,
+                        worker))
+
+            worker.report(stage="configs", configs_written=0)
+            for state, context in entries:
+                directory = Path(state.network_project_location).parent
+                jobs.setdefault((state.farm_backend, directory), []).extend(
+                    ProjectManager.plan_jobs(state, context, profiler))
+            configs_written = 0
+            for (farm_backend, directory), batch in jobs.items():
+                configs_written += ProjectManager.write_jobs(
+                    farm_backend, batch, directory, worker)
+        if any(state.profile_submit or state.profile_python
+               for state, _ in entries):
+            profiler.end_stage()
+            state = entries[0][0]
+            trace_path = profiler.save(Path(state.network_project_location),
+                                       f"batch_{len(entries)}_scenes")
+            print(f"Submit timings for {len(entries)} scenes:\n"
+                  f"{profiler.summary()}\nTrace written to {trace_path}")
+        worker.report(
+            message=f"{len(entries)} scenes, {sync_result}, "
+            f"{configs_written} configs written")
+        return sync_result
+
+
+class CommandLine:
+    """Headless entry point for submitting scene files without the Maya UI. Nothing on
+    this path imports pymel."""
+
+    @staticmethod
+    def build_parser() -> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(
+            prog="submit-smedge-render.py",
+            description="Sync Maya projects and generate Smedge job files.")
+        subparsers = parser.add_subparsers(dest="command", required=True)
+        submit = subparsers.add_parser(
+            "submit",
+            help="Submit one or more scene files",
+            description=
+            ("Syncs each scene's project and writes its render configs. Settings "
+             "are read from the config node saved in .ma scenes, then overridden "
+             "by --settings."))
+        submit.add_argument("scenes", nargs="+", type=Path)
+        submit.add_argument(
+            "--settings",
+            type=Path,
+            help="JSON or TOML file laid out like SubmitUIState.to_dict")
+        submit.add_argument("--jobs",
+                            type=int,
+                            default=4,
+                            help="Number of scenes to process at once")
+        submit.add_argument(
+            "--batch",
+            action="store_true",
+            help="Sync each project once for all of its scenes and write every "
+            "job file in one pass")
+        submit.add_argument(
+            "--profile",
+            action="store_true",
+            help="Print a timing summary and save a trace of each submit")
+        submit.add_argument("--profile-python",
+                            action="store_true",
+                            help="Also run cProfile during each submit")
+
+        profile_history = subparsers.add_parser(
+            "profile-history",
+            help="Show the submit times recorded by profiled submits")
+        profile_history.add_argument("network_project", type=Path)
+        profile_history.add_argument("--last", type=int, default=20)
+
+        watch = subparsers.add_parser(
+            "watch",
+            help="Keep syncing a scene's project until interrupted",
+            description=
+            ("Syncs the project once, then keeps syncing changes in small "
+             "batches until Ctrl+C. Settings are read like for submit."))
+        watch.add_argument("scene", type=Path)
+        watch.add_argument(
+            "--settings",
+            type=Path,
+            help="JSON or TOML file laid out like SubmitUIState.to_dict")
+        watch.add_argument("--poll",
+                           action="store_true",
+                           help="Poll for changes instead of using inotify")
+
+        record_stats = subparsers.add_parser(
+            "record-stats",
+            help="Record render times used for automatic packet sizes")
+        record_stats.add_argument("network_project", type=Path)
+        record_stats.add_argument("--layer", required=True)
+        record_stats.add_argument(
+            "--log",
+            type=Path,
+            nargs="*",
+            default=[],
+            help="Render logs to read Arnold frame times from")
+        record_stats.add_argument("--frame-seconds",
+                                  type=float,
+                                  nargs="*",
+                                  default=[])
+        record_stats.add_argument("--load-seconds",
+                                  type=float,
+                                  nargs="*",
+                                  default=[])
+
+        make_tx = subparsers.add_parser(
+            "make-tx",
+            help="Convert the textures of .ma scenes to TX",
+            description=
+            ("Runs the TX pre-pass on its own, e.g. as a farm job that render "
+             "jobs wait for."))
+        make_tx.add_argument("scenes", nargs="+", type=Path)
+        make_tx.add_argument("--start-frame", type=int, default=0)
+        make_tx.add_argument("--end-frame", type=int, default=0)
+        make_tx.add_argument("--jobs",
+                             type=int,
+                             default=None,
+                             help="Number of maketx processes, one per CPU by "
+                             "default")
+
+        simulate = subparsers.add_parser(
+            "simulate-packets",
+            help="Compare packet size strategies on a simulated farm")
+        simulate.add_argument("--frames", type=int, default=240)
+        simulate.add_argument("--frame-seconds", type=float, default=120.0)
+        simulate.add_argument("--load-seconds", type=float, default=45.0)
+        simulate.add_argument("--nodes", type=int, default=8)
+        simulate.add_argument(
+            "--variance",
+            type=float,
+            default=0.3,
+            help="Random spread of frame times, as a fraction of --frame-seconds")
+        simulate.add_argument(
+            "--ramp",
+            type=float,
+            default=1.0,
+            help="How much slower the last frame is than the first")
+        simulate.add_argument("--seed", type=int, default=0)
+        return parser
+
+    @staticmethod
+    def main(argv: list[str]) -> int:
+        args = CommandLine.build_parser().parse_args(argv)
+        if args.command == "submit":
+            overrides = {}
+            if args.profile:
+                overrides["profile_submit"] = True
+            if args.profile_python:
+                overrides["profile_python"] = True
+            if args.batch:
+                return CommandLine.submit_batch(args.scenes, args.settings,
+                                                args.jobs, overrides)
+            return CommandLine.submit(args.scenes, args.settings, args.jobs,
+                                      overrides)
+        if args.command == "profile-history":
+            return CommandLine.profile_history(args.network_project, args.last)
+        if args.command == "watch":
+            return CommandLine.watch(args.scene, args.settings, args.poll)
+        if args.command == "record-stats":
+            stats = FrameStats.for_project(args.network_project)
+            for log in args.log:
+                found = stats.record_log(
+                    args.layer, log.read_text(errors="replace"))
+                print(f"{log}: {found} frame times")
+            stats.record(args.layer, args.frame_seconds, args.load_seconds)
+            stats.save()
+            return 0
+        if args.command == "make-tx":
+            for scene_path in args.scenes:
+                scene_path = scene_path.absolute()
+                project_path = ProjectManager.find_project(scene_path.parent)
+                dependencies = SceneDependencies.from_maya_ascii(
+                    scene_path, project_path, args.start_frame,
+                    args.end_frame)
+                TxPrepass(project_path).run(
+                    TxPrepass.find_textures(dependencies),
+                    max_workers=args.jobs)
+            return 0
+        if args.command == "simulate-packets":
+            return CommandLine.simulate_packets(args)
+        return 1
+
+    @staticmethod
+    def simulate_packets(args: argparse.Namespace) -> int:
+        rng = random.Random(args.seed)
+        frame_seconds = []
+        for i in range(args.frames):
+            ramp = 1 + (args.ramp - 1) * i / max(args.frames - 1, 1)
+            spread = 1 + rng.uniform(-args.variance, args.variance)
+            frame_seconds.append(
+                max(args.frame_seconds * ramp * spread, 0.0))
+        results = PacketPlanner.compare_strategies(frame_seconds,
+                                                   args.load_seconds,
+                                                   args.nodes)
+        best = min(seconds for _, _, _, seconds in results)
+        print(f"{'strategy':<16}{'packet':>8}  {'ordering':<16}"
+              f"{'wall clock':>12}{'vs best':>9}")
+        for name, size, ordering, seconds in results:
+            print(f"{name:<16}{size:>8}  {ordering:<16}"
+                  f"{seconds / 3600:>11.2f}h{seconds / best:>8.2f}x")
+        return 0
+
+    @staticmethod
+    def profile_history(network_project: Path, last: int) -> int:
+        history_path = network_project.joinpath(SYNC_METADATA_DIR,
+                                                SubmitProfiler.PROFILE_DIR,
+                                                SubmitProfiler.HISTORY_FILE_NAME)
+        if not history_path.is_file():
+            print(f"No profiled submits recorded in {network_project}")
+            return 1
+        with open(history_path, "r") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        for record in records[-last:]:
+            spans = record["spans"]
+            slowest = ", ".join(
+                f"{name} {seconds:.1f}s" for name, seconds in sorted(
+                    spans.items(), key=lambda item: -item[1])[:3])
+            print(f"{record['time']}  {record['label']:<24} "
+                  f"{record['total_seconds']:>8.1f}s  ({slowest})")
+        return 0
+
+    @staticmethod
+    def submit(scenes: list[Path],
+               settings_path: Optional[Path],
+               jobs: int,
+               overrides: Optional[dict] = None) -> int:
+        settings = None
+        if settings_path is not None:
+            settings = SubmitUIState.read_settings_file(settings_path)
+        if overrides:
+            settings = {**(settings or {}), **overrides}
+        # Scenes from the same project sync to the same place, so their syncs take turns
+        sync_locks: dict[str, threading.Lock] = {}
+        locks_lock = threading.Lock()
+
+        def sync_lock(destination: str) -> threading.Lock:
+            with locks_lock:
+                return sync_locks.setdefault(
+                    os.path.normcase(os.path.abspath(destination)),
+                    threading.Lock())
+
+        failures = 0
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+            futures = {
+                pool.submit(CommandLine.submit_scene, scene.absolute(),
+                            settings, sync_lock): scene
+                for scene in scenes
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"[{futures[future].name}] Failed: {e}",
+                          file=sys.stderr)
+                    failures += 1
+        return 1 if failures > 0 else 0
+
+    @staticmethod
+    def submit_batch(scenes: list[Path],
+                     settings_path: Optional[Path],
+                     jobs: int,
+                     overrides: Optional[dict] = None) -> int:
+        settings = None
+        if settings_path is not None:
+            settings = SubmitUIState.read_settings_file(settings_path)
+        if overrides:
+            settings = {**(settings or {}), **overrides}
+        failures = 0
+
+        def run(worker: SubmitWorker) -> SyncResult:
+            nonlocal failures
+            entries, errors = ProjectManager.read_scene_files(
+                [scene.absolute() for scene in scenes], settings, jobs, worker)
+            for scene_path, e in errors:
+                print(f"[{scene_path.name}] Failed: {e}", file=sys.stderr)
+            failures = len(errors)
+            if not entries:
+                raise Exception("No scenes could be read")
+            return ProjectManager.run_batch_submit(entries, worker)
+
+        worker = SubmitWorker(run, CommandLine.progress_printer("batch"),
+                              SubmitProfiler())
+        worker.run()
+        if worker.progress.error is not None:
+            print(f"[batch] Failed: {worker.progress.error}", file=sys.stderr)
+            return 1
+        return 1 if failures > 0 else 0
+
+    @staticmethod
+    def watch(scene_path: Path, settings_path: Optional[Path],
+              poll: bool) -> int:
+        settings = None
+        if settings_path is not None:
+            settings = SubmitUIState.read_settings_file(settings_path)
+        scene_path = scene_path.absolute()
+        state = SubmitUIState()
+        if scene_path.suffix.lower() == ".ma":
+            state.load_from_maya_ascii(MayaAsciiScene(scene_path))
+        if settings is not None:
+            state.apply_dict(settings)
+        err = state.validate_state()
+        if err:
+            print(err, file=sys.stderr)
+            return 1
+        project_path = ProjectManager.find_project(scene_path.parent)
+        watcher = ProjectWatcher(project_path,
+                                 state,
+                                 use_inotify=False if poll else None)
+        watcher.start()
+        print(f"Watching {project_path}, press Ctrl+C to stop")
+        try:
+            while watcher.is_alive():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.stop(wait=True)
+        return 0
+
+    @staticmethod
+    def progress_printer(label: str) -> Callable[[ProgressEvent], None]:
+        """Prints an event whenever the stage changes and when the submit finishes."""
+        last_stage = None
+
+        def print_progress(event: ProgressEvent):
+            nonlocal last_stage
+            if event.error is not None:
+                # Reported by the caller once the submit is done
+                return
+            if event.stage != last_stage or event.finished:
+                last_stage = event.stage
+                print(f"[{label}] {event.describe()}")
+
+        return print_progress
+
+    @staticmethod
+    def submit_scene(scene_path: Path, settings: Optional[dict],
+                     sync_lock: Callable[[str], threading.Lock]):
+        profiler = SubmitProfiler()
+        state, context = ProjectManager.read_scene_file(
+            scene_path, settings, profiler)
+
+        def run(worker: SubmitWorker) -> SyncResult:
+            with sync_lock(state.network_project_location):
+                return ProjectManager.run_submit(state, context, worker)
 
-        pass
+        worker = SubmitWorker(run,
+                              CommandLine.progress_printer(scene_path.name),
+                              profiler)
+        worker.run()
+        if worker.progress.error is not None:
+            raise worker.progress.error
 
 
-state = SubmitUIState().load_from_node()
-submit_ui = SubmitUI(state, lambda x: None, lambda x: None, lambda x: None)
-submit_ui.show()
+if __name__ == "__main__":
+    if "maya.cmds" in sys.modules:
+        # Running from the script editor or a shelf button
+        state = SubmitUIState().load_from_node()
+        submit_ui = SubmitUI(state, lambda x: None, lambda x: None,
+                             lambda x: None)
+        submit_ui.show()
+    else:
+        sys.exit(CommandLine.main(sys.argv[1:]))
@@ -0,0 +1,17 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+SCRIPT_PATH = Path(__file__).parent.parent.joinpath("submit-smedge-render.py")
+
+
+@pytest.fixture(scope="session")
+def ssr():
+    """The submit script loaded as a module. Its file name isn't importable, and
+    nothing on this path imports Maya."""
+    spec = importlib.util.spec_from_file_location("submit_smedge_render",
+                                                  SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
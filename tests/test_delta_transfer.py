@@ -0,0 +1,148 @@
+"""Tests of rewriting only the changed blocks of large network files."""
+import os
+import random
+
+import pytest
+
+BLOCK_SIZE = 1024
+
+
+@pytest.fixture
+def cache(ssr, tmp_path, monkeypatch):
+    """A local project with one "large" cache file, synced with delta transfers. Block
+    and threshold sizes are scaled down so the files stay small."""
+    monkeypatch.setattr(ssr.DeltaTransfer, "BLOCK_SIZE", BLOCK_SIZE)
+    monkeypatch.setattr(ssr.ThreadedSyncBackend, "DELTA_THRESHOLD",
+                        4 * BLOCK_SIZE)
+    source = tmp_path.joinpath("project")
+    destination = tmp_path.joinpath("network", "project")
+    source.joinpath("cache").mkdir(parents=True)
+    destination.mkdir(parents=True)
+    path = source.joinpath("cache", "sim.abc")
+    path.write_bytes(random.Random(0).randbytes(10 * BLOCK_SIZE))
+    sync(ssr, source, destination)
+    return source, destination, path
+
+
+def sync(ssr, source, destination):
+    return ssr.ThreadedSyncBackend(delta_transfer=True).sync(
+        source, destination, [])
+
+
+def rewrite(path, data):
+    """Changes a file and moves its mtime past the sync's tolerance."""
+    mtime = os.path.getmtime(path) + 10
+    path.write_bytes(data)
+    os.utime(path, (mtime, mtime))
+
+
+def network_copy(source, destination, path):
+    return destination.joinpath(path.relative_to(source))
+
+
+def chunks(ssr, destination):
+    with ssr.SyncManifest(destination) as manifest:
+        return manifest.load_chunks(["cache/sim.abc"]).get("cache/sim.abc")
+
+
+def fail_hash_file(*args):
+    raise AssertionError("the network copy was hashed again")
+
+
+def test_changed_block_is_the_only_one_sent(ssr, cache, monkeypatch):
+    source, destination, path = cache
+    data = bytearray(path.read_bytes())
+    data[3 * BLOCK_SIZE + 5] ^= 0xFF
+    rewrite(path, data)
+    monkeypatch.setattr(ssr.DeltaTransfer, "hash_file", fail_hash_file)
+
+    result = sync(ssr, source, destination)
+
+    assert result.bytes_copied == BLOCK_SIZE
+    assert result.bytes_skipped == 9 * BLOCK_SIZE
+    assert network_copy(source, destination, path).read_bytes() == data
+
+
+def test_grown_file(ssr, cache):
+    source, destination, path = cache
+    data = path.read_bytes() + b"more frames" * 500
+    rewrite(path, data)
+
+    result = sync(ssr, source, destination)
+
+    assert result.bytes_skipped == 10 * BLOCK_SIZE
+    assert result.bytes_copied == len(data) - 10 * BLOCK_SIZE
+    assert network_copy(source, destination, path).read_bytes() == data
+    assert len(chunks(ssr, destination)) == 16
+
+
+def test_shrunk_file_is_truncated(ssr, cache):
+    source, destination, path = cache
+    data = path.read_bytes()[:int(5.5 * BLOCK_SIZE)]
+    rewrite(path, data)
+
+    result = sync(ssr, source, destination)
+
+    assert result.bytes_skipped == 5 * BLOCK_SIZE
+    assert result.bytes_copied == BLOCK_SIZE // 2
+    assert network_copy(source, destination, path).read_bytes() == data
+    assert len(chunks(ssr, destination)) == 6
+
+
+def test_unchanged_content_reuses_the_chunk_index(ssr, cache, monkeypatch):
+    source, destination, path = cache
+    assert len(chunks(ssr, destination)) == 10
+    assert sync(ssr, source, destination).files_copied == 0
+    # Touched, but the content is the same
+    rewrite(path, path.read_bytes())
+    monkeypatch.setattr(ssr.DeltaTransfer, "hash_file", fail_hash_file)
+
+    result = sync(ssr, source, destination)
+
+    assert result.files_copied == 1
+    assert result.bytes_copied == 0
+    assert result.bytes_skipped == 10 * BLOCK_SIZE
+
+
+def test_interrupted_write_rehashes_the_network_copy(ssr, cache,
+                                                     monkeypatch):
+    source, destination, path = cache
+    data = random.Random(1).randbytes(10 * BLOCK_SIZE)
+    rewrite(path, data)
+    hash_block = ssr.DeltaTransfer.hash_block
+    hashed_blocks = []
+
+    def failing_hash_block(block):
+        hashed_blocks.append(block)
+        if len(hashed_blocks) > 4:
+            raise OSError("network share disconnected")
+        return hash_block(block)
+
+    monkeypatch.setattr(ssr.DeltaTransfer, "hash_block",
+                        staticmethod(failing_hash_block))
+    with pytest.raises(OSError):
+        sync(ssr, source, destination)
+    monkeypatch.setattr(ssr.DeltaTransfer, "hash_block",
+                        staticmethod(hash_block))
+
+    # Half written, and the chunk index no longer describes it
+    partial = network_copy(source, destination, path).read_bytes()
+    assert partial[:4 * BLOCK_SIZE] == data[:4 * BLOCK_SIZE]
+    assert partial[4 * BLOCK_SIZE:] != data[4 * BLOCK_SIZE:]
+    assert chunks(ssr, destination) is None
+
+    hash_file = ssr.DeltaTransfer.hash_file
+    rehashed = []
+
+    def counting_hash_file(path, limiter=None):
+        rehashed.append(path)
+        return hash_file(path, limiter)
+
+    monkeypatch.setattr(ssr.DeltaTransfer, "hash_file",
+                        staticmethod(counting_hash_file))
+    result = sync(ssr, source, destination)
+
+    assert rehashed == [network_copy(source, destination, path)]
+    assert result.bytes_skipped == 4 * BLOCK_SIZE
+    assert network_copy(source, destination, path).read_bytes() == data
+    assert len(chunks(ssr, destination)) == 10
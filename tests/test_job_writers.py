@@ -0,0 +1,144 @@
+"""Golden file tests for the job files written for each render farm. Run with
+UPDATE_GOLDEN=1 to rewrite the golden files after an intended format change."""
+import os
+import uuid
+from pathlib import Path, PurePosixPath
+
+import pytest
+
+GOLDEN_DIR = Path(__file__).parent.joinpath("golden")
+
+
+@pytest.fixture
+def jobs(ssr, monkeypatch):
+    job_ids = iter([
+        uuid.UUID("00000000-0000-4000-8000-000000000001"),
+        uuid.UUID("00000000-0000-4000-8000-000000000002"),
+    ])
+    monkeypatch.setattr(ssr.uuid, "uuid4", lambda: next(job_ids))
+    monkeypatch.setattr(ssr.getpass, "getuser", lambda: "artist")
+    # Posix paths so the output is the same on every platform
+    project = PurePosixPath("/mnt/farm/projects/show")
+    render_dir = PurePosixPath("/mnt/farm/renders/shot010_render")
+    return [
+        # Resubmit of a partly rendered single layer job
+        ssr.RenderJob("shot010.ma_MASTERLAYER",
+                      "shot010_MASTERLAYER",
+                      project,
+                      project.joinpath("scenes/shot010.ma"),
+                      render_dir,
+                      1,
+                      10,
+                      2, ["defaultRenderLayer"],
+                      ssr.RenderJob.arnold_tx_args(False, True),
+                      frames=[1, 2, 3, 7, 9, 10]),
+        # Layer group sharing one scene load
+        ssr.RenderJob("shot010.ma_CHARS", "shot010_CHARS", project,
+                      project.joinpath("scenes/shot010.ma"), render_dir, 1,
+                      100, 5, ["rs_hero", "rs_crowd", "rs_fx"],
+                      ssr.RenderJob.arnold_tx_args(True, False)),
+    ]
+
+
+@pytest.mark.parametrize("farm_backend", ["smedge", "deadline", "opencue"])
+def test_job_files_match_golden_files(ssr, jobs, tmp_path, farm_backend):
+    writer = ssr.ProjectManager.JOB_WRITERS[farm_backend]()
+    written = writer.write(jobs, tmp_path)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        path.name for path in written)
+    for path in written:
+        golden_path = GOLDEN_DIR.joinpath(farm_backend, path.name)
+        text = path.read_text()
+        if os.environ.get("UPDATE_GOLDEN"):
+            golden_path.parent.mkdir(parents=True, exist_ok=True)
+            golden_path.write_text(text)
+        assert text == golden_path.read_text(), path.name
+
+
+def test_frame_list_and_layer_list(ssr, jobs):
+    partial, grouped = jobs
+    assert partial.frame_range == "1-3,7,9-10"
+    assert grouped.frame_range == "1-100"
+    assert grouped.render_args[-2:] == ["-rl", "rs_hero,rs_crowd,rs_fx"]
+
+
+def test_write_replaces_existing_files_and_leaves_no_temp_files(
+        ssr, jobs, tmp_path):
+    existing = tmp_path.joinpath("shot010_CHARS_SmedgeSettings.sj")
+    existing.write_text("half written")
+
+    ssr.SmedgeJobWriter().write(jobs, tmp_path)
+
+    assert "Name = shot010.ma_CHARS" in existing.read_text()
+    assert not list(tmp_path.glob("*" + ssr.ThreadedSyncBackend.TEMP_SUFFIX))
+
+
+def test_group_never_merges_a_layer_sharing_its_name(ssr):
+    layers = [
+        ssr.RenderLayer("hero", True, 1),
+        ssr.RenderLayer("rs_hero_body", True, 1, "hero"),
+        ssr.RenderLayer("rs_hero_hair", True, 1, "hero"),
+        ssr.RenderLayer("bg", False, 1),
+    ]
+
+    jobs = ssr.ProjectManager.group_layers(layers)
+
+    assert [(name, [layer.name for layer in job_layers])
+            for name, job_layers in jobs] == [
+                ("hero", ["hero"]),
+                ("hero", ["rs_hero_body", "rs_hero_hair"]),
+            ]
+
+
+@pytest.mark.parametrize(
+    "layers",
+    [
+        # A group named like an ungrouped layer
+        [("hero", ""), ("rs_hero_body", "hero")],
+        # Groups that differ only in case
+        [("rs_a", "Chars"), ("rs_b", "chars")],
+        # Names that are the same once made valid file names
+        [("fx/smoke", ""), ("fx_smoke", "")],
+    ])
+def test_validate_rejects_jobs_with_the_same_file_names(
+        ssr, tmp_path, layers):
+    state = ssr.SubmitUIState()
+    state.network_project_location = str(tmp_path)
+    state.network_render_location = str(tmp_path)
+    state.render_layers = [
+        ssr.RenderLayer(name, True, 1, group) for name, group in layers
+    ]
+
+    assert "same job files" in state.validate_state()
+
+
+def test_write_rejects_jobs_with_the_same_file_names(ssr, jobs, tmp_path):
+    jobs[1].file_stem = jobs[0].file_stem
+
+    with pytest.raises(Exception, match="More than one job"):
+        ssr.SmedgeJobWriter().write(jobs, tmp_path)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("tx_prepass, force_tx, txett", [
+    (False, False, "no"),
+    (False, True, "yes"),
+    (True, False, "yes"),
+])
+def test_planned_jobs_use_pregenerated_tx_files(ssr, tmp_path, tx_prepass,
+                                                force_tx, txett):
+    project = tmp_path.joinpath("project")
+    scene_path = project.joinpath("scenes", "shot010.ma")
+    state = ssr.SubmitUIState()
+    state.network_project_location = str(tmp_path.joinpath("network"))
+    state.network_render_location = str(tmp_path.joinpath("renders"))
+    state.render_layers = [ssr.RenderLayer("beauty", True, 5)]
+    state.tx_prepass = tx_prepass
+    state.force_tx = force_tx
+    context = ssr.SubmitContext(scene_path, project, None, None)
+
+    jobs = ssr.ProjectManager.plan_jobs(state, context, ssr.SubmitProfiler())
+
+    args = jobs[0].extra_args
+    assert args[args.index("-ai:txett") + 1] == txett
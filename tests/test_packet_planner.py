@@ -0,0 +1,64 @@
+"""Tests of automatic packet sizes from frame time history."""
+import math
+import random
+from pathlib import Path
+
+
+def stats_with_history(ssr, frame_seconds, load_seconds, heavy_share=0.0):
+    """History where heavy_share of the frames take ten times as long."""
+    rng = random.Random(0)
+    stats = ssr.FrameStats(Path("frame_stats.json"))
+    stats.record("beauty", [
+        frame_seconds * (10 if rng.random() < heavy_share else 1)
+        for _ in range(200)
+    ], [load_seconds])
+    return stats
+
+
+def test_spread_of_frame_times_changes_packet_size(ssr):
+    even = stats_with_history(ssr, 20, 10)
+    uneven = stats_with_history(ssr, 20, 10, heavy_share=0.1)
+
+    even_size = ssr.PacketPlanner.auto_packet_size(["beauty"], 240, 8, even)
+    uneven_size = ssr.PacketPlanner.auto_packet_size(["beauty"], 240, 8,
+                                                     uneven)
+
+    assert even_size == math.ceil(240 / 8)
+    assert uneven_size < even_size
+
+
+def test_packets_are_capped_so_one_failure_cannot_hold_the_job(ssr):
+    stats = stats_with_history(ssr, 600, 60)
+
+    size = ssr.PacketPlanner.auto_packet_size(["beauty"], 240, 8, stats)
+
+    assert 60 + size * 600 <= ssr.PacketPlanner.MAX_PACKET_SECONDS
+    assert size >= 1
+
+
+def test_auto_matches_the_best_strategy_within_the_cap(ssr):
+    rng = random.Random(0)
+    frame_seconds = [
+        120 * (1 + 2 * i / 239) * (1 + rng.uniform(-0.3, 0.3))
+        for i in range(240)
+    ]
+
+    results = ssr.PacketPlanner.compare_strategies(frame_seconds, 45, 8)
+
+    auto = [seconds for name, _, _, seconds in results if name == "auto"]
+    assert len(auto) == 1
+    max_size = ssr.PacketPlanner.max_packet_size([frame_seconds], 45, 8)
+    assert auto[0] <= min(seconds for _, size, _, seconds in results
+                          if size <= max_size)
+
+
+def test_no_history_uses_defaults(ssr):
+    stats = ssr.FrameStats(Path("frame_stats.json"))
+
+    size = ssr.PacketPlanner.auto_packet_size(["beauty", "shadow"], 100, 4,
+                                              stats)
+
+    frame_seconds = 2 * ssr.FrameStats.DEFAULT_FRAME_SECONDS
+    assert 1 <= size <= 25
+    assert (ssr.FrameStats.DEFAULT_LOAD_SECONDS + size * frame_seconds <=
+            ssr.PacketPlanner.MAX_PACKET_SECONDS)
@@ -0,0 +1,118 @@
+"""Tests of the watch mode's change batches, using polling so they run anywhere."""
+import os
+import shutil
+
+import pytest
+
+from test_threaded_sync import assert_mirrored
+
+
+@pytest.fixture
+def watcher(ssr, tmp_path):
+    source = tmp_path.joinpath("project")
+    destination = tmp_path.joinpath("network", "project")
+    for rel_path in ["scenes/shot010.ma", "sourceimages/wood.tx"]:
+        source.joinpath(rel_path).parent.mkdir(parents=True, exist_ok=True)
+        source.joinpath(rel_path).write_text(rel_path)
+    destination.mkdir(parents=True)
+    state = ssr.SubmitUIState()
+    state.network_project_location = str(destination)
+    state.exclude_directories = ["autosave", "cache/tmp"]
+    watcher = ssr.ProjectWatcher(source, state, use_inotify=False)
+    # What the watcher's thread does before its first batch
+    watcher.start_watching()
+    result = watcher.flush()
+    assert result.files_copied == 2
+    return watcher
+
+
+def dirs(watcher):
+    return watcher.project_path, watcher.network_project
+
+
+def test_flush_with_nothing_pending_syncs_nothing(ssr, watcher):
+    result = watcher.flush()
+
+    assert (result.files_scanned, result.files_copied,
+            result.files_deleted) == (0, 0, 0)
+
+
+def test_created_and_changed_files(ssr, watcher):
+    source, destination = dirs(watcher)
+    source.joinpath("scenes", "shot020.ma").write_text("new")
+    scene = source.joinpath("scenes", "shot010.ma")
+    scene.write_text("changed")
+    mtime = os.path.getmtime(scene) + 10
+    os.utime(scene, (mtime, mtime))
+
+    result = watcher.flush()
+
+    assert (result.files_scanned, result.files_copied) == (2, 2)
+    assert_mirrored(ssr, source, destination)
+
+
+def test_deleted_files_and_directories(ssr, watcher):
+    source, destination = dirs(watcher)
+    source.joinpath("scenes", "shot010.ma").unlink()
+    shutil.rmtree(source.joinpath("sourceimages"))
+
+    result = watcher.flush()
+
+    assert result.files_deleted == 2
+    assert_mirrored(ssr, source, destination)
+
+
+def test_renamed_file_and_directory(ssr, watcher):
+    source, destination = dirs(watcher)
+    source.joinpath("scenes", "shot010.ma").rename(
+        source.joinpath("scenes", "shot010_v2.ma"))
+    source.joinpath("sourceimages").rename(source.joinpath("textures"))
+
+    watcher.flush()
+
+    assert_mirrored(ssr, source, destination)
+
+
+def test_new_directory_batch_skips_excluded_directories(ssr, watcher):
+    source, destination = dirs(watcher)
+    for rel_path in [
+            "cache/sim.abc", "cache/tmp/scratch.abc",
+            "cache/autosave/shot010.ma", "assets/hero/tmp/hero.ma"
+    ]:
+        source.joinpath(rel_path).parent.mkdir(parents=True, exist_ok=True)
+        source.joinpath(rel_path).write_text(rel_path)
+
+    watcher.flush()
+
+    assert destination.joinpath("cache", "sim.abc").is_file()
+    assert destination.joinpath("assets", "hero", "tmp", "hero.ma").is_file()
+    assert not destination.joinpath("cache", "tmp").exists()
+    assert not destination.joinpath("cache", "autosave").exists()
+
+
+def test_failed_batch_is_synced_again(ssr, watcher, monkeypatch):
+    source, destination = dirs(watcher)
+    source.joinpath("scenes", "shot020.ma").write_text("new")
+
+    def failing_sync(*args, **kwargs):
+        raise OSError("network share disconnected")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ssr.ThreadedSyncBackend, "sync", failing_sync)
+        with pytest.raises(OSError):
+            watcher.flush()
+
+    assert watcher.flush().files_copied == 1
+    assert_mirrored(ssr, source, destination)
+
+
+def test_new_directory_is_scanned_with_project_exclusions(ssr, watcher):
+    source, _ = dirs(watcher)
+    for rel_path in ["cache/sim.abc", "cache/tmp/scratch.abc"]:
+        source.joinpath(rel_path).parent.mkdir(parents=True, exist_ok=True)
+        source.joinpath(rel_path).write_text(rel_path)
+
+    # Batches from inotify name the new directory instead of its files
+    assert watcher.split_changes({"cache", "scenes/gone.ma"}) == ({
+        "cache/sim.abc"
+    }, {"scenes/gone.ma"})
@@ -0,0 +1,174 @@
+"""Tests of finding a scene's dependencies by parsing .ma files."""
+import pytest
+
+SCENE = """//Maya ASCII 2024 scene
+requires maya "2024";
+file -rdi 1 -ns "hero" -rfn "heroRN" "assets/hero.ma";
+file -rdi 1 -ns "hero1" -rfn "heroRN1" "assets/hero.ma{1}";
+file -r -ns "hero" -dr 1 -rfn "heroRN" "assets/hero.ma";
+file -r -ns "hero1" -dr 1 -rfn "heroRN1" "assets/hero.ma{1}";
+createNode file -n "wood";
+\tsetAttr ".ftn" -type "string" "sourceimages/wood.<UDIM>.tx";
+createNode file -n "fire";
+\tsetAttr ".ftn" -type "string" "sourceimages/fire/fire.0001.exr";
+\tsetAttr ".ufe" yes;
+createNode file -n "poster";
+\tsetAttr ".ftn" -type "string" "sourceimages/poster.0001.exr";
+createNode aiStandIn -n "crowdShape" -p "crowd";
+\tsetAttr ".dso" -type "string" "cache/crowd.####.ass";
+createNode aiVolume -n "smokeShape" -p "smoke";
+\tsetAttr ".fn" -type "string" "cache/smoke.<f>.vdb";
+createNode gpuCache -n "cityShape" -p "city";
+\tsetAttr ".cfn" -type "string" ("cache/city/very/deep/folder/structure/"
+\t\t+ "city_" + "v003.abc");
+createNode aiImage -n "sign";
+	setAttr ".fn" -type "string" "sourceimages/" + "sign.tx";
+createNode file -n "shared";
+\tsetAttr ".ftn" -type "string" "{outside}/library/brick.tx";
+// createNode file -n "commented";
+// setAttr ".ftn" -type "string" "sourceimages/commented.tx";
+"""
+
+REFERENCE = """//Maya ASCII 2024 scene
+createNode file -n "skin";
+\tsetAttr ".ftn" -type "string" "sourceimages/hero/skin.<UDIM>.tx";
+createNode AlembicNode -n "hero_abc";
+\tsetAttr ".fn" -type "string" "cache/hero.abc";
+"""
+
+PROJECT_FILES = [
+    "workspace.mel",
+    "assets/hero.ma",
+    "sourceimages/wood.1001.tx",
+    "sourceimages/wood.1002.tx",
+    "sourceimages/wood.1001.tif",
+    "sourceimages/wood_old.1001.tx",
+    "sourceimages/fire/fire.0009.exr",
+    "sourceimages/fire/fire.0010.exr",
+    "sourceimages/fire/fire.0015.exr",
+    "sourceimages/fire/fire.0016.exr",
+    "sourceimages/poster.0001.exr",
+    "sourceimages/poster.0002.exr",
+    "sourceimages/hero/skin.1001.tx",
+    "sourceimages/hero/skin.1011.tx",
+    "sourceimages/commented.tx",
+    "sourceimages/sign.tx",
+    "cache/crowd.0009.ass",
+    "cache/crowd.0010.ass",
+    "cache/crowd.0012.ass",
+    "cache/crowd.0016.ass",
+    "cache/smoke.10.vdb",
+    "cache/smoke.15.vdb",
+    "cache/smoke.16.vdb",
+    "cache/city/very/deep/folder/structure/city_v003.abc",
+    "cache/hero.abc",
+    "cache/unused.abc",
+]
+
+
+@pytest.fixture
+def project(tmp_path):
+    project = tmp_path.joinpath("project")
+    for rel_path in PROJECT_FILES:
+        project.joinpath(rel_path).parent.mkdir(parents=True, exist_ok=True)
+        project.joinpath(rel_path).write_text(rel_path)
+    project.joinpath("assets", "hero.ma").write_text(REFERENCE)
+    outside = tmp_path.joinpath("outside")
+    outside.joinpath("library").mkdir(parents=True)
+    outside.joinpath("library", "brick.tx").write_text("brick")
+    scene_path = project.joinpath("scenes", "shot010.ma")
+    scene_path.parent.mkdir()
+    scene_path.write_text(SCENE.replace("{outside}", outside.as_posix()))
+    return project
+
+
+def dependencies(ssr, project, start_frame=10, end_frame=15):
+    return ssr.SceneDependencies.from_maya_ascii(
+        project.joinpath("scenes", "shot010.ma"), project, start_frame,
+        end_frame)
+
+
+def test_finds_every_dependency_in_the_frame_range(ssr, project):
+    inside, outside = dependencies(ssr, project).split_by_project(project)
+
+    assert inside == {
+        "workspace.mel",
+        "scenes/shot010.ma",
+        "assets/hero.ma",
+        "sourceimages/wood.1001.tx",
+        "sourceimages/wood.1002.tx",
+        "sourceimages/fire/fire.0010.exr",
+        "sourceimages/fire/fire.0015.exr",
+        "sourceimages/poster.0001.exr",
+        "sourceimages/sign.tx",
+        "sourceimages/hero/skin.1001.tx",
+        "sourceimages/hero/skin.1011.tx",
+        "cache/crowd.0010.ass",
+        "cache/crowd.0012.ass",
+        "cache/smoke.10.vdb",
+        "cache/smoke.15.vdb",
+        "cache/city/very/deep/folder/structure/city_v003.abc",
+        "cache/hero.abc",
+    }
+    assert outside == [
+        project.parent.joinpath("outside", "library", "brick.tx")
+    ]
+
+
+def test_frame_range_limits_sequences(ssr, project):
+    inside = dependencies(ssr, project, 16, 20).split_by_project(project)[0]
+
+    assert {rel_path for rel_path in inside if rel_path.startswith("cache/")
+            } == {
+                "cache/crowd.0016.ass",
+                "cache/smoke.16.vdb",
+                "cache/city/very/deep/folder/structure/city_v003.abc",
+                "cache/hero.abc",
+            }
+    assert "sourceimages/fire/fire.0016.exr" in inside
+    assert "sourceimages/fire/fire.0015.exr" not in inside
+
+
+@pytest.mark.parametrize("name, matches", [
+    ("wood.<UDIM>.tx", ["wood.1001.tx", "wood.1002.tx"]),
+    ("tex<UVTILE>.tx", ["tex_u1_v1.tx"]),
+    ("crowd.####.ass", ["crowd.0012.ass", "crowd.12.ass"]),
+    ("smoke.<f>.vdb", ["smoke.0012.vdb", "smoke.-3.vdb"]),
+    ("shot.<f>.<UDIM>.exr", ["shot.0012.1001.exr"]),
+])
+def test_token_patterns(ssr, name, matches):
+    pattern = ssr.SceneDependencies.token_pattern(name)
+    candidates = [
+        "wood.1001.tx", "wood.1002.tx", "wood.1001.tif", "wood_old.1001.tx",
+        "tex_u1_v1.tx", "crowd.0012.ass", "crowd.12.ass", "crowd.ass",
+        "smoke.0012.vdb", "smoke.-3.vdb", "shot.0012.1001.exr"
+    ]
+
+    assert [
+        candidate for candidate in candidates if pattern.fullmatch(candidate)
+    ] == matches
+
+
+def test_long_strings_and_comments(ssr, project):
+    scene = ssr.MayaAsciiScene(project.joinpath("scenes", "shot010.ma"))
+
+    assert scene.nodes["cityShape"].get_string(
+        "cacheFileName",
+        "cfn") == "cache/city/very/deep/folder/structure/city_v003.abc"
+    assert scene.nodes["cityShape"].parent == "city"
+    assert scene.nodes["sign"].get_string("filename",
+                                          "fn") == "sourceimages/sign.tx"
+    assert "commented" not in scene.nodes
+    assert scene.nodes["fire"].get_bool("useFrameExtension", "ufe")
+    assert not scene.nodes["poster"].get_bool("useFrameExtension", "ufe")
+
+
+def test_references_keep_copy_numbers_out_of_the_path(ssr, project):
+    scene = ssr.MayaAsciiScene(project.joinpath("scenes", "shot010.ma"))
+
+    assert scene.references == [
+        "assets/hero.ma", "assets/hero.ma{1}", "assets/hero.ma",
+        "assets/hero.ma{1}"
+    ]
+    inside = dependencies(ssr, project).split_by_project(project)[0]
+    assert not any("{" in rel_path for rel_path in inside)
@@ -0,0 +1,108 @@
+"""Tests of the sync lock that makes syncs to one network project take turns."""
+import json
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture
+def lock_path(ssr, tmp_path):
+    path = tmp_path.joinpath(ssr.SYNC_METADATA_DIR,
+                             ssr.TransferScheduler.LOCK_FILE_NAME)
+    path.parent.mkdir()
+    return path
+
+
+def write_lock(lock_path, token, age=0.0):
+    lock_path.write_text(json.dumps({"host": "render-pc", "token": token}))
+    mtime = time.time() - age
+    os.utime(lock_path, (mtime, mtime))
+
+
+def lock_token(lock_path):
+    return json.loads(lock_path.read_text())["token"]
+
+
+class StubWorker:
+    """Records the progress reports of a wait and cancels after a few of them."""
+
+    def __init__(self, ssr, cancel_after=None):
+        self.ssr = ssr
+        self.cancel_after = cancel_after
+        self.reports = []
+
+    def report(self, stage=None, **fields):
+        self.reports.append(stage)
+
+    def check_cancelled(self):
+        if self.cancel_after is not None and len(
+                self.reports) >= self.cancel_after:
+            raise self.ssr.SubmitCancelled()
+
+
+def test_lock_is_released(ssr, tmp_path, lock_path):
+    with ssr.TransferScheduler.lock(tmp_path):
+        assert lock_path.is_file()
+    assert not lock_path.exists()
+
+
+def test_stale_lock_is_taken_over(ssr, tmp_path, lock_path):
+    write_lock(lock_path,
+               "crashed",
+               age=ssr.TransferScheduler.LOCK_STALE_SECONDS + 60)
+
+    with ssr.TransferScheduler.lock(tmp_path):
+        assert lock_token(lock_path) != "crashed"
+    assert not lock_path.exists()
+    assert list(lock_path.parent.iterdir()) == []
+
+
+def test_fresh_lock_is_waited_for(ssr, tmp_path, lock_path, monkeypatch):
+    write_lock(lock_path, "other")
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 3:
+            # The other sync finishes
+            lock_path.unlink()
+
+    monkeypatch.setattr(ssr.time, "sleep", sleep)
+    worker = StubWorker(ssr)
+
+    with ssr.TransferScheduler.lock(tmp_path, worker):
+        assert lock_token(lock_path) != "other"
+    assert len(sleeps) == 3
+    assert worker.reports == ["waiting"] * 3
+
+
+def test_waiting_can_be_cancelled(ssr, tmp_path, lock_path, monkeypatch):
+    write_lock(lock_path, "other")
+    monkeypatch.setattr(ssr.time, "sleep", lambda seconds: None)
+
+    with pytest.raises(ssr.SubmitCancelled):
+        with ssr.TransferScheduler.lock(tmp_path, StubWorker(ssr, 2)):
+            pass
+    assert lock_token(lock_path) == "other"
+
+
+def test_lock_taken_over_by_someone_else_is_not_deleted(
+        ssr, tmp_path, lock_path):
+    with ssr.TransferScheduler.lock(tmp_path):
+        # This sync stalled for so long that another one took the lock over
+        write_lock(lock_path, "other")
+    assert lock_token(lock_path) == "other"
+
+
+def test_take_over_puts_back_a_lock_refreshed_in_the_meantime(
+        ssr, lock_path):
+    write_lock(lock_path, "other")
+
+    assert not ssr.TransferScheduler.take_over(lock_path)
+    assert lock_token(lock_path) == "other"
+    assert list(lock_path.parent.iterdir()) == [lock_path]
+
+
+def test_take_over_fails_once_another_waiter_moved_the_lock(ssr, lock_path):
+    assert not ssr.TransferScheduler.take_over(lock_path)
@@ -0,0 +1,84 @@
+"""Tests of verifying the network copy after a sync."""
+import os
+
+import pytest
+
+
+@pytest.fixture
+def synced(ssr, tmp_path):
+    source = tmp_path.joinpath("project")
+    destination = tmp_path.joinpath("network", "project")
+    source.joinpath("scenes").mkdir(parents=True)
+    for name in ["shot010.ma", "shot020.ma", "shot030.ma"]:
+        source.joinpath("scenes", name).write_text(name)
+    destination.mkdir(parents=True)
+    ssr.ThreadedSyncBackend().sync(source, destination, [])
+    return source, destination
+
+
+def count_hashes(ssr, monkeypatch):
+    hashed = []
+    hash_file = ssr.SyncVerifier.hash_file
+
+    def counting_hash_file(path, limiter=None):
+        hashed.append(path.name)
+        return hash_file(path, limiter)
+
+    monkeypatch.setattr(ssr.SyncVerifier, "hash_file",
+                        staticmethod(counting_hash_file))
+    return hashed
+
+
+def test_recopies_different_network_copies(ssr, synced):
+    source, destination = synced
+    network_copy = destination.joinpath("scenes", "shot020.ma")
+    network_copy.write_text("corrupted")
+    mtime = os.path.getmtime(source.joinpath("scenes", "shot020.ma"))
+    os.utime(network_copy, (mtime, mtime))
+
+    assert ssr.SyncVerifier().verify(source, destination, []) == 1
+    assert network_copy.read_text() == "shot020.ma"
+    assert ssr.SyncVerifier().verify(source, destination, []) == 0
+
+
+def test_only_changed_files_are_verified_again(ssr, synced, monkeypatch):
+    source, destination = synced
+    ssr.SyncVerifier().verify(source, destination, [])
+    hashed = count_hashes(ssr, monkeypatch)
+
+    ssr.SyncVerifier().verify(source, destination, [])
+    assert hashed == []
+
+    source.joinpath("scenes", "shot030.ma").write_text("changed")
+    ssr.ThreadedSyncBackend().sync(source, destination, [])
+    ssr.SyncVerifier().verify(source, destination, [])
+    assert sorted(hashed) == ["shot030.ma", "shot030.ma"]
+
+
+def test_newer_network_copies_are_left_alone(ssr, synced, monkeypatch):
+    source, destination = synced
+    ssr.SyncVerifier().verify(source, destination, [])
+    network_copy = destination.joinpath("scenes", "shot010.ma")
+    network_copy.write_text("edited on the network")
+    local = source.joinpath("scenes", "shot010.ma")
+    os.utime(local, (1000000, 1000000))
+    # Rescans so the manifest knows about the network edit
+    ssr.ThreadedSyncBackend(rescan_destination=True).sync(
+        source, destination, [])
+    hashed = count_hashes(ssr, monkeypatch)
+
+    assert ssr.SyncVerifier().verify(source, destination, []) == 0
+    assert hashed == []
+
+    # A local edit that is still older than the network copy
+    os.utime(local, (2000000, 2000000))
+    ssr.ThreadedSyncBackend().sync(source, destination, [])
+    ssr.SyncVerifier().verify(source, destination, [])
+    assert hashed == []
+    assert network_copy.read_text() == "edited on the network"
+
+    local.write_text("edited locally")
+    ssr.ThreadedSyncBackend().sync(source, destination, [])
+    ssr.SyncVerifier().verify(source, destination, [])
+    assert network_copy.read_text() == "edited locally"
+    assert hashed == ["shot010.ma", "shot010.ma"]
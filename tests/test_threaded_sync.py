@@ -0,0 +1,235 @@
+"""Tests of the threaded sync backend against local directories."""
+import os
+import random
+import shutil
+from pathlib import Path
+
+import pytest
+
+# Size of the large tree case, matching a big production project
+LARGE_TREE_FILES = int(os.environ.get("SYNC_TEST_LARGE_TREE_FILES", 50000))
+
+
+def make_tree(root: Path, file_count: int, seed: int = 0):
+    """Generates a project of small files in nested directories."""
+    rng = random.Random(seed)
+    dirs = [root]
+    for i in range(file_count):
+        if i % 40 == 0:
+            parent = rng.choice(dirs)
+            dirs.append(parent.joinpath(f"d{len(dirs)}"))
+            dirs[-1].mkdir(parents=True)
+        rng.choice(dirs).joinpath(f"f{i}.bin").write_bytes(
+            rng.randbytes(rng.randrange(0, 256)))
+
+
+def tree_contents(root: Path, skip: tuple[str, ...] = ()) -> dict[str, bytes]:
+    """Maps relative paths under root to file bytes, or None for directories."""
+    contents = {}
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = [name for name in dir_names if name not in skip]
+        rel_dir = Path(dir_path).relative_to(root)
+        for name in dir_names:
+            contents[rel_dir.joinpath(name).as_posix()] = None
+        for name in file_names:
+            contents[rel_dir.joinpath(name).as_posix()] = Path(
+                dir_path, name).read_bytes()
+    return contents
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    source = tmp_path.joinpath("project")
+    destination = tmp_path.joinpath("network", "project")
+    source.mkdir()
+    destination.mkdir(parents=True)
+    return source, destination
+
+
+def sync(ssr, source: Path, destination: Path, exclusions=()):
+    return ssr.ThreadedSyncBackend(max_workers=8).sync(source, destination,
+                                                       list(exclusions))
+
+
+def assert_mirrored(ssr, source: Path, destination: Path, skip=()):
+    assert tree_contents(destination,
+                         skip + (ssr.SYNC_METADATA_DIR, )) == tree_contents(
+                             source, skip)
+
+
+def test_copies_project_and_keeps_mtimes(ssr, dirs):
+    source, destination = dirs
+    make_tree(source, 500)
+
+    result = sync(ssr, source, destination)
+
+    assert result.files_scanned == 500
+    assert result.files_copied == 500
+    assert_mirrored(ssr, source, destination)
+    for path in source.rglob("*.bin"):
+        copy = destination.joinpath(path.relative_to(source))
+        assert abs(copy.stat().st_mtime - path.stat().st_mtime) < 0.01
+
+
+def test_resync_without_changes_copies_nothing(ssr, dirs):
+    source, destination = dirs
+    make_tree(source, 500)
+    sync(ssr, source, destination)
+
+    result = sync(ssr, source, destination)
+
+    assert result.files_copied == 0
+    assert result.files_deleted == 0
+    assert_mirrored(ssr, source, destination)
+
+
+def test_resync_copies_changed_files_only(ssr, dirs):
+    source, destination = dirs
+    make_tree(source, 200)
+    sync(ssr, source, destination)
+    changed = sorted(source.rglob("*.bin"))[:3]
+    for path in changed:
+        path.write_bytes(b"changed and a different size")
+
+    result = sync(ssr, source, destination)
+
+    assert result.files_copied == len(changed)
+    assert_mirrored(ssr, source, destination)
+
+
+def test_newer_network_files_are_kept(ssr, dirs):
+    source, destination = dirs
+    source.joinpath("scene.ma").write_text("local")
+    sync(ssr, source, destination)
+    network_copy = destination.joinpath("scene.ma")
+    network_copy.write_text("edited on the network")
+    os.utime(source.joinpath("scene.ma"), (1000000, 1000000))
+
+    sync(ssr, source, destination)
+
+    assert network_copy.read_text() == "edited on the network"
+
+
+def test_mirror_deletes_removed_files_and_directories(ssr, dirs):
+    source, destination = dirs
+    make_tree(source, 300)
+    sync(ssr, source, destination)
+    removed_dir = next(path for path in source.iterdir() if path.is_dir())
+    removed_file = next(source.glob("*.bin"))
+    shutil.rmtree(removed_dir)
+    removed_file.unlink()
+
+    result = sync(ssr, source, destination)
+
+    assert result.files_deleted > 0
+    assert not destination.joinpath(removed_dir.name).exists()
+    assert not destination.joinpath(removed_file.name).exists()
+    assert_mirrored(ssr, source, destination)
+
+
+def test_mirror_deletes_files_only_on_the_network(ssr, dirs):
+    source, destination = dirs
+    source.joinpath("scene.ma").write_text("scene")
+    destination.joinpath("stale.txt").write_text("stale")
+    destination.joinpath("olddir").mkdir()
+    destination.joinpath("olddir", "x").write_text("x")
+
+    sync(ssr, source, destination)
+
+    assert_mirrored(ssr, source, destination)
+
+
+def test_excluded_directory_names_match_anywhere(ssr, dirs):
+    source, destination = dirs
+    for rel_dir in ["autosave", "scenes/autosave", "scenes/shots"]:
+        source.joinpath(rel_dir).mkdir(parents=True)
+        source.joinpath(rel_dir, "file.ma").write_text(rel_dir)
+
+    sync(ssr, source, destination, ["autosave"])
+
+    assert not destination.joinpath("autosave").exists()
+    assert not destination.joinpath("scenes", "autosave").exists()
+    assert destination.joinpath("scenes", "shots", "file.ma").is_file()
+
+
+def test_excluded_relative_paths_only_match_from_the_root(ssr, dirs):
+    source, destination = dirs
+    for rel_dir in ["cache/tmp", "assets/cache/tmp"]:
+        source.joinpath(rel_dir).mkdir(parents=True)
+        source.joinpath(rel_dir, "file.abc").write_text(rel_dir)
+
+    sync(ssr, source, destination, ["cache/tmp"])
+
+    assert not destination.joinpath("cache", "tmp").exists()
+    assert destination.joinpath("assets", "cache", "tmp", "file.abc").is_file()
+
+
+def test_excluded_directories_on_the_network_are_not_deleted(ssr, dirs):
+    source, destination = dirs
+    source.joinpath("scene.ma").write_text("scene")
+    destination.joinpath("images").mkdir()
+    destination.joinpath("images", "frame.0001.exr").write_text("rendered")
+
+    sync(ssr, source, destination, ["images"])
+
+    assert destination.joinpath("images", "frame.0001.exr").is_file()
+
+
+def test_file_replaced_by_directory(ssr, dirs):
+    source, destination = dirs
+    source.joinpath("textures").write_text("was a file")
+    sync(ssr, source, destination)
+    source.joinpath("textures").unlink()
+    source.joinpath("textures").mkdir()
+    source.joinpath("textures", "wood.tx").write_text("wood")
+
+    sync(ssr, source, destination)
+
+    assert_mirrored(ssr, source, destination)
+
+
+def test_directory_replaced_by_file(ssr, dirs):
+    source, destination = dirs
+    source.joinpath("textures").mkdir()
+    source.joinpath("textures", "wood.tx").write_text("wood")
+    sync(ssr, source, destination)
+    shutil.rmtree(source.joinpath("textures"))
+    source.joinpath("textures").write_text("now a file")
+
+    sync(ssr, source, destination)
+
+    assert_mirrored(ssr, source, destination)
+
+
+def test_large_tree(ssr, dirs):
+    source, destination = dirs
+    make_tree(source, LARGE_TREE_FILES)
+
+    result = sync(ssr, source, destination)
+    assert result.files_copied == LARGE_TREE_FILES
+    assert_mirrored(ssr, source, destination)
+
+    removed = sorted(source.rglob("*.bin"))[::1000]
+    for path in removed:
+        path.unlink()
+    result = sync(ssr, source, destination)
+    assert result.files_copied == 0
+    assert result.files_deleted == len(removed)
+    assert_mirrored(ssr, source, destination)
+
+
+def test_bundles_keep_mtimes_before_1980(ssr, dirs):
+    source, destination = dirs
+    make_tree(source, ssr.FileBundle.MIN_FILES + 10)
+    for path in source.rglob("*.bin"):
+        os.utime(path, (0, 0))
+
+    result = ssr.ThreadedSyncBackend(max_workers=4,
+                                     bundle_threshold=1024).sync(
+                                         source, destination, [])
+
+    assert result.files_copied == ssr.FileBundle.MIN_FILES + 10
+    assert_mirrored(ssr, source, destination)
+    for path in destination.rglob("*.bin"):
+        assert path.stat().st_mtime == 0
+    assert not list(ssr.FileBundle.bundle_dir(destination).iterdir())